@@ -1,16 +1,20 @@
 import webview
+import multiprocessing
 from threading import Thread
-from flask import Flask, render_template, request, send_file, g, jsonify
-from io import BytesIO
-import pandas as pd
+from flask import Flask, render_template, request, g, jsonify, Response
 from dotenv import load_dotenv
 import jwt
 from datetime import datetime, timedelta
 import logging
 from extract_transfer_load import FieldMapper
-from pipelines import MongoDBConnector
+from pipelines import MongoDBConnector, connection_manager
 from main import run_data_processing_workflow
-from settings import COLLECTION_POST
+from model_registry import model_registry
+from job_runner import job_runner
+from workflow_metrics import workflow_metrics
+from exporter import DataExporter, EXPORT_FORMATS, build_export_query, export_filters_key
+from settings import COLLECTION_POST, DATABASE_NAME, EXPORT_DEFAULT_FORMAT
+import getpass
 import os
 import time
 
@@ -81,7 +85,8 @@ def authenticate_user(auth_token):
 @app.before_request
 def before_request():
     """
-    Executes before each request to initialize the MongoDB client and store it in the Flask global object `g`.
+    Executes before each request to store a MongoDB connector in the Flask global object `g`.
+    The connector borrows the process-wide client, so no connections are opened per request.
     """
     g.mongo_client = MongoDBConnector()
 
@@ -116,7 +121,7 @@ def trigger_daily_process():
 @app.route('/', methods=['GET', 'POST'])
 def upload_file():
     """
-    Handles file uploads, processes the file, and uploads the data to MongoDB.
+    Handles file uploads, processes the file in chunks, and uploads the data to MongoDB.
 
     Returns:
         str: Rendered HTML template with the result of the file upload process.
@@ -136,19 +141,10 @@ def upload_file():
 
         if file:
             try:
-                file_contents = file.read()
-
-                if file.filename.endswith('.xlsx'):
-                    df = pd.read_excel(BytesIO(file_contents))
-                elif file.filename.endswith('.csv'):
-                    df = pd.read_csv(BytesIO(file_contents))
-                else:
-                    raise ValueError("Unsupported file format. Only .xlsx and .csv are supported.")
-
-                mapper.detect_source(df)
-                data = mapper.map_fields(df)
+                # Read, map and insert the upload chunk by chunk straight from the request stream
                 filename = file.filename
-                client.upload_elt_to_mongo(data, filename)
+                chunks = mapper.map_chunks(file.stream, filename)
+                client.upload_elt_chunks(chunks, filename)
                 result = "Data uploaded to MongoDB successfully."
                 download_link = True
                 logger.info(result)
@@ -192,59 +188,155 @@ def upload_file():
 
 @app.route('/download_data', methods=['GET'])
 def download_data():
+    """
+    Streams the processed posts back as a file, reading them from MongoDB in batches.
+
+    Query parameters:
+        format: 'csv' (default), 'xlsx' or 'parquet'.
+        columns: Comma-separated fields to export; defaults to all fields.
+        start_date, end_date: Publish date range ('YYYY-MM-DD', both inclusive).
+        company, channel, theme: Values to keep; repeat the parameter to keep several.
+        since_last_export: '1' to export only posts added since the user's last export with the same filters.
+        user: Who the export cursor belongs to; defaults to the logged-in OS user.
+
+    Returns:
+        Response: The export as an attachment, or a JSON error.
+    """
+    export_format = request.args.get('format', EXPORT_DEFAULT_FORMAT).lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"Unsupported export format: {export_format}"}), 400
+    columns = [column.strip() for column in request.args.get('columns', '').split(',') if column.strip()]
+    filters = {
+        'start_date': request.args.get('start_date') or None,
+        'end_date': request.args.get('end_date') or None,
+        'companies': [value for value in request.args.getlist('company') if value],
+        'channels': [value for value in request.args.getlist('channel') if value],
+        'themes': [value for value in request.args.getlist('theme') if value],
+    }
+    since_last_export = request.args.get('since_last_export', '').lower() in ('1', 'true', 'yes', 'on')
+    user = request.args.get('user') or getpass.getuser()
+    filters_key = export_filters_key(filters)
+
     try:
         if not hasattr(g, "mongo_client"):
             return jsonify({"error": "MongoDB connection not found"}), 500
 
         client = g.mongo_client
-        collection = client.db[COLLECTION_POST]
-        data_cursor = collection.find()
-        data_list = list(data_cursor)
+        after_id = None
+        if since_last_export:
+            saved_cursor = client.get_export_cursor(user, filters_key)
+            after_id = saved_cursor['last_id'] if saved_cursor else None
 
-        if not data_list:
+        try:
+            query = build_export_query(filters, after_id)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid date, expected YYYY-MM-DD: {e}"}), 400
+
+        exporter = DataExporter(client.db[COLLECTION_POST], query=query, columns=columns or None)
+        if not exporter.open():
+            if after_id is not None:
+                return jsonify({"error": "No new posts since the last export"}), 404
             return jsonify({"error": "No data found in the database"}), 404
+        chunks = exporter.stream(export_format)
+
+    except Exception as e:
+        import traceback
+        print(traceback.format_exc())  # Print full error details
+        return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
 
-        # Convert to DataFrame
-        df = pd.DataFrame(data_list)
-        if "metadata_id" in df.columns:
-            df.drop(columns=["metadata_id"], inplace=True)
+    def send_export():
+        yield from chunks
+        # Only move the cursor once the whole file has been sent
+        if exporter.completed:
+            try:
+                client.save_export_cursor(user, filters_key, filters, exporter.last_id, exporter.rows)
+            except Exception as e:
+                print(f"Error saving export cursor: {e}")
 
-        # Save file on Desktop
-        desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
-        save_path = os.path.join(desktop_path, "exported_data.xlsx")
-        
-        df.to_excel(save_path, index=False)
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    return Response(send_export(), mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename=exported_data.{extension}"})
 
-        print(f"✅ File successfully saved at: {save_path}")
+@app.route('/model_info', methods=['GET'])
+def model_info():
+    """
+    Reports which classifier model is loaded and when it was loaded.
 
-        # Automatically open the folder (Windows)
-        try:
-            os.startfile(os.path.dirname(save_path))  # Opens folder
-        except Exception as open_error:
-            print(f"⚠️ Warning: Could not open folder: {open_error}")
+    Returns:
+        JSON: The model version, path and load time.
+    """
+    return jsonify(model_registry.info())
 
-        return jsonify({"message": "Download complete", "path": save_path})
 
-    except Exception as e:
-        import traceback
-        print(traceback.format_exc())  # Print full error details
-        return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
+@app.route('/pool_stats', methods=['GET'])
+def pool_stats():
+    """
+    Reports MongoDB connection pool statistics, to watch connection churn under load.
+
+    Returns:
+        JSON: The pool settings and connection counters.
+    """
+    return jsonify(connection_manager.stats())
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Exposes per-stage timing, throughput and memory of the processing workflow for Prometheus.
+
+    Returns:
+        Response: The metrics in the Prometheus text exposition format.
+    """
+    return Response(workflow_metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 
 @app.route('/run_process', methods=['POST'])
 def run_process():
     """
-    Triggers the data processing workflow and returns the status.
+    Queues the data processing workflow as a background job. Only one run per dataset is active at a time;
+    submitting while a run is active returns that run instead.
 
     Returns:
-        JSON: A JSON response indicating the success or failure of the data processing workflow.
+        JSON: The job id and status, with HTTP 202 for a new job or 409 if a run is already active.
     """
     try:
-        run_data_processing_workflow()
-        return jsonify({"status": "success", "message": "Data processing completed successfully!"})
+        job, created = job_runner.submit(DATABASE_NAME, lambda progress: run_data_processing_workflow(progress=progress))
+        if created:
+            return jsonify({"status": "queued", "job_id": job['job_id'], "message": "Data processing started."}), 202
+        return jsonify({"status": "running", "job_id": job['job_id'],
+                        "message": "Data processing is already running."}), 409
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.route('/run_process/<job_id>', methods=['GET'])
+def run_process_status(job_id):
+    """
+    Reports the progress of a data processing job.
+
+    Args:
+        job_id (str): The id returned by /run_process.
+
+    Returns:
+        JSON: The job's status, current stage, rows processed, throughput and, once finished, its result.
+    """
+    job = job_runner.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Unknown job id."}), 404
+    return jsonify(job)
+
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """
+    Lists active and recently finished data processing jobs.
+
+    Returns:
+        JSON: The job statuses, newest first.
+    """
+    return jsonify(job_runner.list_jobs())
+
+
 # if __name__ == '__main__':
 #     app.run(debug=False)
 def run_flask():
@@ -252,6 +344,9 @@ def run_flask():
     app.run(port=5001, debug=False, use_reloader=False)  # `use_reloader=False` prevents double execution
     
 if __name__ == "__main__":
+    # Required for the text cleaning process pool in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
+
     # Start Flask in a separate thread
     flask_thread = Thread(target=run_flask, daemon=True)
     flask_thread.start()
@@ -262,5 +357,8 @@ if __name__ == "__main__":
     # Open Flask app inside a Desktop Window
     webview.create_window("ECHO Desktop", "http://127.0.0.1:5001")
 
+    # Let exports from /download_data be saved through the window's download dialog
+    webview.settings['ALLOW_DOWNLOADS'] = True
+
     # This line **keeps the script running** so the window doesn’t close
     webview.start()
\ No newline at end of file
@@ -0,0 +1,236 @@
+import asyncio
+import random
+import time
+from itertools import islice
+import aiohttp
+import openai
+from settings import (ENTITY_CONCURRENCY, ENTITY_REQUESTS_PER_MINUTE, ENTITY_TOKENS_PER_MINUTE, ENTITY_MAX_RETRIES,
+                      ENTITY_BACKOFF_SECONDS, ENTITY_MAX_BACKOFF_SECONDS)
+
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.APIError,
+    openai.error.Timeout,
+    openai.error.ServiceUnavailableError,
+    openai.error.APIConnectionError,
+    openai.error.TryAgain,
+    aiohttp.ClientError,
+    asyncio.TimeoutError,
+)
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute, capacity=None):
+        """
+        Initializes a token bucket that refills continuously at `rate_per_minute`.
+
+        Args:
+            rate_per_minute (float): The number of tokens added per minute.
+            capacity (float, optional): The maximum burst size. Defaults to one minute's worth of tokens.
+
+        Raises:
+            ValueError: If the rate or the capacity is not positive.
+        """
+        if not rate_per_minute > 0:
+            raise ValueError(f"Rate limit must be positive, got {rate_per_minute} per minute")
+        if capacity is not None and not capacity > 0:
+            raise ValueError(f"Rate limit capacity must be positive, got {capacity}")
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, amount=1):
+        """
+        Waits until `amount` tokens are available and takes them. Waiters are served in arrival order.
+
+        Args:
+            amount (float): The number of tokens to take; capped at the bucket capacity.
+        """
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class AsyncEntityExtractor:
+    def __init__(self, processor, concurrency=ENTITY_CONCURRENCY, requests_per_minute=ENTITY_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=ENTITY_TOKENS_PER_MINUTE, max_retries=ENTITY_MAX_RETRIES,
+                 backoff_seconds=ENTITY_BACKOFF_SECONDS, max_backoff_seconds=ENTITY_MAX_BACKOFF_SECONDS):
+        """
+        Initializes an asyncio entity extractor that runs up to `concurrency` completion requests at once
+        within request and token rate limits, retrying transient failures with exponential backoff.
+
+        Args:
+            processor (EntityProcessor): Provides the prompt, the response parser and the completion settings.
+            concurrency (int): The maximum number of requests in flight.
+            requests_per_minute (int): The request rate limit.
+            tokens_per_minute (int): The token rate limit, counting prompt tokens and `max_tokens`.
+            max_retries (int): The number of retries after the first attempt.
+            backoff_seconds (float): The base delay before the first retry.
+            max_backoff_seconds (float): The upper bound of a single retry delay.
+        """
+        self.processor = processor
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.failures = 0
+        self.single_keys = set()
+        self.in_flight = None
+
+    def estimate_tokens(self, prompt, params):
+        """
+        Estimates the tokens a request counts against the token rate limit.
+
+        Args:
+            prompt (str): The prompt being sent.
+            params (dict): The completion parameters of the request.
+
+        Returns:
+            int: The estimated prompt tokens plus the completion budget.
+        """
+        return len(prompt) // 4 + params['max_tokens']
+
+    async def complete(self, prompt, params, request_bucket, token_bucket):
+        """
+        Sends one completion request, retrying transient errors with jittered exponential backoff.
+
+        Args:
+            prompt (str): The prompt to send.
+            params (dict): The completion parameters of the request.
+            request_bucket (TokenBucket): The request rate limiter.
+            token_bucket (TokenBucket): The token rate limiter.
+
+        Returns:
+            str: The completion text.
+        """
+        for attempt in range(self.max_retries + 1):
+            await request_bucket.acquire()
+            await token_bucket.acquire(self.estimate_tokens(prompt, params))
+            try:
+                async with self.in_flight:
+                    response = await openai.Completion.acreate(prompt=prompt, **params)
+                return response["choices"][0]["text"]
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt)
+                print(f"Retrying entity extraction in {delay:.1f}s after error: {e}")
+                await asyncio.sleep(random.uniform(delay / 2, delay))
+
+    async def extract(self, message, request_bucket, token_bucket):
+        """
+        Extracts entities from one message.
+
+        Args:
+            message (str): The text message from which entities need to be extracted.
+            request_bucket (TokenBucket): The request rate limiter.
+            token_bucket (TokenBucket): The token rate limiter.
+
+        Returns:
+            dict: The extracted entities, or None if extraction failed after all retries.
+        """
+        try:
+            text = await self.complete(self.processor.build_prompt(message), self.processor.completion_params,
+                                       request_bucket, token_bucket)
+            return self.processor.parse_entities(text)
+        except Exception as e:
+            self.failures += 1
+            print(f"Error during entity extraction: {e}")
+            return None
+
+    async def extract_batch(self, batch, request_bucket, token_bucket):
+        """
+        Extracts entities for several messages with one request, then extracts any message the response
+        does not cover on its own, recording its key in `single_keys`.
+
+        Args:
+            batch (list): The (key, message) pairs to process together.
+            request_bucket (TokenBucket): The request rate limiter.
+            token_bucket (TokenBucket): The token rate limiter.
+
+        Returns:
+            list: (key, entities) pairs, where entities is None for failed messages.
+        """
+        parsed = {}
+        if len(batch) > 1:
+            messages = [message for _, message in batch]
+            try:
+                text = await self.complete(self.processor.build_batch_prompt(messages),
+                                           self.processor.batch_completion_params(len(messages)),
+                                           request_bucket, token_bucket)
+                parsed = self.processor.parse_batch_entities(text, len(messages))
+            except Exception as e:
+                print(f"Error during batched entity extraction: {e}")
+
+        fallbacks = [(index, message) for index, (_, message) in enumerate(batch) if index not in parsed]
+        self.single_keys.update(batch[index][0] for index, _ in fallbacks)
+        extracted = await asyncio.gather(*(self.extract(message, request_bucket, token_bucket) for _, message in fallbacks))
+        parsed.update(zip([index for index, _ in fallbacks], extracted))
+        return [(key, parsed[index]) for index, (key, _) in enumerate(batch)]
+
+    async def stream(self, items):
+        """
+        Extracts entities for (key, message) pairs and yields results as they complete. Messages are pulled
+        from `items` only when a worker is free, `processor.batch_size` at a time, and workers pause while
+        unread results pile up.
+
+        Args:
+            items (iterable): The (key, message) pairs to process.
+
+        Yields:
+            tuple: (key, entities) pairs, where entities is None for failed messages.
+
+        Raises:
+            Exception: Any unexpected error of a worker, after the other workers are stopped.
+        """
+        request_bucket = TokenBucket(self.requests_per_minute)
+        token_bucket = TokenBucket(self.tokens_per_minute)
+        self.in_flight = asyncio.Semaphore(max(1, self.concurrency))
+        pending = iter(items)
+        results = asyncio.Queue(maxsize=self.concurrency * 2)
+        done = object()
+
+        async def worker():
+            # Only signal the consumer while it is still reading: a worker cancelled because the stream was
+            # closed must not wait on the full queue, or shutting down would never finish
+            try:
+                while True:
+                    batch = list(islice(pending, self.processor.batch_size))
+                    if not batch:
+                        break
+                    for result in await self.extract_batch(batch, request_bucket, token_bucket):
+                        await results.put(result)
+            except Exception as e:
+                await results.put(e)
+                return
+            await results.put(done)
+
+        async with aiohttp.ClientSession() as session:
+            openai.aiosession.set(session)
+            workers = [asyncio.create_task(worker()) for _ in range(max(1, self.concurrency))]
+            try:
+                remaining = len(workers)
+                while remaining:
+                    result = await results.get()
+                    if result is done:
+                        remaining -= 1
+                    elif isinstance(result, Exception):
+                        raise result
+                    else:
+                        yield result
+            finally:
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                openai.aiosession.set(None)
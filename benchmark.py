@@ -0,0 +1,616 @@
+import argparse
+import json
+import os
+import pickle
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import openai
+from settings import (RIVAL_IQ, PHANTOM_BUSTER, COMPANY_MAPPING, DATABASE_NAME, COLLECTION_KEYWORD,
+                      COLLECTION_UPLOAD)
+import extract_transfer_load
+from extract_transfer_load import FieldMapper
+from keyword_matcher import KeywordMatcher
+from pipelines import MongoDBConnector, connection_manager, ensure_indexes
+from model_registry import model_registry
+from classifier_backends import CLASSIFIER_BACKENDS, build_backend
+from entity_cache import EntityCache
+from completion_stub import start_stub_server
+
+BENCHMARKS = ["map_fields", "format_timestamp_auto", "clean_text", "keyword_matching", "categorize_duplicates",
+              "predict_labels", "upload", "process_entities"]
+BENCHMARK_DATABASE = "echo_benchmark"
+MONGOMOCK_UPLOAD_ROWS = 2000
+SYLLABLES = ["ka", "lo", "mi", "ter", "sun", "ra", "vel", "on", "dia", "pro", "ex", "ent", "ma", "tic", "ri",
+             "no", "bel", "cor", "gen", "ly", "sa", "tor", "us", "in", "vi", "da", "ple", "mor", "ta", "ni"]
+CHANNELS = ["LinkedIn", "Twitter", "Facebook", "Instagram", "YouTube"]
+RIVAL_IQ_POST_TYPES = ["photo", "video", "link", "status", "carousel"]
+PHANTOM_BUSTER_POST_TYPES = ["Photo", "Text", "Video (LinkedIn Source)", "Article", "Document"]
+
+
+def build_vocabulary(rng, size=5000):
+    """
+    Builds a vocabulary of pronounceable synthetic words.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        size (int): The number of distinct words.
+
+    Returns:
+        np.ndarray: The words, most frequent first under a Zipf distribution.
+    """
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES, size=rng.integers(2, 5))))
+    return np.array(sorted(words, key=lambda word: (len(word), word)), dtype=object)
+
+
+def generate_messages(rng, count, vocabulary, duplicate_rate=0.15, mean_words=25):
+    """
+    Generates post messages with Zipf-distributed words and log-normal lengths. A share of the messages
+    are near-copies of earlier ones (one word changed), like reposted or lightly edited posts.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        count (int): The number of messages.
+        vocabulary (np.ndarray): The words to draw from.
+        duplicate_rate (float): The share of messages copied from an earlier message.
+        mean_words (int): The typical number of words per message.
+
+    Returns:
+        list: The messages.
+    """
+    lengths = np.clip(rng.lognormal(np.log(mean_words), 0.5, size=count).astype(int), 3, 200)
+    weights = 1.0 / np.arange(1, len(vocabulary) + 1)
+    word_ids = rng.choice(len(vocabulary), size=int(lengths.sum()), p=weights / weights.sum())
+    words = vocabulary[word_ids].tolist()
+    bounds = np.concatenate([[0], np.cumsum(lengths)]).tolist()
+    messages = [' '.join(words[bounds[i]:bounds[i + 1]]) for i in range(count)]
+
+    copies = np.flatnonzero(rng.random(count) < duplicate_rate)
+    copies = copies[copies > 0]
+    sources = (rng.random(len(copies)) * copies).astype(int)
+    replacements = vocabulary[rng.integers(0, len(vocabulary), size=len(copies))]
+    for target, source, replacement in zip(copies.tolist(), sources.tolist(), replacements.tolist()):
+        tokens = messages[source].split(' ')
+        tokens[int(rng.integers(0, len(tokens)))] = replacement
+        messages[target] = ' '.join(tokens)
+    return messages
+
+
+def generate_timestamps(rng, count, timestamp_format):
+    """
+    Generates publish timestamps spread over two years.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        count (int): The number of timestamps.
+        timestamp_format (str): The strftime format of the export.
+
+    Returns:
+        list: The timestamp strings.
+    """
+    seconds = rng.integers(0, 2 * 365 * 24 * 3600, size=count)
+    timestamps = pd.Timestamp('2023-01-01') + pd.to_timedelta(seconds, unit='s')
+    return timestamps.strftime(timestamp_format).tolist()
+
+
+def generate_links(rng, count, prefix, duplicate_link_rate=0.02):
+    """
+    Generates post links, repeating a small share of them like re-exported posts.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        count (int): The number of links.
+        prefix (str): The URL prefix.
+        duplicate_link_rate (float): The share of links repeated from earlier rows.
+
+    Returns:
+        np.ndarray: The links.
+    """
+    ids = np.arange(count)
+    repeated = rng.random(count) < duplicate_link_rate
+    ids[repeated] = (rng.random(int(repeated.sum())) * ids[repeated]).astype(int)
+    return np.char.add(prefix, ids.astype(str)).astype(object)
+
+
+def generate_rival_iq(rows, seed=0, vocabulary=None):
+    """
+    Generates a synthetic Rival IQ export with every column in RIVAL_IQ.
+
+    Args:
+        rows (int): The number of posts.
+        seed (int): The random seed.
+        vocabulary (np.ndarray, optional): The words messages are drawn from.
+
+    Returns:
+        pd.DataFrame: The export.
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = vocabulary if vocabulary is not None else build_vocabulary(rng)
+    companies = np.array(list(COMPANY_MAPPING) + ["Acme Foods", "Globex"], dtype=object)
+    messages = np.array(generate_messages(rng, rows, vocabulary), dtype=object)
+    messages[rng.random(rows) < 0.03] = np.nan
+    applause = rng.negative_binomial(1, 0.01, size=rows)
+    conversation = rng.negative_binomial(1, 0.1, size=rows)
+    amplification = rng.negative_binomial(1, 0.05, size=rows)
+    audience = rng.integers(1000, 2_000_000, size=rows)
+
+    df = pd.DataFrame({
+        "published_at": generate_timestamps(rng, rows, "%Y-%m-%d %H:%M:%S"),
+        "report_generated_at": "2025-01-01 00:00:00",
+        "captured_at": "2025-01-01 00:00:00",
+        "company": companies[rng.integers(0, len(companies), size=rows)],
+        "channel": np.array(CHANNELS, dtype=object)[rng.integers(0, len(CHANNELS), size=rows)],
+        "presence_handle": np.array(["brand", "brand_india", "brand_official"], dtype=object)[rng.integers(0, 3, size=rows)],
+        "message": messages,
+        "post_link": generate_links(rng, rows, "https://social.example/riq/"),
+        "link": "https://brand.example/",
+        "link_title": "Brand update",
+        "link_description": "",
+        "image": "https://cdn.example/image.jpg",
+        "post_type": np.array(RIVAL_IQ_POST_TYPES, dtype=object)[rng.integers(0, len(RIVAL_IQ_POST_TYPES), size=rows)],
+        "posted_domain": "brand.example",
+        "posted_url": "https://brand.example/post",
+        "engagement_total": applause + conversation + amplification,
+        "applause": applause,
+        "conversation": conversation,
+        "amplification": amplification,
+        "audience": audience,
+        "engagement_rate_by_follower": (applause + conversation + amplification) / audience,
+        "engagement_rate_lift": rng.normal(1, 0.2, size=rows),
+        "post_tag_ugc": "",
+        "post_tag_contests": "",
+        "video_views": rng.integers(0, 100000, size=rows),
+    })
+    return df[RIVAL_IQ]
+
+
+def generate_phantom_buster(rows, seed=0, vocabulary=None):
+    """
+    Generates a synthetic Phantom Buster LinkedIn export with every column in PHANTOM_BUSTER.
+
+    Args:
+        rows (int): The number of posts.
+        seed (int): The random seed.
+        vocabulary (np.ndarray, optional): The words messages are drawn from.
+
+    Returns:
+        pd.DataFrame: The export.
+    """
+    rng = np.random.default_rng(seed + 1)
+    vocabulary = vocabulary if vocabulary is not None else build_vocabulary(rng)
+    profiles = np.array([name.replace(' ', '-') for name in COMPANY_MAPPING] + ["acme-foods", "globex"], dtype=object)
+    links = generate_links(rng, rows, "https://www.linkedin.com/feed/update/urn:li:activity:")
+
+    df = pd.DataFrame({
+        "postUrl": links,
+        "imgUrl": "https://media.licdn.example/image.jpg",
+        "type": np.array(PHANTOM_BUSTER_POST_TYPES, dtype=object)[rng.integers(0, len(PHANTOM_BUSTER_POST_TYPES), size=rows)],
+        "postContent": generate_messages(rng, rows, vocabulary),
+        "likeCount": rng.negative_binomial(1, 0.01, size=rows),
+        "commentCount": rng.negative_binomial(1, 0.1, size=rows),
+        "repostCount": rng.negative_binomial(1, 0.05, size=rows),
+        "postDate": "1w",
+        "action": "Post",
+        "profileUrl": profiles[rng.integers(0, len(profiles), size=rows)],
+        "timestamp": "2025-01-01T00:00:00.000Z",
+        "postTimestamp": generate_timestamps(rng, rows, "%Y-%m-%dT%H:%M:%S.000Z"),
+        "videoUrl": "",
+        "sharedPostUrl": "",
+    })
+    return df[PHANTOM_BUSTER]
+
+
+def generate_keywords(vocabulary, seed=0, count=300):
+    """
+    Generates keyword data: single words and two-word phrases from the middle of the frequency range,
+    each mapped to a theme and subtheme.
+
+    Args:
+        vocabulary (np.ndarray): The words messages are drawn from.
+        seed (int): The random seed.
+        count (int): The number of keywords.
+
+    Returns:
+        pd.DataFrame: The keywords with 'Keyword', 'Theme' and 'Sub Theme' columns.
+    """
+    rng = np.random.default_rng(seed + 2)
+    candidates = vocabulary[50:2000]
+    keywords = rng.choice(candidates, size=count, replace=False).tolist()
+    for i in range(0, count, 5):
+        keywords[i] = f"{keywords[i]} {rng.choice(candidates)}"
+    themes = rng.integers(0, 8, size=count)
+    return pd.DataFrame({
+        "Keyword": keywords,
+        "Theme": [f"Theme {theme}" for theme in themes],
+        "Sub Theme": [f"Theme {theme} / Sub {sub}" for theme, sub in zip(themes, rng.integers(0, 4, size=count))],
+    })
+
+
+def build_benchmark_model(messages, seed=0, sample_size=2000, backend='gradient_boosting'):
+    """
+    Trains a small model on synthetic labels, in the format `model_registry` loads. Gradient boosting is cut
+    down to 10 trees to keep the setup quick.
+
+    Args:
+        messages (list): Messages to train on.
+        seed (int): The random seed.
+        sample_size (int): The number of messages used for training.
+        backend (str): The classifier backend, one of `classifier_backends.CLASSIFIER_BACKENDS`.
+
+    Returns:
+        dict: The model containing the backend name, vectorizer and classifier.
+    """
+    rng = np.random.default_rng(seed + 3)
+    sample = list(messages[:sample_size])
+    labels = [f"Theme {i % 4}||Sub {i % 3}||Sub Sub {i % 2}" for i in rng.integers(0, 24, size=len(sample))]
+    vectorizer, classifier = build_backend(backend, random_state=seed)
+    if backend == 'gradient_boosting':
+        classifier.set_params(n_estimators=10)
+    classifier.fit(vectorizer.fit_transform(sample), labels)
+    return {'backend': backend, 'vectorizer': vectorizer, 'classifier': classifier}
+
+
+def time_call(function, repeat=1):
+    """
+    Times a call, keeping the fastest of `repeat` runs.
+
+    Args:
+        function (callable): The call to time; it gets no arguments.
+        repeat (int): The number of runs.
+
+    Returns:
+        tuple: The fastest wall time in seconds and the result of the last run.
+    """
+    best, result = None, None
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def use_mongomock():
+    """
+    Points the shared MongoDB client at an in-memory mongomock client.
+
+    Returns:
+        mongomock.MongoClient: The in-memory client.
+    """
+    try:
+        import mongomock
+    except ImportError:
+        raise RuntimeError("mongomock is required for benchmarks without --mongo-url (pip install mongomock)")
+    connection_manager.close()
+    client = mongomock.MongoClient()
+    connection_manager.client = client
+    ensure_indexes(client)
+    return client
+
+
+class BenchmarkSuite:
+    def __init__(self, sizes, seed=0, repeat=1, mongo_url=None, upload_rows=None, entity_rows=1000,
+                 stub_latency=0.0, model_path=None, classifier_backend='gradient_boosting'):
+        """
+        Initializes the benchmark suite.
+
+        Args:
+            sizes (list): The numbers of rows to benchmark.
+            seed (int): The random seed of the synthetic data.
+            repeat (int): The number of timed runs per benchmark; the fastest is reported.
+            mongo_url (str, optional): A MongoDB server for the upload benchmark. Defaults to mongomock.
+            upload_rows (int, optional): The maximum number of rows uploaded. Defaults to all rows with a MongoDB
+                server and MONGOMOCK_UPLOAD_ROWS with mongomock, whose lookups are much slower than a server's.
+            entity_rows (int): The maximum number of rows sent through entity extraction. Extraction runs under
+                the configured request and token rate limits, so larger samples measure the limits.
+            stub_latency (float): The seconds the completion stub waits before answering each request.
+            model_path (str, optional): A real model file for predict_labels. Defaults to a small synthetic model.
+            classifier_backend (str): The backend of the synthetic model.
+        """
+        self.sizes = sizes
+        self.seed = seed
+        self.repeat = repeat
+        self.mongo_url = mongo_url
+        self.upload_rows = upload_rows if upload_rows is not None else (None if mongo_url else MONGOMOCK_UPLOAD_ROWS)
+        self.entity_rows = entity_rows
+        self.stub_latency = stub_latency
+        self.model_path = model_path
+        self.classifier_backend = classifier_backend
+        self.results = []
+        self.vocabulary = build_vocabulary(np.random.default_rng(seed))
+        self.keywords = generate_keywords(self.vocabulary, seed)
+
+    def record(self, benchmark, source, rows, seconds, **extra):
+        """
+        Stores and prints a benchmark result.
+
+        Args:
+            benchmark (str): The benchmark name.
+            source (str): The synthetic export the rows came from.
+            rows (int): The number of rows processed.
+            seconds (float): The wall time, or None if the benchmark failed.
+            **extra: Additional fields, such as an error message.
+        """
+        result = {
+            'benchmark': benchmark,
+            'source': source,
+            'rows': rows,
+            'seconds': seconds,
+            'rows_per_second': rows / seconds if seconds else None,
+            **extra,
+        }
+        self.results.append(result)
+        timing = f"{seconds:10.3f}s {result['rows_per_second']:12.0f} rows/s" if seconds else f"failed: {extra.get('error')}"
+        print(f"{benchmark:24s} {source:15s} {rows:>9d}  {timing}")
+
+    def run(self, benchmarks=BENCHMARKS):
+        """
+        Runs the selected benchmarks for every size and source.
+
+        Args:
+            benchmarks (list): The benchmark names to run.
+
+        Returns:
+            list: The results.
+        """
+        client = use_mongomock()
+        client[DATABASE_NAME][COLLECTION_KEYWORD].insert_many(self.keywords.to_dict(orient='records'))
+        from data_processor import DataProcessor
+        self.processor = DataProcessor()
+
+        for rows in self.sizes:
+            frames = {
+                'Rival IQ': generate_rival_iq(rows, self.seed, self.vocabulary),
+                'Phantom Buster': generate_phantom_buster(rows, self.seed, self.vocabulary),
+            }
+            for source, frame in frames.items():
+                mapped = None
+                for benchmark in benchmarks:
+                    try:
+                        mapped = getattr(self, f"bench_{benchmark}")(source, frame, mapped)
+                    except Exception as e:
+                        self.record(benchmark, source, rows, None, error=f"{type(e).__name__}: {' '.join(str(e).split())[:200]}")
+        return self.results
+
+    def map_frame(self, frame):
+        """
+        Maps an export the way the upload route does.
+
+        Args:
+            frame (pd.DataFrame): The export.
+
+        Returns:
+            list: The mapped records.
+        """
+        mapper = FieldMapper(None)
+        mapper.detect_source(frame)
+        return mapper.map_fields(frame)
+
+    def mapped_frame(self, frame, mapped):
+        """
+        Returns the mapped export as a DataFrame of posts, mapping it if no earlier benchmark did.
+
+        Args:
+            frame (pd.DataFrame): The export.
+            mapped (list): The mapped records, or None.
+
+        Returns:
+            pd.DataFrame: The mapped posts.
+        """
+        df = pd.DataFrame(mapped if mapped is not None else self.map_frame(frame))
+        df['Message'] = df['Message'].fillna('').astype(str)
+        return df
+
+    def bench_map_fields(self, source, frame, mapped):
+        """
+        Times source detection and field mapping of an export.
+        """
+        seconds, mapped = time_call(lambda: self.map_frame(frame), self.repeat)
+        self.record('map_fields', source, len(frame), seconds)
+        return mapped
+
+    def bench_format_timestamp_auto(self, source, frame, mapped):
+        """
+        Times timestamp normalization value by value and per column, each with an empty string memo.
+        """
+        column = frame['published_at' if source == 'Rival IQ' else 'postTimestamp']
+        mapper = FieldMapper(None)
+
+        def per_value():
+            extract_transfer_load._format_timestamp_string.cache_clear()
+            return [mapper.format_timestamp_auto(value) for value in column]
+
+        def per_column():
+            extract_transfer_load._format_timestamp_string.cache_clear()
+            return mapper.format_timestamps(column)
+
+        self.record('format_timestamp_auto', source, len(column), time_call(per_value, self.repeat)[0])
+        self.record('format_timestamps', source, len(column), time_call(per_column, self.repeat)[0])
+        return mapped
+
+    def bench_clean_text(self, source, frame, mapped):
+        """
+        Times message cleaning; needs the NLTK stopwords, punkt and wordnet data.
+        """
+        from text_cleaner import clean_texts
+        messages = self.mapped_frame(frame, mapped)['Message']
+        self.record('clean_text', source, len(messages), time_call(lambda: clean_texts(messages), self.repeat)[0])
+        return mapped
+
+    def bench_keyword_matching(self, source, frame, mapped):
+        """
+        Times building the keyword matcher and matching every message.
+        """
+        messages = self.mapped_frame(frame, mapped)['Message']
+
+        def match():
+            return KeywordMatcher(self.keywords).match_column(messages)
+
+        self.record('keyword_matching', source, len(messages), time_call(match, self.repeat)[0])
+        return mapped
+
+    def bench_categorize_duplicates(self, source, frame, mapped):
+        """
+        Times near-duplicate tagging of the messages.
+        """
+        df = self.mapped_frame(frame, mapped)
+        seconds = time_call(lambda: self.processor.categorize_duplicates(df), self.repeat)[0]
+        self.record('categorize_duplicates', source, len(df), seconds)
+        return mapped
+
+    def bench_predict_labels(self, source, frame, mapped):
+        """
+        Times the full labeling stage: keyword matching, classification, duplicates and date fields.
+        """
+        df = self.mapped_frame(frame, mapped)
+        saved = (model_registry.default_path, model_registry.model_directory, model_registry.current_path)
+        with tempfile.TemporaryDirectory() as model_directory:
+            model_path = self.model_path
+            if model_path is None:
+                model_path = os.path.join(model_directory, 'benchmark_model.pkl')
+                with open(model_path, 'wb') as model_file:
+                    pickle.dump(build_benchmark_model(df['Message'].tolist(), self.seed,
+                                                      backend=self.classifier_backend), model_file)
+            model_registry.default_path, model_registry.model_directory = model_path, model_directory
+            model_registry.current_path = None
+            try:
+                seconds = time_call(lambda: self.processor.predict_labels(df), self.repeat)[0]
+            finally:
+                model_registry.default_path, model_registry.model_directory, model_registry.current_path = saved
+        self.record('predict_labels', source, len(df), seconds)
+        return mapped
+
+    def bench_upload(self, source, frame, mapped):
+        """
+        Times uploading the mapped export twice, the second time as all duplicates.
+        """
+        mapped = mapped if mapped is not None else self.map_frame(frame)
+        records = mapped[:self.upload_rows] if self.upload_rows else mapped
+        connector = MongoDBConnector()
+        if self.mongo_url:
+            from pymongo import MongoClient
+            connector.client = MongoClient(self.mongo_url)
+        connector.db = connector.client[BENCHMARK_DATABASE]
+
+        def upload():
+            connector.client.drop_database(BENCHMARK_DATABASE)
+            connector.db[COLLECTION_UPLOAD].create_index("Link", unique=True)
+            connector.upload_elt_to_mongo(records, f"benchmark-{source}.csv")
+            # Uploading the same export again routes every row through duplicate handling
+            connector.upload_elt_to_mongo(records, f"benchmark-{source}.csv")
+
+        try:
+            seconds = time_call(upload, self.repeat)[0]
+        finally:
+            connector.client.drop_database(BENCHMARK_DATABASE)
+        self.record('upload', source, 2 * len(records), seconds, backend='mongod' if self.mongo_url else 'mongomock')
+        return mapped
+
+    def bench_process_entities(self, source, frame, mapped):
+        """
+        Times async entity extraction against the local completion stub, starting from an empty cache.
+        """
+        from entityprocessor import EntityProcessor
+        df = self.mapped_frame(frame, mapped).head(self.entity_rows)
+        stub = start_stub_server(latency=self.stub_latency)
+        saved_base, saved_key = openai.api_base, openai.api_key
+        try:
+            with tempfile.TemporaryDirectory() as cache_directory:
+                cache = EntityCache(os.path.join(cache_directory, 'entities.sqlite3'))
+                processor = EntityProcessor(cache=cache)
+                # Set after the processor, which applies the configured API key and base
+                openai.api_base, openai.api_key = f"http://127.0.0.1:{stub.server_port}/v1", "benchmark"
+                seconds = time_call(lambda: processor.process_entities_async(df.copy()), 1)[0]
+                cache.close()
+        finally:
+            stub.shutdown()
+            openai.api_base, openai.api_key = saved_base, saved_key
+        self.record('process_entities', source, len(df), seconds, backend='completion_stub')
+        return mapped
+
+
+def current_commit():
+    """
+    Returns the git commit of the working tree, if available.
+
+    Returns:
+        str: The commit hash, or None.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare_results(previous_path, results):
+    """
+    Prints how each benchmark changed against an earlier results file.
+
+    Args:
+        previous_path (str): The earlier JSON results.
+        results (list): The current results.
+    """
+    with open(previous_path) as previous_file:
+        previous = json.load(previous_file)
+    baseline = {(r['benchmark'], r['source'], r['rows']): r['seconds'] for r in previous['results']}
+    print(f"\nCompared with {previous.get('commit') or previous_path}:")
+    for result in results:
+        before = baseline.get((result['benchmark'], result['source'], result['rows']))
+        if before and result['seconds']:
+            print(f"{result['benchmark']:24s} {result['source']:15s} {result['rows']:>9d}  "
+                  f"{before:10.3f}s -> {result['seconds']:10.3f}s  x{before / result['seconds']:.2f}")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmarks the ingestion and processing pipeline on synthetic exports.")
+    arg_parser.add_argument('--sizes', default='1000,10000,100000',
+                            help="Comma-separated row counts, e.g. 1000,10000,100000,1000000")
+    arg_parser.add_argument('--benchmarks', default=','.join(BENCHMARKS),
+                            help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}")
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--repeat', type=int, default=1, help="Timed runs per benchmark; the fastest is kept")
+    arg_parser.add_argument('--mongo-url', default=None,
+                            help=f"MongoDB server for the upload benchmark (uses the '{BENCHMARK_DATABASE}' database). "
+                                 "Defaults to mongomock.")
+    arg_parser.add_argument('--upload-rows', type=int, default=None,
+                            help=f"Maximum rows uploaded (defaults to all rows, or {MONGOMOCK_UPLOAD_ROWS} with mongomock)")
+    arg_parser.add_argument('--entity-rows', type=int, default=1000,
+                            help="Maximum rows sent through entity extraction against the completion stub")
+    arg_parser.add_argument('--stub-latency', type=float, default=0.0,
+                            help="Seconds the completion stub waits per request")
+    arg_parser.add_argument('--model', default=None, help="Model file for predict_labels instead of a synthetic model")
+    arg_parser.add_argument('--classifier-backend', default='gradient_boosting', choices=list(CLASSIFIER_BACKENDS),
+                            help="Backend of the synthetic model used for predict_labels")
+    arg_parser.add_argument('--output', default='benchmark_results.json')
+    arg_parser.add_argument('--compare', default=None, help="An earlier results file to compare against")
+    args = arg_parser.parse_args()
+
+    suite = BenchmarkSuite([int(size) for size in args.sizes.split(',')], seed=args.seed, repeat=args.repeat,
+                           mongo_url=args.mongo_url, upload_rows=args.upload_rows, entity_rows=args.entity_rows,
+                           stub_latency=args.stub_latency, model_path=args.model,
+                           classifier_backend=args.classifier_backend)
+    results = suite.run([name.strip() for name in args.benchmarks.split(',')])
+
+    report = {
+        'commit': current_commit(),
+        'created_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'classifier_backend': None if args.model else args.classifier_backend,
+        'results': results,
+    }
+    with open(args.output, 'w') as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        compare_results(args.compare, results)
@@ -0,0 +1,97 @@
+from sklearn.ensemble import GradientBoostingClassifier
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer, TfidfVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.multiclass import OneVsRestClassifier
+from sklearn.pipeline import make_pipeline
+
+HASHING_FEATURES = 2 ** 18
+# Backend of models saved before the backend was recorded in the model file
+LEGACY_BACKEND = 'gradient_boosting'
+
+
+def _gradient_boosting(n_jobs, random_state):
+    """
+    TF-IDF features with gradient boosted trees. Accurate but slow, and single-core: `n_jobs` is ignored.
+    """
+    return TfidfVectorizer(), GradientBoostingClassifier(n_estimators=100, random_state=random_state)
+
+
+def _sgd(n_jobs, random_state):
+    """
+    TF-IDF features with a linear SVM trained by stochastic gradient descent, one-vs-rest across `n_jobs` cores.
+    """
+    return TfidfVectorizer(), SGDClassifier(n_jobs=n_jobs, random_state=random_state)
+
+
+def _logistic_regression(n_jobs, random_state):
+    """
+    TF-IDF features with one logistic regression per class, fitted across `n_jobs` cores.
+    """
+    return TfidfVectorizer(), OneVsRestClassifier(
+        LogisticRegression(solver='liblinear', random_state=random_state), n_jobs=n_jobs
+    )
+
+
+def _sgd_hashing(n_jobs, random_state):
+    """
+    Hashed TF-IDF features (no vocabulary to build or store) with the SGD linear SVM.
+    """
+    vectorizer = make_pipeline(HashingVectorizer(n_features=HASHING_FEATURES, alternate_sign=False),
+                               TfidfTransformer())
+    return vectorizer, SGDClassifier(n_jobs=n_jobs, random_state=random_state)
+
+
+CLASSIFIER_BACKENDS = {
+    'gradient_boosting': _gradient_boosting,
+    'sgd': _sgd,
+    'logistic_regression': _logistic_regression,
+    'sgd_hashing': _sgd_hashing,
+}
+
+
+def build_backend(name, n_jobs=None, random_state=42):
+    """
+    Creates an untrained vectorizer and classifier for a backend.
+
+    Args:
+        name (str): One of CLASSIFIER_BACKENDS.
+        n_jobs (int, optional): The number of cores used by backends that support it; -1 uses all cores.
+        random_state (int): The random seed.
+
+    Returns:
+        tuple: The vectorizer (with `fit`/`transform` on texts) and the classifier.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    if name not in CLASSIFIER_BACKENDS:
+        raise ValueError(f"Unknown classifier backend: {name}. Choose from {', '.join(CLASSIFIER_BACKENDS)}")
+    return CLASSIFIER_BACKENDS[name](n_jobs, random_state)
+
+
+def model_components(model):
+    """
+    Reads the vectorizer and classifier from a loaded model file, in the current or the original format.
+
+    Args:
+        model (dict): The loaded model.
+
+    Returns:
+        tuple: The vectorizer and the classifier.
+    """
+    if 'classifier' in model:
+        return model['vectorizer'], model['classifier']
+    return model['tfidf_vectorizer'], model['gb_classifier']
+
+
+def model_backend(model):
+    """
+    Reads which backend a loaded model was trained with.
+
+    Args:
+        model (dict): The loaded model.
+
+    Returns:
+        str: The backend name.
+    """
+    return model.get('backend', LEGACY_BACKEND)
@@ -0,0 +1,126 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENTITY_TYPES = ["Person Names", "Organization", "Hash Tags", "Location", "Brand", "Category", "URLs"]
+
+
+class CompletionStubHandler(BaseHTTPRequestHandler):
+    """
+    Answers OpenAI-style /v1/completions requests with canned entity lines, so entity extraction can be
+    exercised without calling the real API. Point GPT_API_BASE at http://host:port/v1 to use it.
+    """
+    latency = 0.0
+    failure_rate = 0.0
+    drop_rate = 0.0
+
+    def do_POST(self):
+        """
+        Handles a completion request.
+        """
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not self.path.rstrip('/').endswith('/completions'):
+            self._send(404, {"error": {"message": "Unknown endpoint", "type": "invalid_request_error"}})
+            return
+
+        time.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            self._send(429, {"error": {"message": "Rate limit reached (stub)", "type": "rate_limit_error"}})
+            return
+
+        prompt = json.loads(body or b'{}').get('prompt', '')
+        if 'Texts:\n' in prompt:
+            completion = self._batch_completion(prompt)
+        else:
+            words = prompt.rsplit('Text:', 1)[-1].split()
+            completion = '\n'.join(f"{et}: {words[i % len(words)] if words else ''}" for i, et in enumerate(ENTITY_TYPES))
+        self._send(200, {
+            "id": "cmpl-stub",
+            "object": "text_completion",
+            "created": int(time.time()),
+            "model": "stub",
+            "choices": [{"text": completion, "index": 0, "logprobs": None, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(completion) // 4,
+                      "total_tokens": (len(prompt) + len(completion)) // 4},
+        })
+
+    def _batch_completion(self, prompt):
+        """
+        Builds the JSON array answer of a batched prompt, leaving out a share of the texts (`drop_rate`)
+        so the per-message fallback gets exercised.
+
+        Args:
+            prompt (str): The batched prompt with one "[index] text" line per message.
+
+        Returns:
+            str: The completion text.
+        """
+        items = []
+        for line in prompt.split('Texts:\n', 1)[1].splitlines():
+            index, _, text = line.partition('] ')
+            if not index.startswith('[') or random.random() < self.drop_rate:
+                continue
+            words = text.split()
+            item = {"index": int(index[1:])}
+            item.update((et, words[i % len(words)] if words else None) for i, et in enumerate(ENTITY_TYPES))
+            items.append(item)
+        return json.dumps(items)
+
+    def _send(self, status, payload):
+        """
+        Writes a JSON response.
+
+        Args:
+            status (int): The HTTP status code.
+            payload (dict): The JSON body.
+        """
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        """
+        Silences per-request logging.
+        """
+
+
+def start_stub_server(port=0, latency=0.0, failure_rate=0.0, drop_rate=0.0):
+    """
+    Starts the stub completion server in a background thread.
+
+    Args:
+        port (int): The port to listen on; 0 picks a free port.
+        latency (float): Seconds to wait before answering each request.
+        failure_rate (float): The share of requests answered with HTTP 429.
+        drop_rate (float): The share of texts left out of batched answers.
+
+    Returns:
+        ThreadingHTTPServer: The running server; its API base is http://127.0.0.1:<server_port>/v1.
+    """
+    handler = type('ConfiguredCompletionStubHandler', (CompletionStubHandler,),
+                   {'latency': latency, 'failure_rate': failure_rate, 'drop_rate': drop_rate})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Local stand-in for the completion API.")
+    arg_parser.add_argument('--port', type=int, default=8765)
+    arg_parser.add_argument('--latency', type=float, default=0.0)
+    arg_parser.add_argument('--failure-rate', type=float, default=0.0)
+    arg_parser.add_argument('--drop-rate', type=float, default=0.0)
+    args = arg_parser.parse_args()
+
+    stub = start_stub_server(args.port, args.latency, args.failure_rate, args.drop_rate)
+    print(f"Completion stub listening on http://127.0.0.1:{stub.server_port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub.shutdown()
@@ -6,3 +6,4 @@ load_dotenv()
 
 SECRET_KEY = os.getenv('SECRET_KEY')
 GPT_API_KEY = os.getenv('GPT_KEY')
+GPT_API_BASE = os.getenv('GPT_API_BASE')  # Optional, e.g. a local stub server
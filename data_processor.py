@@ -1,48 +1,189 @@
-from settings import CONNECTION_URL,DATABASE_NAME,COLLECTION_KEYWORD,COLLECTION_UPLOAD,COLLECTION_POST
-from pymongo import MongoClient
+from settings import DATABASE_NAME,COLLECTION_KEYWORD,COLLECTION_UPLOAD,COLLECTION_POST,PREDICT_CHUNK_SIZE,PREDICT_WORKERS,PROCESSED_BACKFILL_BATCH_SIZE,VIDEO_RANDOM_SEED
 import pandas as pd
-import pickle
 import numpy as np
+from duplicate_index import DuplicateIndex
+from keyword_matcher import get_keyword_matcher
+from model_registry import model_registry
+from classifier_backends import model_components
+from collections import deque
+from pipelines import read_dataframe, connection_manager
+from concurrent.futures.process import BrokenProcessPool
+from process_pools import get_pool, discard_pool
+from workflow_metrics import workflow_metrics
+
+KEYWORD_PROJECTION = {"_id": 0, "Keyword": 1, "Theme": 1, "Sub Theme": 1}
+DAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+LABEL_COLUMNS = ['Themes', 'Subthemes', 'Subsubthemes']
+# "m:ss" label of every generated video duration, indexed by seconds.
+VIDEO_DURATION_LABELS = np.array([f"{sec // 60}:{sec % 60:02d}" for sec in range(901)], dtype=object)
+
+def _predict_messages(model, messages):
+    """
+    Predicts the combined 'Theme||Sub Theme||Sub Sub Theme' labels of a list of cleaned messages.
+
+    Args:
+        model (dict): The loaded model containing the vectorizer and classifier.
+        messages (list): The cleaned messages.
+
+    Returns:
+        np.ndarray: The predicted combined labels.
+    """
+    vectorizer, classifier = model_components(model)
+    return classifier.predict(vectorizer.transform(messages))
+
+
+def _predict_in_worker(model_path, messages):
+    """
+    Predicts labels in a worker process. The worker's model registry loads the model on the first chunk
+    and keeps it for later chunks and runs, until the file changes.
+
+    Args:
+        model_path (str): The path to the model file.
+        messages (list): The cleaned messages.
+
+    Returns:
+        np.ndarray: The predicted combined labels.
+    """
+    return _predict_messages(model_registry.get_model(model_path), messages)
+
+
+def _label_chunk(chunk, predicted_labels):
+    """
+    Splits combined labels into the 'Themes', 'Subthemes' and 'Subsubthemes' columns of a chunk.
+
+    Args:
+        chunk (pd.DataFrame): The rows the labels were predicted for.
+        predicted_labels (np.ndarray): The predicted combined labels, in row order.
+
+    Returns:
+        pd.DataFrame: The chunk with the label columns set.
+    """
+    labels = pd.DataFrame([x.strip().split('||') for x in predicted_labels],
+                          columns=LABEL_COLUMNS, index=chunk.index)
+    chunk[LABEL_COLUMNS] = labels
+    return chunk
+
 
 class DataProcessor:
     def __init__(self):
         """
         Initializes the DataProcessor class by setting up the MongoDB connection and fetching keyword data.
         """
-        self.client = MongoClient(CONNECTION_URL)
+        self.client = connection_manager.get_client()
         self.db = self.client[DATABASE_NAME]
-        self.keywords = self.fetch_data_from_mongo(COLLECTION_KEYWORD)
+        self.keywords = self.fetch_data_from_mongo(COLLECTION_KEYWORD, KEYWORD_PROJECTION)
+        self.keyword_matcher = get_keyword_matcher(self.keywords)
 
-    def fetch_data_from_mongo(self, collection_name):
+    def fetch_data_from_mongo(self, collection_name, projection=None):
         """
         Fetches data from a specified MongoDB collection and returns it as a pandas DataFrame.
 
         Args:
             collection_name (str): The name of the MongoDB collection to fetch data from.
+            projection (dict, optional): The fields to fetch. Defaults to all fields.
 
         Returns:
             pd.DataFrame: A DataFrame containing the fetched data, or None if an error occurs.
         """
         try:
-            collection = self.db[collection_name]
-            cursor = collection.find()
-            return pd.DataFrame(list(cursor))
+            return read_dataframe(self.db[collection_name], projection=projection)
         except Exception as e:
             print(f"Error fetching data from MongoDB: {e}")
             return None
 
     def fetch_new_entries(self):
         """
-        Fetches new entries from the 'uploaded_data' collection that are not present in the 'posts' collection.
+        Fetches new entries from the 'uploaded_data' collection that have not been processed into the 'posts' collection.
+
+        Uploads are flagged with `processed: False` and flipped by `mark_processed` once their post is stored,
+        so the query is served by the index on 'processed' and costs O(new documents).
 
         Returns:
             pd.DataFrame: A DataFrame containing the new entries.
         """
         uploaded_data_collection = self.db[COLLECTION_UPLOAD]
+        self.backfill_processed_flag()
+        return read_dataframe(uploaded_data_collection, {"processed": False}, {"processed": 0})
+
+    def backfill_processed_flag(self, batch_size=PROCESSED_BACKFILL_BATCH_SIZE):
+        """
+        Sets the 'processed' flag on uploads stored before the flag existed, by checking which of them already
+        have a post. Once every upload carries the flag this is a single empty index lookup.
+
+        Args:
+            batch_size (int): The number of uploads checked against 'posts' per query.
+        """
+        uploaded_data_collection = self.db[COLLECTION_UPLOAD]
         posts_collection = self.db[COLLECTION_POST]
-        existing_ids = set(post["transform_data_id"] for post in posts_collection.find({}, {"transform_data_id": 1}))
-        new_entries = list(uploaded_data_collection.find({"_id": {"$nin": list(existing_ids)}}))
-        return pd.DataFrame(list(new_entries))
+        cursor = uploaded_data_collection.find({"processed": None}, {"_id": 1}).batch_size(batch_size)
+
+        batch = []
+        for document in cursor:
+            batch.append(document["_id"])
+            if len(batch) >= batch_size:
+                self._backfill_batch(batch, uploaded_data_collection, posts_collection)
+                batch = []
+        if batch:
+            self._backfill_batch(batch, uploaded_data_collection, posts_collection)
+
+    def _backfill_batch(self, ids, uploaded_data_collection, posts_collection):
+        """
+        Flags one batch of legacy uploads as processed or not.
+
+        Args:
+            ids (list): The '_id' values of the uploads.
+            uploaded_data_collection (Collection): The 'uploaded_data' collection.
+            posts_collection (Collection): The 'posts' collection.
+        """
+        processed_ids = posts_collection.distinct("transform_data_id", {"transform_data_id": {"$in": ids}})
+        processed_set = set(processed_ids)
+        uploaded_data_collection.update_many({"_id": {"$in": processed_ids}}, {"$set": {"processed": True}})
+        uploaded_data_collection.update_many(
+            {"_id": {"$in": [_id for _id in ids if _id not in processed_set]}}, {"$set": {"processed": False}}
+        )
+
+    def mark_processed(self, transform_data_ids, batch_size=PROCESSED_BACKFILL_BATCH_SIZE):
+        """
+        Flags uploads as processed once their posts have been stored, so later fetches skip them.
+
+        Args:
+            transform_data_ids (list): The '_id' values of the processed uploads.
+            batch_size (int): The number of uploads updated per query.
+        """
+        uploaded_data_collection = self.db[COLLECTION_UPLOAD]
+        for i in range(0, len(transform_data_ids), batch_size):
+            uploaded_data_collection.update_many(
+                {"_id": {"$in": transform_data_ids[i:i + batch_size]}}, {"$set": {"processed": True}}
+            )
+
+    def mark_in_flight(self, transform_data_ids, batch_size=PROCESSED_BACKFILL_BATCH_SIZE):
+        """
+        Clears the 'processed' flag of uploads whose posts are about to be stored. If the process dies before
+        `mark_processed`, the next `fetch_new_entries` settles them through `backfill_processed_flag`
+        instead of processing them again.
+
+        Args:
+            transform_data_ids (list): The '_id' values of the uploads being stored.
+            batch_size (int): The number of uploads updated per query.
+        """
+        uploaded_data_collection = self.db[COLLECTION_UPLOAD]
+        for i in range(0, len(transform_data_ids), batch_size):
+            uploaded_data_collection.update_many(
+                {"_id": {"$in": transform_data_ids[i:i + batch_size]}}, {"$set": {"processed": None}}
+            )
+
+    def reconcile_processed(self, transform_data_ids, batch_size=PROCESSED_BACKFILL_BATCH_SIZE):
+        """
+        Flags uploads by whether their post exists, e.g. after an insert that failed partway.
+
+        Args:
+            transform_data_ids (list): The '_id' values of the uploads to check.
+            batch_size (int): The number of uploads checked against 'posts' per query.
+        """
+        uploaded_data_collection = self.db[COLLECTION_UPLOAD]
+        posts_collection = self.db[COLLECTION_POST]
+        for i in range(0, len(transform_data_ids), batch_size):
+            self._backfill_batch(transform_data_ids[i:i + batch_size], uploaded_data_collection, posts_collection)
 
     def update_engagement_bucket(self, df):
         """
@@ -58,12 +199,13 @@ class DataProcessor:
             df["engagement_bucket"] = df["engagement_bucket"].str.replace("Engagement", "", regex=True).str.strip()
         return df
 
-    def assign_random_video_values(self, df):
+    def assign_random_video_values(self, df, seed=VIDEO_RANDOM_SEED):
         """
         Assigns random video views, duration, and duration bucket values for rows where the post type is 'Video'.
 
         Args:
             df (pd.DataFrame): The DataFrame containing video-related data.
+            seed (int, optional): Seeds the random values so runs are reproducible.
 
         Returns:
             pd.DataFrame: The DataFrame with updated video-related columns.
@@ -73,14 +215,37 @@ class DataProcessor:
         df["Video Duration"] = df["Video Duration"].astype(str)
         df["Video Duration Bucket"] = df["Video Duration Bucket"].astype(str)
 
-        for idx, row in df.iterrows():
-            if row.get("Post Type") == "Video":
-                df.at[idx, "Video Views"] = np.random.randint(100, 10001)
-                video_duration_sec = np.random.randint(30, 901)
-                df.at[idx, "Video Duration"] = f"{video_duration_sec // 60}:{video_duration_sec % 60:02d}"
-                df.at[idx, "Video Duration Bucket"] = self.assign_duration_bucket(video_duration_sec)
+        if "Post Type" not in df.columns:
+            return df
+        is_video = (df["Post Type"] == "Video").to_numpy()
+        video_count = int(is_video.sum())
+        if video_count == 0:
+            return df
+
+        rng = np.random.default_rng(seed)
+        draws = rng.integers([100, 30], [10001, 901], size=(video_count, 2))
+        video_duration_sec = draws[:, 1]
+        df.loc[is_video, "Video Views"] = draws[:, 0]
+        df.loc[is_video, "Video Duration"] = VIDEO_DURATION_LABELS[video_duration_sec]
+        df.loc[is_video, "Video Duration Bucket"] = self.assign_duration_buckets(video_duration_sec)
         return df
 
+    def assign_duration_buckets(self, duration_sec):
+        """
+        Assigns duration buckets to an array of video durations, with the same ranges as `assign_duration_bucket`.
+
+        Args:
+            duration_sec (np.ndarray): The durations of the videos in seconds.
+
+        Returns:
+            np.ndarray: The corresponding duration buckets.
+        """
+        return np.select(
+            [duration_sec <= 30, duration_sec <= 59, duration_sec <= 119, duration_sec <= 299, duration_sec <= 599],
+            ["5-30 Sec", "31-59 Sec", "1-2 Min", "2-5 Min", "5-10 Min"],
+            default=">10 Min",
+        ).astype(object)
+
     def assign_duration_bucket(self, duration_sec):
         """
         Assigns a duration bucket based on the video duration in seconds.
@@ -129,15 +294,13 @@ class DataProcessor:
         Returns:
             tuple: A tuple containing the matched theme, subtheme, and subsubtheme (if any).
         """
-        for keyword, theme, subtheme in zip(keyword_data['Keyword'], keyword_data['Theme'], keyword_data['Sub Theme']):
-            keyword = keyword.lower().replace('#', '')
-            if keyword in text.lower():
-                return theme, subtheme, None
-        return None, None, None
+        return get_keyword_matcher(keyword_data).match(text)
 
     def predict_labels(self, new_data):
         """
         Predicts labels (themes, subthemes, and subsubthemes) for the new data using a pre-trained model.
+        Only the labels of each predicted chunk are kept, so the rows are not copied a second time. All
+        chunks are labeled before returning, since duplicate tagging compares every message with the others.
 
         Args:
             new_data (pd.DataFrame): The DataFrame containing the new data to be labeled.
@@ -145,82 +308,120 @@ class DataProcessor:
         Returns:
             pd.DataFrame: The DataFrame with predicted labels and derived timestamp fields.
         """
-        with open("model_q2.pkl", 'rb') as model_file:
-            model_bytes = model_file.read()
-        model = pickle.loads(model_bytes)
-        tfidf_vectorizer = model['tfidf_vectorizer']
-        gb_classifier = model['gb_classifier']
-        new_data = new_data.apply(self.apply_keyword_matching, axis=1)
-        new_data_tfidf = tfidf_vectorizer.transform(new_data['Message'])
-        predicted_labels = gb_classifier.predict(new_data_tfidf)
-
-        df = pd.DataFrame([x.strip().split('||') for x in predicted_labels], columns=['Themes', 'Subthemes', 'Subsubthemes'])
-        new_data[['Themes', 'Subthemes', 'Subsubthemes']] = df[['Themes', 'Subthemes', 'Subsubthemes']]
+        with workflow_metrics.stage("keyword_matching", len(new_data)) as stage:
+            new_data = self.apply_keyword_matching(new_data.copy())
+            stage.rows_out = len(new_data)
+        if len(new_data) > 0:
+            labels = [chunk[LABEL_COLUMNS] for chunk in self.stream_predict_labels(new_data)]
+            new_data[LABEL_COLUMNS] = pd.concat(labels).to_numpy()
         new_data.reset_index(drop=True, inplace=True)
         df = new_data
-        df = self.categorize_duplicates(df)
-        df['Timestamp'] = df['Publish Date / Time'].apply(self.derive_date_fields)
+        with workflow_metrics.stage("categorize_duplicates", len(df)) as stage:
+            df = self.categorize_duplicates(df)
+            stage.rows_out = len(df)
         df['Publish Date / Time'] = pd.to_datetime(df['Publish Date / Time'], format='%d-%m-%Y %H:%M:%S')
+        df['Timestamp'] = self.derive_date_fields(df['Publish Date / Time'])
         return df
 
-    def derive_date_fields(self, timestamp_str):
+    def stream_predict_labels(self, new_data, chunk_size=PREDICT_CHUNK_SIZE, workers=PREDICT_WORKERS):
+        """
+        Predicts labels chunk by chunk and yields each labeled chunk as soon as it is ready, so only one
+        chunk's TF-IDF matrix is held in memory per worker. With several workers, chunks are predicted in
+        the process pool shared with text cleaning.
+
+        Args:
+            new_data (pd.DataFrame): The DataFrame containing the new data to be labeled.
+            chunk_size (int): The number of rows vectorized and classified at a time.
+            workers (int): The number of worker processes; 1 predicts in the current process.
+
+        Yields:
+            pd.DataFrame: Consecutive chunks of `new_data` with 'Themes', 'Subthemes' and 'Subsubthemes' set.
+        """
+        chunks = (new_data.iloc[i:i + chunk_size].copy() for i in range(0, len(new_data), chunk_size))
+
+        model_path, model = model_registry.get_current()
+        if workers <= 1 or len(new_data) <= chunk_size:
+            for chunk in chunks:
+                yield _label_chunk(chunk, _predict_messages(model, chunk['Message'].tolist()))
+            return
+
+        executor = get_pool(workers)
+        pending = deque()
+        try:
+            for chunk in chunks:
+                pending.append((chunk, executor.submit(_predict_in_worker, model_path, chunk['Message'].tolist())))
+                # Keep a bounded window of chunks in flight so results are not buffered for the whole backlog
+                if len(pending) >= workers * 2:
+                    chunk, future = pending.popleft()
+                    yield _label_chunk(chunk, future.result())
+            while pending:
+                chunk, future = pending.popleft()
+                yield _label_chunk(chunk, future.result())
+        except BrokenProcessPool:
+            discard_pool(workers)
+            raise
+        finally:
+            # The pool outlives this call; drop the chunks of a run that stopped early
+            for _, future in pending:
+                future.cancel()
+
+    def derive_date_fields(self, timestamps):
         """
-        Derives various date and time fields from a timestamp string.
+        Derives various date and time fields from a column of parsed timestamps.
 
         Args:
-            timestamp_str (str): The timestamp string to be processed.
+            timestamps (pd.Series): The parsed publish timestamps.
 
         Returns:
-            dict: A dictionary containing various derived date and time fields.
-        """
-        timestamp = pd.to_datetime(timestamp_str, dayfirst=True)
-        formatted_date = timestamp.strftime('%d-%m-%Y')
-        formatted_time = timestamp.strftime('%H:%M:%S')
-        day_of_month = timestamp.day
-        month = timestamp.month
-        year = timestamp.year
-        day_of_week = timestamp.strftime('%a')
-        week_number = timestamp.strftime('%U')
-        date_type = 'Weekend' if timestamp.weekday() in [5, 6] else 'Weekday'
-        hour_24 = timestamp.strftime('%H')
-        hour_12 = timestamp.strftime('%I')
-        minute = timestamp.strftime('%M')
-        am_pm = timestamp.strftime('%p')
-
-        return {
-            "Formatted_Date": formatted_date,
-            "Formatted_Time": formatted_time,
-            "Day_of_Month": day_of_month,
-            "Month": month,
-            "Year": year,
-            "Day_of_Week": day_of_week,
-            "Week_Number": week_number,
-            "Date_Type": date_type,
-            "Hour_24_Format": hour_24,
-            "Hour_12_Format": hour_12,
-            "Minute": minute,
-            "AM_PM": am_pm
-        }
-
-    def apply_keyword_matching(self, row):
-        """
-        Applies keyword matching to a row of data to update themes, subthemes, and subsubthemes.
+            list: A dictionary of derived date and time fields for each timestamp.
+        """
+        day_of_month = timestamps.dt.day.tolist()
+        month = timestamps.dt.month.tolist()
+        year = timestamps.dt.year.tolist()
+        hour = timestamps.dt.hour.tolist()
+        minute = timestamps.dt.minute.tolist()
+        second = timestamps.dt.second.tolist()
+        weekday = timestamps.dt.dayofweek.to_numpy()
+        # '%U' numbering: weeks start on Sunday and days before the first Sunday are in week 0.
+        week_number = (timestamps.dt.dayofyear.to_numpy() + 6 - (weekday + 1) % 7) // 7
+
+        return [
+            {
+                "Formatted_Date": f"{d:02d}-{m:02d}-{y}",
+                "Formatted_Time": f"{h:02d}:{mi:02d}:{sec:02d}",
+                "Day_of_Month": d,
+                "Month": m,
+                "Year": y,
+                "Day_of_Week": DAY_NAMES[wd],
+                "Week_Number": f"{wn:02d}",
+                "Date_Type": 'Weekend' if wd in (5, 6) else 'Weekday',
+                "Hour_24_Format": f"{h:02d}",
+                "Hour_12_Format": f"{h % 12 or 12:02d}",
+                "Minute": f"{mi:02d}",
+                "AM_PM": 'AM' if h < 12 else 'PM'
+            }
+            for d, m, y, h, mi, sec, wd, wn in zip(day_of_month, month, year, hour, minute, second,
+                                                    weekday.tolist(), week_number.tolist())
+        ]
+
+    def apply_keyword_matching(self, df):
+        """
+        Applies keyword matching to the whole 'Message' column to update themes, subthemes, and subsubthemes.
 
         Args:
-            row (pd.Series): The row of data to be processed.
+            df (pd.DataFrame): The DataFrame to be processed.
 
         Returns:
-            pd.Series: The row with updated themes, subthemes, and subsubthemes.
-        """
-        data = self.keywords
-        keyword_data = data.drop('_id', axis=1, errors='ignore')
-        text = row['Message']
-        theme, subtheme, subsubtheme = self.update_themes_subthemes(text, keyword_data)
-        if theme is not None and subtheme is not None and subsubtheme is not None:
-            row['Themes'] = theme
-            row['Subthemes'] = subtheme
-            row['Subsubthemes'] = subsubtheme
-        return row
+            pd.DataFrame: The DataFrame with updated themes, subthemes, and subsubthemes.
+        """
+        matches = self.keyword_matcher.match_column(df['Message'])
+        matched = matches.notna().all(axis=1)
+        if matched.any():
+            for column in ['Themes', 'Subthemes', 'Subsubthemes']:
+                if column not in df.columns:
+                    df[column] = np.nan
+                df.loc[matched, column] = matches.loc[matched, column]
+        return df
 
     def calculate_match_percentage(self, message1, message2):
         """
@@ -249,6 +450,10 @@ class DataProcessor:
         """
         Categorizes duplicate entries in the DataFrame based on a match threshold.
 
+        Messages are visited in index order; every later message sharing at least `match_threshold` of an
+        earlier, still uncategorized message's words (see `calculate_match_percentage`) is tagged False.
+        Candidates come from an inverted token index, so only plausible pairs are compared.
+
         Args:
             new_data (pd.DataFrame): The DataFrame containing the data to be categorized.
             column_to_check (str): The column to check for duplicates.
@@ -257,26 +462,6 @@ class DataProcessor:
         Returns:
             pd.DataFrame: The DataFrame with categorized duplicates.
         """
-        new_data['Tag'] = True
-        categorized_statements = set()
-        uncategorized_statements = set(new_data.index)
-
-        while len(uncategorized_statements) > 0:
-            statement1_index = uncategorized_statements.pop()
-            statement1 = new_data.at[statement1_index, column_to_check]
-            duplicate_indices = set()
-
-            for statement2_index in list(uncategorized_statements):
-                statement2 = new_data.at[statement2_index, column_to_check]
-                match_percentage = self.calculate_match_percentage(statement1, statement2)
-
-                if match_percentage >= match_threshold:
-                    duplicate_indices.add(statement2_index)
-
-            if len(duplicate_indices) > 0:
-                categorized_statements.add(statement1_index)
-                for duplicate_index in duplicate_indices:
-                    uncategorized_statements.remove(duplicate_index)
-                    new_data.at[duplicate_index, 'Tag'] = False
-
+        index = DuplicateIndex(new_data[column_to_check].tolist(), match_threshold)
+        new_data['Tag'] = index.find_duplicates()
         return new_data
\ No newline at end of file
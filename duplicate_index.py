@@ -0,0 +1,91 @@
+import math
+from bisect import bisect_right
+from collections import defaultdict
+import pandas as pd
+
+
+class DuplicateIndex:
+    def __init__(self, messages, match_threshold=0.8):
+        """
+        Builds an inverted token index over a sequence of messages so that near-duplicates can be found
+        without comparing every message against every other one.
+
+        Args:
+            messages (iterable): The messages to index, in the order they should be visited.
+            match_threshold (float): The share of an anchor message's words another message must contain.
+        """
+        self.match_threshold = match_threshold
+        self.word_sets = [None if pd.isna(message) else set(message.split()) for message in messages]
+        self.postings = defaultdict(list)
+        for position, words in enumerate(self.word_sets):
+            if words is None:
+                continue
+            for word in words:
+                self.postings[word].append(position)
+
+    def required_overlap(self, word_count):
+        """
+        Computes the smallest number of shared words that satisfies the match threshold for an anchor message.
+
+        Args:
+            word_count (int): The number of distinct words in the anchor message.
+
+        Returns:
+            int: The minimum overlap, using the same floating point comparison as the pairwise check.
+        """
+        overlap = max(0, math.ceil(self.match_threshold * word_count))
+        while overlap > 0 and (overlap - 1) / word_count >= self.match_threshold:
+            overlap -= 1
+        while overlap <= word_count and overlap / word_count < self.match_threshold:
+            overlap += 1
+        return overlap
+
+    def candidates(self, position, alive):
+        """
+        Collects the later, still uncategorized positions that could match the anchor at `position`.
+
+        Any message sharing `overlap` of the anchor's `n` words must contain at least one of any
+        `n - overlap + 1` of them, so only the posting lists of the anchor's rarest words are probed.
+
+        Args:
+            position (int): The position of the anchor message.
+            alive (list): Flags marking which positions are still uncategorized.
+
+        Returns:
+            set: The candidate positions to verify.
+        """
+        words = self.word_sets[position]
+        overlap = self.required_overlap(len(words))
+        if overlap > len(words):
+            return set()
+
+        prefix = sorted(words, key=lambda word: len(self.postings[word]))[:len(words) - overlap + 1]
+        found = set()
+        for word in prefix:
+            postings = self.postings[word]
+            for other in postings[bisect_right(postings, position):]:
+                if alive[other]:
+                    found.add(other)
+        return found
+
+    def find_duplicates(self):
+        """
+        Visits the messages in order and marks every later message that repeats at least `match_threshold`
+        of an earlier, still uncategorized message's words, mirroring the pairwise greedy loop.
+
+        Returns:
+            list: One flag per message, False for messages categorized as duplicates.
+        """
+        alive = [True] * len(self.word_sets)
+        if self.match_threshold <= 0:
+            # Every pair scores at least 0.0, so the first message absorbs all the others.
+            return [position == 0 for position in range(len(alive))]
+
+        for position, words in enumerate(self.word_sets):
+            if not alive[position] or not words:
+                continue
+            overlap = self.required_overlap(len(words))
+            for other in self.candidates(position, alive):
+                if len(words & self.word_sets[other]) >= overlap:
+                    alive[other] = False
+        return alive
@@ -1,64 +1,117 @@
-from settings import CONNECTION_URL,DATABASE_NAME,COLLECTION_UPLOAD
-from pymongo import MongoClient, ASCENDING
+from settings import DATABASE_NAME, COLLECTION_UPLOAD, COLLECTION_ENGAGEMENT_BUCKETS
+from pymongo import DESCENDING
+from pipelines import connection_manager
 
-def categorize_and_store_engagement_buckets():
+# Documents mapped by FieldMapper store the value as 'Engagement'; older uploads stored it as 'engagement'
+ENGAGEMENT_FIELDS = ('Engagement', 'engagement')
+ENGAGEMENT_VALUE = {'$ifNull': [f'${field}' for field in ENGAGEMENT_FIELDS]}
+
+
+def engagement_bucket_expression(field=ENGAGEMENT_VALUE):
+    """
+    Builds the `$switch` expression that maps an engagement value to its bucket. Values outside every
+    bucket (negative values, or fractions between two buckets) map to None.
+
+    Args:
+        field (str or dict): The field path or expression holding the engagement value.
+            Defaults to the first of `ENGAGEMENT_FIELDS` the document has.
+
+    Returns:
+        dict: The aggregation expression.
+    """
+    def between(lower, upper):
+        return {'$and': [{'$gte': [field, lower]}, {'$lte': [field, upper]}]}
+
+    return {'$switch': {
+        'branches': [
+            {'case': between(0, 100), 'then': '0-100'},
+            {'case': between(101, 500), 'then': '101-500'},
+            {'case': between(501, 1000), 'then': '501-1000'},
+            {'case': {'$gt': [field, 1000]}, 'then': '1000+'},
+        ],
+        'default': None,
+    }}
+
+
+def build_engagement_pipeline(after_id=None, store_document=True):
+    """
+    Builds the aggregation pipeline that buckets uploaded documents and merges them into the output collection.
+
+    Args:
+        after_id (ObjectId, optional): Only documents with a larger `_id` are bucketed. None buckets all documents.
+        store_document (bool): Whether to embed the whole source document, or only keep a reference to it.
+
+    Returns:
+        list: The pipeline stages.
+    """
+    match = {'$or': [{field: {'$type': 'number'}} for field in ENGAGEMENT_FIELDS]}
+    if after_id is not None:
+        match['_id'] = {'$gt': after_id}
+
+    projection = {
+        '_id': 0,
+        'bucket': engagement_bucket_expression(),
+        'document_id': '$_id',
+    }
+    if store_document:
+        projection['document'] = '$$ROOT'
+    else:
+        projection['engagement'] = ENGAGEMENT_VALUE
+
+    return [
+        {'$match': match},
+        {'$project': projection},
+        {'$match': {'bucket': {'$ne': None}}},
+        {'$merge': {
+            'into': COLLECTION_ENGAGEMENT_BUCKETS,
+            'on': 'document_id',
+            'whenMatched': 'replace',
+            'whenNotMatched': 'insert',
+        }},
+    ]
+
+
+def categorize_and_store_engagement_buckets(full=False, store_document=True):
     """
     Categorizes engagement values from the 'uploaded_data' collection into predefined buckets
     and stores the results in the 'engagement_buckets' collection. Each entry in the output
-    collection includes the bucket category, the original document ID, and the document itself.
-    A unique index is enforced on the 'document_id' field to prevent duplicates.
+    collection includes the bucket category, the original document ID, and the document itself
+    (or only its engagement value when `store_document` is False).
+
+    The bucketing runs on the server as a single aggregation pipeline ending in `$merge` on
+    'document_id' (unique index created by `pipelines.ensure_indexes`), so reruns update existing
+    entries instead of failing on the index.
+    By default only documents newer than the last bucketed one are processed; ObjectIds from
+    different clients are only roughly ordered, so pass `full=True` to rebucket everything.
 
     Steps:
-    1. Connects to the MongoDB database.
-    2. Creates a unique index on the 'document_id' field in the output collection.
-    3. Iterates through all documents in the input collection.
-    4. Categorizes engagement values into buckets: '0-100', '101-500', '501-1000', or '1000+'.
-    5. Stores the categorized data in the output collection.
-    6. Closes the database connection.
+    1. Gets the database from the shared connection pool.
+    2. Finds the largest 'document_id' already bucketed, unless `full` is set.
+    3. Categorizes engagement values into buckets: '0-100', '101-500', '501-1000', or '1000+'.
+    4. Merges the categorized data into the output collection.
+
+    Args:
+        full (bool): Whether to rebucket all documents instead of only the new ones.
+        store_document (bool): Whether to embed the whole source document in each entry.
+
+    Returns:
+        int: The number of entries in the output collection after the run.
     """
-    # Connect to the MongoDB database
-    client = MongoClient(CONNECTION_URL)
-    db = client[DATABASE_NAME]
+    # Use the shared MongoDB connection pool
+    db = connection_manager.get_database(DATABASE_NAME)
 
     # Define input and output collections
     input_collection = db[COLLECTION_UPLOAD]
-    output_collection = db['engagement_buckets']
-
-    # Ensure a unique index on 'document_id' to prevent duplicate entries
-    output_collection.create_index([('document_id', ASCENDING)], unique=True)
-
-    # Fetch all documents from the input collection
-    all_documents = input_collection.find()
-
-    # Categorize engagement values and store results in the output collection
-    for document in all_documents:
-        if 'engagement' in document:
-            engagement_value = document['engagement']
-            document_id = document['_id']
-
-            # Determine the engagement bucket
-            if 0 <= engagement_value <= 100:
-                bucket = '0-100'
-            elif 101 <= engagement_value <= 500:
-                bucket = '101-500'
-            elif 501 <= engagement_value <= 1000:
-                bucket = '501-1000'
-            elif engagement_value > 1000:
-                bucket = '1000+'
-            else:
-                bucket = None
-
-            # Insert the categorized data into the output collection
-            if bucket:
-                output_collection.insert_one({
-                    'bucket': bucket,
-                    'document_id': document_id,
-                    'document': document
-                })
-
-    # Close the database connection
-    client.close()
+    output_collection = db[COLLECTION_ENGAGEMENT_BUCKETS]
+
+    after_id = None
+    if not full:
+        last = output_collection.find_one({}, {'document_id': 1}, sort=[('document_id', DESCENDING)])
+        after_id = last['document_id'] if last else None
+
+    input_collection.aggregate(build_engagement_pipeline(after_id, store_document), allowDiskUse=True)
+    return output_collection.estimated_document_count()
 
 # Example usage
 if __name__ == "__main__":
-    categorize_and_store_engagement_buckets()
\ No newline at end of file
+    categorize_and_store_engagement_buckets()
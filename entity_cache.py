@@ -0,0 +1,124 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from settings import ENTITY_CACHE_PATH, ENTITY_CACHE_TTL_SECONDS, ENTITY_CACHE_MAX_ENTRIES
+
+
+class EntityCache:
+    def __init__(self, path=ENTITY_CACHE_PATH, ttl_seconds=ENTITY_CACHE_TTL_SECONDS, max_entries=ENTITY_CACHE_MAX_ENTRIES):
+        """
+        Initializes a local SQLite cache of extracted entities, keyed by message content, prompt and model.
+
+        Args:
+            path (str): The path of the SQLite database file.
+            ttl_seconds (int): How long an entry stays valid after it is written.
+            max_entries (int): The number of entries kept before the least recently used ones are evicted.
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS entities ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS entities_last_used ON entities (last_used)")
+
+    @staticmethod
+    def make_key(message, prompt_version, model):
+        """
+        Builds the content address of a message: whitespace and case are normalized before hashing.
+
+        Args:
+            message (str): The message the entities were extracted from.
+            prompt_version (str): The version of the extraction prompt.
+            model (str): The completion model used for extraction.
+
+        Returns:
+            str: The hex digest identifying the cache entry.
+        """
+        normalized = ' '.join(str(message).split()).lower()
+        return hashlib.sha256(f"{model}\x1f{prompt_version}\x1f{normalized}".encode('utf-8')).hexdigest()
+
+    def get_many(self, keys):
+        """
+        Looks up several entries at once, ignoring expired ones.
+
+        Args:
+            keys (iterable): The cache keys to look up.
+
+        Returns:
+            dict: The cached entity dictionaries found, by key.
+        """
+        keys = list(keys)
+        now = time.time()
+        found = {}
+        with self.lock:
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = self.connection.execute(
+                    f"SELECT key, value FROM entities WHERE key IN ({placeholders}) AND created_at >= ?",
+                    (*batch, now - self.ttl_seconds),
+                ).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+            if found:
+                with self.connection:
+                    self.connection.executemany(
+                        "UPDATE entities SET last_used = ? WHERE key = ?", [(now, key) for key in found]
+                    )
+        return found
+
+    def get(self, key):
+        """
+        Looks up a single entry.
+
+        Args:
+            key (str): The cache key to look up.
+
+        Returns:
+            dict: The cached entity dictionary, or None if it is missing or expired.
+        """
+        return self.get_many([key]).get(key)
+
+    def set_many(self, entries):
+        """
+        Stores several entries and evicts expired and least recently used entries beyond `max_entries`.
+
+        Args:
+            entries (dict): The entity dictionaries to store, by key.
+        """
+        if not entries:
+            return
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO entities (key, value, created_at, last_used) VALUES (?, ?, ?, ?)",
+                [(key, json.dumps(value), now, now) for key, value in entries.items()],
+            )
+            self.connection.execute("DELETE FROM entities WHERE created_at < ?", (now - self.ttl_seconds,))
+            self.connection.execute(
+                "DELETE FROM entities WHERE key IN "
+                "(SELECT key FROM entities ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def set(self, key, entities):
+        """
+        Stores a single entry.
+
+        Args:
+            key (str): The cache key.
+            entities (dict): The extracted entities to cache.
+        """
+        self.set_many({key: entities})
+
+    def close(self):
+        """
+        Closes the underlying SQLite connection.
+        """
+        with self.lock:
+            self.connection.close()
@@ -1,17 +1,100 @@
-from config import GPT_API_KEY
+from config import GPT_API_KEY, GPT_API_BASE
+from settings import (ENTITY_MODEL, ENTITY_PROMPT_VERSION, ENTITY_CONCURRENCY, ENTITY_BATCH_SIZE,
+                      ENTITY_BATCH_PROMPT_VERSION, ENTITY_BATCH_TOKENS_PER_MESSAGE)
+from entity_cache import EntityCache
+from async_extractor import AsyncEntityExtractor
+import asyncio
+import json
 import openai
 import pandas as pd
 from concurrent.futures import ThreadPoolExecutor
 
 class EntityProcessor:
-    def __init__(self):
+    def __init__(self, cache=None, batch_size=ENTITY_BATCH_SIZE):
         """
         Initializes the EntityProcessor class by setting up the OpenAI API key and defining the entity types to extract.
+
+        Args:
+            cache (EntityCache, optional): The cache of previously extracted entities. Defaults to the local SQLite cache.
+            batch_size (int, optional): The number of messages packed into one completion request; 1 sends one per request.
         """
         openai.api_key = GPT_API_KEY
         self.entity_types = ["Person Names", "Organization", "Hash Tags", "Location", "Brand", "Category", "URLs"]
+        self.model = ENTITY_MODEL
+        self.batch_size = max(1, batch_size)
+        self.prompt_version = ENTITY_PROMPT_VERSION if self.batch_size == 1 else ENTITY_BATCH_PROMPT_VERSION
+        self.cache = cache if cache is not None else EntityCache()
+        self.completion_params = {
+            "engine": self.model,
+            "max_tokens": 1024,
+            "n": 1,
+            "stop": None,
+            "temperature": 0.5,
+        }
+        if GPT_API_BASE:
+            openai.api_base = GPT_API_BASE
+
+    def cache_key(self, message):
+        """
+        Builds the cache key of a message for the current prompt and model.
+
+        Args:
+            message (str): The text message.
+
+        Returns:
+            str: The cache key.
+        """
+        return EntityCache.make_key(message, self.prompt_version, self.model)
+
+    def message_key(self, message):
+        """
+        Builds the cache key of a message for the single-message prompt. Messages extracted on their own are
+        cached under it in either mode, so batched and single-message results are never stored under the same
+        prompt version.
+
+        Args:
+            message (str): The text message.
+
+        Returns:
+            str: The cache key.
+        """
+        return EntityCache.make_key(message, ENTITY_PROMPT_VERSION, self.model)
+
+    def cache_entries(self, extracted, messages, single_keys):
+        """
+        Prepares extracted entities for the cache, moving the messages extracted on their own to their
+        single-message key.
+
+        Args:
+            extracted (dict): The extracted entities by cache key.
+            messages (dict): The message of each cache key.
+            single_keys (set): The cache keys of the messages extracted on their own.
+
+        Returns:
+            dict: The entities to store, by the key matching the prompt that produced them.
+        """
+        return {self.message_key(messages[key]) if key in single_keys else key: entity_dict
+                for key, entity_dict in extracted.items()}
 
     def extract_entities(self, message):
+        """
+        Extracts entities from a given message, serving repeated messages from the entity cache.
+
+        Args:
+            message (str): The text message from which entities need to be extracted.
+
+        Returns:
+            dict: A dictionary containing the extracted entities for each entity type, or None if an error occurs.
+        """
+        key = self.message_key(message)
+        entity_dict = self.cache.get(key)
+        if entity_dict is None:
+            entity_dict = self.request_entities(message)
+            if entity_dict is not None:
+                self.cache.set(key, entity_dict)
+        return entity_dict
+
+    def request_entities(self, message):
         """
         Extracts entities from a given message using OpenAI's GPT-3.5-turbo-instruct model.
 
@@ -22,29 +105,127 @@ class EntityProcessor:
             dict: A dictionary containing the extracted entities for each entity type, or None if an error occurs.
         """
         try:
-            prompt = f"Please extract the following entity types from the text: {', '.join(self.entity_types)}. \n\nText: {message}"
-            response = openai.Completion.create(
-                engine="gpt-3.5-turbo-instruct",
-                prompt=prompt,
-                max_tokens=1024,
-                n=1,
-                stop=None,
-                temperature=0.5,
-            )
-            entities = response["choices"][0]["text"].split("\n")
-            entity_dict = {et: None for et in self.entity_types}
-            for entity in entities:
-                for et in self.entity_types:
-                    if et in entity:
-                        entity_dict[et] = entity.split(":")[1].strip()
-            return entity_dict
+            response = openai.Completion.create(prompt=self.build_prompt(message), **self.completion_params)
+            return self.parse_entities(response["choices"][0]["text"])
         except Exception as e:
             print(f"Error during entity extraction: {e}")
             return None
 
+    def build_prompt(self, message):
+        """
+        Builds the extraction prompt for a message.
+
+        Args:
+            message (str): The text message from which entities need to be extracted.
+
+        Returns:
+            str: The prompt.
+        """
+        return f"Please extract the following entity types from the text: {', '.join(self.entity_types)}. \n\nText: {message}"
+
+    def parse_entities(self, text):
+        """
+        Parses the "Type: value" lines of a completion into an entity dictionary.
+
+        Args:
+            text (str): The completion text.
+
+        Returns:
+            dict: A dictionary containing the extracted entities for each entity type.
+        """
+        entity_dict = {et: None for et in self.entity_types}
+        for entity in text.split("\n"):
+            for et in self.entity_types:
+                if et in entity:
+                    entity_dict[et] = entity.split(":")[1].strip()
+        return entity_dict
+
+    def request_batch(self, messages):
+        """
+        Extracts entities for several messages with a single completion request.
+
+        Args:
+            messages (list): The text messages from which entities need to be extracted.
+
+        Returns:
+            dict: The entity dictionaries by position in `messages`, for the messages the response covered.
+        """
+        try:
+            response = openai.Completion.create(prompt=self.build_batch_prompt(messages),
+                                                **self.batch_completion_params(len(messages)))
+            return self.parse_batch_entities(response["choices"][0]["text"], len(messages))
+        except Exception as e:
+            print(f"Error during batched entity extraction: {e}")
+            return {}
+
+    def batch_completion_params(self, count):
+        """
+        Returns the completion parameters for a batch of `count` messages.
+
+        Args:
+            count (int): The number of messages in the batch.
+
+        Returns:
+            dict: The completion parameters, with a completion budget scaled to the batch.
+        """
+        return {**self.completion_params, "max_tokens": ENTITY_BATCH_TOKENS_PER_MESSAGE * count}
+
+    def build_batch_prompt(self, messages):
+        """
+        Builds an extraction prompt covering several messages, each tagged with its index, that asks for
+        a JSON array with one object per message.
+
+        Args:
+            messages (list): The text messages from which entities need to be extracted.
+
+        Returns:
+            str: The prompt.
+        """
+        fields = ', '.join(f'"{et}": "..."' for et in self.entity_types)
+        texts = '\n'.join(f"[{index}] {' '.join(str(message).split())}" for index, message in enumerate(messages))
+        return (
+            f"Please extract the following entity types from each numbered text: {', '.join(self.entity_types)}.\n"
+            f"Respond with only a JSON array containing one object per text, in the form "
+            f'{{"index": <number>, {fields}}}. Use null for entity types that are not present.\n\n'
+            f"Texts:\n{texts}"
+        )
+
+    def parse_batch_entities(self, text, count):
+        """
+        Parses the JSON array of a batched completion into entity dictionaries.
+
+        Args:
+            text (str): The completion text.
+            count (int): The number of messages in the batch.
+
+        Returns:
+            dict: The entity dictionaries by message index; malformed or missing entries are left out.
+        """
+        try:
+            items = json.loads(text[text.index('['):text.rindex(']') + 1])
+        except ValueError:
+            return {}
+
+        parsed = {}
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict):
+                continue
+            index = item.get("index")
+            if not isinstance(index, int) or not 0 <= index < count or index in parsed:
+                continue
+            entity_dict = {}
+            for et in self.entity_types:
+                value = item.get(et)
+                if isinstance(value, list):
+                    value = ', '.join(str(v) for v in value)
+                entity_dict[et] = str(value).strip() if value not in (None, '') else None
+            parsed[index] = entity_dict
+        return parsed
+
     def process_entities(self, df, chunk_size=50):
         """
         Processes a DataFrame to extract entities in parallel using chunks for efficient processing.
+        Identical messages are sent to the API once, and messages already in the entity cache are not sent at all.
 
         Args:
             df (pd.DataFrame): The DataFrame containing the messages to process.
@@ -54,28 +235,117 @@ class EntityProcessor:
             pd.DataFrame: The DataFrame with extracted entities added as new columns.
         """
         try:
-            chunks = [df[i:i + chunk_size] for i in range(0, len(df), chunk_size)]
+            keys, results, misses = self.lookup_cached(df)
+            chunks = [misses[i:i + chunk_size] for i in range(0, len(misses), chunk_size)]
             with ThreadPoolExecutor() as executor:
-                results = list(executor.map(self.apply_extraction, chunks))
-            df = pd.concat(results, ignore_index=True)
-            df = df.dropna(subset=['extracted_entities'])
-            entity_df = pd.DataFrame(df['extracted_entities'].tolist(), columns=self.entity_types)
-            df = pd.concat([df, entity_df], axis=1)
-            return df
+                for extracted in executor.map(self.apply_extraction, chunks):
+                    results.update(extracted)
+            return self.attach_entities(df, keys, results)
         except Exception as e:
             print(f"Error during entity processing: {e}")
             return df  # Return the original DataFrame if an error occurs
 
+    def process_entities_async(self, df, concurrency=ENTITY_CONCURRENCY, write_batch_size=50):
+        """
+        Processes a DataFrame with the asyncio extraction engine: requests run concurrently under request and
+        token rate limits, transient errors are retried with backoff, and results are cached as they complete.
+
+        Args:
+            df (pd.DataFrame): The DataFrame containing the messages to process.
+            concurrency (int): The maximum number of requests in flight.
+            write_batch_size (int): The number of completed results written to the cache at a time.
+
+        Returns:
+            pd.DataFrame: The DataFrame with extracted entities added as new columns.
+        """
+        try:
+            keys, results, misses = self.lookup_cached(df)
+            messages = dict(misses)
+            extractor = AsyncEntityExtractor(self, concurrency=concurrency)
+
+            async def collect():
+                completed = {}
+                async for key, entity_dict in extractor.stream(misses):
+                    if entity_dict is not None:
+                        completed[key] = entity_dict
+                    if len(completed) >= write_batch_size:
+                        self.cache.set_many(self.cache_entries(completed, messages, extractor.single_keys))
+                        results.update(completed)
+                        completed = {}
+                self.cache.set_many(self.cache_entries(completed, messages, extractor.single_keys))
+                results.update(completed)
+
+            asyncio.run(collect())
+            if extractor.failures:
+                print(f"Entity extraction failed for {extractor.failures} messages after retries; their rows are dropped.")
+            return self.attach_entities(df, keys, results)
+        except Exception as e:
+            print(f"Error during entity processing: {e}")
+            return df  # Return the original DataFrame if an error occurs
+
+    def lookup_cached(self, df):
+        """
+        Collapses identical messages and looks them up in the entity cache. In batch mode, messages missing
+        from the batch entries are also looked up under the single-message prompt.
+
+        Args:
+            df (pd.DataFrame): The DataFrame containing the messages to process.
+
+        Returns:
+            tuple: The cache key of every row, the cached entities by key, and the (key, message) pairs to extract.
+        """
+        keys = [self.cache_key(message) for message in df['Message']]
+        unique_messages = dict(zip(keys, df['Message']))
+        results = self.cache.get_many(unique_messages)
+        if self.prompt_version != ENTITY_PROMPT_VERSION:
+            message_keys = {self.message_key(message): key for key, message in unique_messages.items()
+                            if key not in results}
+            results.update((message_keys[message_key], entity_dict)
+                           for message_key, entity_dict in self.cache.get_many(message_keys).items())
+        misses = [(key, message) for key, message in unique_messages.items() if key not in results]
+        print(f"Entity cache: {len(results)} hits, {len(misses)} misses for {len(df)} rows")
+        return keys, results, misses
+
+    def attach_entities(self, df, keys, results):
+        """
+        Adds the extracted entities as columns, dropping rows whose extraction failed.
+
+        Args:
+            df (pd.DataFrame): The DataFrame containing the messages.
+            keys (list): The cache key of every row.
+            results (dict): The extracted entities by key.
+
+        Returns:
+            pd.DataFrame: The DataFrame with extracted entities added as new columns.
+        """
+        df = df.reset_index(drop=True)
+        df['extracted_entities'] = [results.get(key) for key in keys]
+        df = df.dropna(subset=['extracted_entities']).reset_index(drop=True)
+        entity_df = pd.DataFrame(df['extracted_entities'].tolist(), columns=self.entity_types)
+        return pd.concat([df, entity_df], axis=1)
+
     def apply_extraction(self, chunk):
         """
-        Applies entity extraction to a chunk of the DataFrame.
+        Applies entity extraction to a chunk of cache misses and stores the successful results in the cache.
+        Messages are sent `batch_size` at a time; any message a batch response does not cover is retried on its own.
 
         Args:
-            chunk (pd.DataFrame): A subset of the DataFrame to process.
+            chunk (list): A list of (cache key, message) pairs to process.
 
         Returns:
-            pd.DataFrame: The chunk with extracted entities added as a new column.
+            dict: The extracted entities by cache key, for messages that were extracted successfully.
         """
-        chunk = chunk.copy()
-        chunk['extracted_entities'] = chunk['Message'].apply(self.extract_entities)
-        return chunk
\ No newline at end of file
+        extracted = {}
+        single_keys = set()
+        for start in range(0, len(chunk), self.batch_size):
+            batch = chunk[start:start + self.batch_size]
+            parsed = self.request_batch([message for _, message in batch]) if len(batch) > 1 else {}
+            for index, (key, message) in enumerate(batch):
+                entity_dict = parsed.get(index)
+                if entity_dict is None:
+                    entity_dict = self.request_entities(message)
+                    single_keys.add(key)
+                if entity_dict is not None:
+                    extracted[key] = entity_dict
+        self.cache.set_many(self.cache_entries(extracted, dict(chunk), single_keys))
+        return extracted
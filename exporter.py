@@ -0,0 +1,424 @@
+import csv
+import io
+import json
+import math
+import os
+import tempfile
+from datetime import datetime, timedelta
+from bson import ObjectId
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from settings import EXPORT_BATCH_SIZE, EXPORT_EXCLUDED_FIELDS
+
+# Format -> (MIME type, file extension)
+EXPORT_FORMATS = {
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+FILE_CHUNK_SIZE = 1024 * 1024
+EXPORT_DATE_FIELD = 'Publish Date / Time'
+# Filter name -> field matched against the filter's list of values
+EXPORT_VALUE_FILTERS = {
+    'companies': 'Company Name',
+    'channels': 'Social Media Channel',
+    'themes': 'Themes',
+}
+
+
+def build_export_query(filters, after_id=None):
+    """
+    Builds the MongoDB query selecting the posts to export. Each filter is backed by an index on its
+    field combined with the publish date (see `pipelines.ensure_indexes`).
+
+    Args:
+        filters (dict): 'start_date' and 'end_date' ('YYYY-MM-DD', both inclusive), and lists of
+            'companies', 'channels' and 'themes' to keep. Missing or empty filters match everything.
+        after_id (ObjectId, optional): Only posts inserted after this one are exported.
+
+    Returns:
+        dict: The query.
+
+    Raises:
+        ValueError: If a date is not in the 'YYYY-MM-DD' format.
+    """
+    query = {}
+    date_range = {}
+    if filters.get('start_date'):
+        date_range['$gte'] = datetime.strptime(filters['start_date'], '%Y-%m-%d')
+    if filters.get('end_date'):
+        date_range['$lt'] = datetime.strptime(filters['end_date'], '%Y-%m-%d') + timedelta(days=1)
+    if date_range:
+        query[EXPORT_DATE_FIELD] = date_range
+    for name, field in EXPORT_VALUE_FILTERS.items():
+        if filters.get(name):
+            query[field] = {'$in': list(filters[name])}
+    if after_id is not None:
+        query['_id'] = {'$gt': after_id}
+    return query
+
+
+def export_filters_key(filters):
+    """
+    Builds a canonical form of export filters, so the same selection always maps to the same export cursor.
+
+    Args:
+        filters (dict): The export filters.
+
+    Returns:
+        str: The filters as sorted JSON, without empty entries.
+    """
+    canonical = {name: sorted(value) if isinstance(value, (list, tuple)) else value
+                 for name, value in filters.items() if value}
+    return json.dumps(canonical, sort_keys=True)
+
+
+def _export_value(value):
+    """
+    Converts a MongoDB value into one that CSV, Excel and Parquet writers accept.
+
+    Args:
+        value: The value to convert.
+
+    Returns:
+        The value, with ObjectIds as strings, lists joined with commas and NaN as None.
+    """
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(item) for item in value)
+    return value
+
+
+def _flatten(document):
+    """
+    Flattens embedded documents one level into dotted field names, e.g. {'Timestamp': {'Day': 1}} ->
+    {'Timestamp.Day': 1}. Documents nested deeper than that are written as text.
+
+    Args:
+        document (dict): The document to flatten.
+
+    Returns:
+        dict: The flattened fields with export-ready values.
+    """
+    flat = {}
+    for field, value in document.items():
+        if isinstance(value, dict):
+            for subfield, subvalue in value.items():
+                flat[f"{field}.{subfield}"] = str(subvalue) if isinstance(subvalue, dict) else _export_value(subvalue)
+        else:
+            flat[field] = _export_value(value)
+    return flat
+
+
+def field_types_pipeline(query, projection=None):
+    """
+    Builds the aggregation listing every exported column of the matching documents with the BSON types
+    of its values, so the columns and Parquet schema cover all documents and not just the first batch.
+    Only field names and types leave the server.
+
+    Args:
+        query (dict): The export filter.
+        projection (dict, optional): The export projection.
+
+    Returns:
+        list: The pipeline stages. Each result has `_id.k` (the field), `_id.sk` (the subfield of an
+            embedded document, if any) and `types`.
+    """
+    stages = [{'$match': query}]
+    if projection:
+        stages.append({'$project': projection})
+    return stages + [
+        {'$project': {'fields': {'$objectToArray': '$$ROOT'}}},
+        {'$unwind': '$fields'},
+        {'$project': {
+            'k': '$fields.k',
+            't': {'$type': '$fields.v'},
+            'sub': {'$cond': [{'$eq': [{'$type': '$fields.v'}, 'object']},
+                              {'$objectToArray': '$fields.v'}, [None]]},
+        }},
+        {'$unwind': '$sub'},
+        {'$group': {
+            '_id': {'k': '$k', 'sk': '$sub.k'},
+            'types': {'$addToSet': {'$cond': [{'$eq': ['$t', 'object']}, {'$type': '$sub.v'}, '$t']}},
+        }},
+    ]
+
+
+def field_types_from_groups(groups):
+    """
+    Turns the results of `field_types_pipeline` into column names, matching the names `_flatten` produces.
+
+    Args:
+        groups (iterable): The aggregation results.
+
+    Returns:
+        dict: The BSON type names seen for each column.
+    """
+    field_types = {}
+    for group in groups:
+        name = group['_id']['k']
+        if group['_id'].get('sk') is not None:
+            name = f"{name}.{group['_id']['sk']}"
+        field_types.setdefault(name, set()).update(group['types'])
+    return field_types
+
+
+def _parquet_type(types):
+    """
+    Chooses the Parquet type of a column from the BSON types of its values. Integers mixed with doubles
+    are stored as doubles; any other mix, and types without a direct equivalent, are stored as strings.
+
+    Args:
+        types (set): The BSON type names seen in the column.
+
+    Returns:
+        pa.DataType: The column type.
+    """
+    import pyarrow as pa
+
+    types = set(types) - {'null'}
+    if types and types <= {'int', 'long'}:
+        return pa.int64()
+    if types and types <= {'int', 'long', 'double'}:
+        return pa.float64()
+    if types == {'bool'}:
+        return pa.bool_()
+    if types == {'date'}:
+        return pa.timestamp('ms')
+    return pa.string()
+
+
+class DataExporter:
+    def __init__(self, collection, query=None, columns=None, batch_size=EXPORT_BATCH_SIZE):
+        """
+        Streams the documents of a collection into CSV, Excel or Parquet without loading them all at once.
+
+        Documents are read in batches with a projection, nested documents are flattened into dotted
+        column names, and each batch is written out before the next one is fetched. The largest `_id`
+        exported is kept in `last_id`, and `completed` is set once every document has been written.
+
+        Args:
+            collection (Collection): The collection to export.
+            query (dict, optional): The filter selecting the documents. Defaults to all documents.
+            columns (list, optional): The fields to export, in order (dotted paths select nested fields).
+                Defaults to every field of the matching documents except EXPORT_EXCLUDED_FIELDS, in the
+                order of the first batch followed by fields that only appear later.
+            batch_size (int): The number of documents fetched and written at a time.
+        """
+        self.collection = collection
+        self.query = query or {}
+        self.columns = columns
+        self.batch_size = batch_size
+        self.header = None
+        self.field_types = {}
+        self.first_batch = None
+        self.cursor = None
+        self.last_id = None
+        self.rows = 0
+        self.completed = False
+
+    def _projection(self):
+        """
+        Builds the projection of the export query.
+
+        Returns:
+            dict: The fields to return, or None for all fields.
+        """
+        if self.columns:
+            # `_id` is always read to track `last_id`; it is only written out when requested
+            return {column: 1 for column in self.columns}
+        return {field: 0 for field in EXPORT_EXCLUDED_FIELDS} or None
+
+    def _read_batch(self):
+        """
+        Reads the next batch of documents from the cursor.
+
+        Returns:
+            list: The flattened documents; empty once the cursor is exhausted.
+        """
+        batch = []
+        for document in self.cursor:
+            if self.last_id is None or document['_id'] > self.last_id:
+                self.last_id = document['_id']
+            batch.append(_flatten(document))
+            if len(batch) >= self.batch_size:
+                break
+        return batch
+
+    def open(self):
+        """
+        Checks whether any document matches, without reading the export itself.
+
+        Returns:
+            bool: Whether there is anything to export.
+        """
+        return self.collection.find_one(self.query, {'_id': 1}) is not None
+
+    def _start(self, need_types=False):
+        """
+        Runs the export query and reads the first batch. The fields and types of all matching documents are
+        collected first (a scan of every match) only when they are needed: for the header when no columns
+        were given, or for the Parquet column types.
+
+        Args:
+            need_types (bool): Whether the types of the columns are needed.
+        """
+        projection = self._projection()
+        if need_types or not self.columns:
+            self.field_types = field_types_from_groups(
+                self.collection.aggregate(field_types_pipeline(self.query, projection), allowDiskUse=True)
+            )
+        self.cursor = self.collection.find(self.query, projection).batch_size(self.batch_size)
+        self.first_batch = self._read_batch()
+        if self.columns:
+            self.header = list(self.columns)
+        else:
+            first_fields = list(dict.fromkeys(field for row in self.first_batch for field in row))
+            later_fields = sorted(set(self.field_types) - set(first_fields))
+            self.header = first_fields + later_fields
+
+    def batches(self):
+        """
+        Yields the rows of the export, batch by batch, with values in header order.
+
+        Yields:
+            list: A batch of rows, each a list of values.
+        """
+        if self.cursor is None:
+            self._start()
+        batch, self.first_batch = self.first_batch, None
+        try:
+            while batch:
+                self.rows += len(batch)
+                yield [[row.get(column) for column in self.header] for row in batch]
+                batch = self._read_batch()
+            self.completed = True
+        finally:
+            self.cursor.close()
+
+    def iter_csv(self):
+        """
+        Yields the export as CSV, one encoded chunk per batch. The output starts with a UTF-8 byte
+        order mark so Excel opens it with the right encoding; it is sent before the export query runs,
+        so the download starts right away.
+
+        Yields:
+            bytes: A chunk of the CSV file.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        yield '\ufeff'.encode('utf-8')
+        if self.cursor is None:
+            self._start()
+        writer.writerow(self.header)
+        for batch in self.batches():
+            writer.writerows(batch)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+
+    def write_excel(self, path):
+        """
+        Writes the export to an Excel file through a write-only workbook, which keeps memory flat.
+
+        Args:
+            path (str): The file to write.
+        """
+        if self.cursor is None:
+            self._start()
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(self.header)
+        for batch in self.batches():
+            for row in batch:
+                sheet.append([ILLEGAL_CHARACTERS_RE.sub('', value) if isinstance(value, str) else value
+                              for value in row])
+        workbook.save(path)
+
+    def write_parquet(self, path):
+        """
+        Writes the export to a Parquet file, one row group per batch. The column types come from the
+        types seen across all matching documents (see `_parquet_type`), so no batch can conflict with them.
+
+        Args:
+            path (str): The file to write.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError(f"Parquet export requires pyarrow: {e}")
+
+        if self.cursor is None:
+            self._start(need_types=True)
+
+        schema = pa.schema([pa.field(column, _parquet_type(self.field_types.get(column, ())))
+                            for column in self.header])
+        text_columns = [pa.types.is_string(field.type) for field in schema]
+        writer = pq.ParquetWriter(path, schema)
+        try:
+            for batch in self.batches():
+                data = {}
+                for column, is_text, values in zip(self.header, text_columns, zip(*batch)):
+                    if is_text:
+                        values = [None if value is None else str(value) for value in values]
+                    data[column] = list(values)
+                writer.write_table(pa.table(data, schema=schema))
+        finally:
+            writer.close()
+
+    def stream(self, export_format):
+        """
+        Produces the export in the requested format. CSV is generated batch by batch as it is sent and
+        is the quickest to start; Excel and Parquet files are written to a temporary file first (their
+        layout needs the whole file) and then sent in chunks.
+
+        Call `open()` first to check that there is data to export.
+
+        Args:
+            export_format (str): One of EXPORT_FORMATS.
+
+        Returns:
+            generator: The file contents as byte chunks.
+        """
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {export_format}")
+        if export_format == 'csv':
+            return self.iter_csv()
+
+        handle, path = tempfile.mkstemp(suffix=f".{EXPORT_FORMATS[export_format][1]}")
+        os.close(handle)
+        try:
+            if export_format == 'xlsx':
+                self.write_excel(path)
+            else:
+                self.write_parquet(path)
+        except Exception:
+            os.remove(path)
+            raise
+        return self._iter_file(path)
+
+    def _iter_file(self, path):
+        """
+        Yields a file in chunks and removes it afterwards.
+
+        Args:
+            path (str): The temporary file to send.
+
+        Yields:
+            bytes: A chunk of the file.
+        """
+        try:
+            with open(path, 'rb') as export_file:
+                while True:
+                    chunk = export_file.read(FILE_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            os.remove(path)
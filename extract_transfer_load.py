@@ -2,8 +2,62 @@ import pandas as pd
 from datetime import datetime
 from dateutil import parser
 import math
+from functools import lru_cache
+from itertools import islice
+import numpy as np
+import openpyxl
 from settings import *  # Ensure this import is properly configured in your environment
 
+TIMESTAMP_FORMATS = [
+    "%Y-%m-%dT%H:%M:%S.%fZ",  # Example: 2024-03-11T10:15:30.123Z
+    "%m/%d/%Y %H:%M",         # Example: 03/11/2024 10:15
+    "%m/%d/%Y %H:%M:%S",      # Example: 03/11/2024 10:15:30
+    "%d-%m-%Y %H:%M",         # Example: 21-01-2025 18:00
+    "%d-%m-%Y %H:%M:%S",      # Example: 21-01-2025 18:00:29
+    "%Y-%m-%d %H:%M:%S"       # Example: 2025-01-14 17:12:54
+]
+OUTPUT_TIMESTAMP_FORMAT = "%d-%m-%Y %H:%M:%S"
+
+
+@lru_cache(maxsize=TIMESTAMP_CACHE_SIZE)
+def _format_timestamp_string(input_timestamp_str):
+    """
+    Formats a single timestamp string, trying the known formats before falling back to dateutil.
+    Results are memoized, so repeated strings are only parsed once.
+
+    Args:
+        input_timestamp_str (str): The timestamp string to be formatted.
+
+    Returns:
+        str: The formatted timestamp string in "dd-mm-yyyy HH:MM:SS" format.
+
+    Raises:
+        ValueError: If the string cannot be parsed.
+    """
+    for timestamp_format in TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(input_timestamp_str, timestamp_format).strftime(OUTPUT_TIMESTAMP_FORMAT)
+        except ValueError:
+            continue
+
+    return parser.parse(input_timestamp_str).strftime(OUTPUT_TIMESTAMP_FORMAT)
+
+
+def _format_datetimes(datetimes):
+    """
+    Formats a column of datetimes in "dd-mm-yyyy HH:MM:SS" format by rearranging their ISO strings,
+    which is much faster than `strftime` per value.
+
+    Args:
+        datetimes (pd.Series): Timezone-naive datetimes without missing values.
+
+    Returns:
+        pd.Series: The formatted timestamp strings.
+    """
+    iso = np.datetime_as_string(datetimes.to_numpy(dtype='datetime64[s]'), unit='s').tolist()
+    return pd.Series([f"{s[8:10]}-{s[5:7]}-{s[:4]} {s[11:19]}" for s in iso], index=datetimes.index, dtype=object)
+
+
 class FieldMapper:
     def __init__(self, file_path):
         """
@@ -38,6 +92,80 @@ class FieldMapper:
         except Exception as e:
             raise RuntimeError(f"Error reading file: {str(e)}")
 
+    def read_chunks(self, file=None, file_name=None, chunk_size=UPLOAD_CHUNK_SIZE):
+        """
+        Reads the file in chunks of rows, so only one chunk is held in memory at a time. CSV files are read
+        with pandas' chunked reader and XLSX files row by row from a read-only workbook.
+
+        Args:
+            file (str or file-like, optional): The file path or binary stream to read. Defaults to `file_path`.
+            file_name (str, optional): The name used to tell the file format. Defaults to `file_path`.
+            chunk_size (int): The number of rows per chunk.
+
+        Yields:
+            pd.DataFrame: The next chunk of rows.
+
+        Raises:
+            RuntimeError: If the file format is unsupported or the file cannot be read.
+        """
+        file = self.file_path if file is None else file
+        file_name = file_name or self.file_path
+        try:
+            if file_name.endswith('.xlsx'):
+                yield from self._read_excel_chunks(file, chunk_size)
+            elif file_name.endswith('.csv'):
+                yield from pd.read_csv(file, chunksize=chunk_size)
+            else:
+                raise ValueError("Unsupported file format. Only .xlsx and .csv are supported.")
+        except Exception as e:
+            raise RuntimeError(f"Error reading file: {str(e)}")
+
+    def _read_excel_chunks(self, file, chunk_size):
+        """
+        Reads the first worksheet of an XLSX file row by row. Blank rows are skipped and empty cells
+        become NaN, as with `pd.read_excel`.
+
+        Args:
+            file (str or file-like): The file path or binary stream to read.
+            chunk_size (int): The number of rows per chunk.
+
+        Yields:
+            pd.DataFrame: The next chunk of rows.
+        """
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = [f"Unnamed: {i}" if name is None else name for i, name in enumerate(header)]
+            rows = (row for row in rows if any(value is not None for value in row))
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                frame = pd.DataFrame(chunk, columns=columns)
+                yield frame.mask(frame.isna(), np.nan).infer_objects()
+        finally:
+            workbook.close()
+
+    def map_chunks(self, file=None, file_name=None, chunk_size=UPLOAD_CHUNK_SIZE):
+        """
+        Reads and maps the file chunk by chunk. The source is detected from the header of the first chunk.
+
+        Args:
+            file (str or file-like, optional): The file path or binary stream to read. Defaults to `file_path`.
+            file_name (str, optional): The name used to tell the file format. Defaults to `file_path`.
+            chunk_size (int): The number of rows per chunk.
+
+        Yields:
+            list: The mapped records of the next chunk.
+        """
+        for index, chunk in enumerate(self.read_chunks(file, file_name, chunk_size)):
+            if index == 0:
+                self.detect_source(chunk)
+            yield self.map_fields(chunk)
+
     def format_timestamp_auto(self, input_timestamp_str):
         """
         Automatically detects and formats the timestamp string into a standardized format.
@@ -55,29 +183,76 @@ class FieldMapper:
             if isinstance(input_timestamp_str, pd.Timestamp):
                 input_timestamp_str = input_timestamp_str.strftime("%Y-%m-%d %H:%M:%S")
             if isinstance(input_timestamp_str, str) and input_timestamp_str.lower() != "nan":
-                possible_formats = [
-                    "%Y-%m-%dT%H:%M:%S.%fZ",  # Example: 2024-03-11T10:15:30.123Z
-                    "%m/%d/%Y %H:%M",         # Example: 03/11/2024 10:15
-                    "%m/%d/%Y %H:%M:%S",      # Example: 03/11/2024 10:15:30
-                    "%d-%m-%Y %H:%M",         # Example: 21-01-2025 18:00
-                    "%d-%m-%Y %H:%M:%S",      # Example: 21-01-2025 18:00:29
-                    "%Y-%m-%d %H:%M:%S"       # Example: 2025-01-14 17:12:54
-                ]
-
-                for timestamp_format in possible_formats:
-                    try:
-                        dt_object = datetime.strptime(input_timestamp_str, timestamp_format)
-                        return dt_object.strftime("%d-%m-%Y %H:%M:%S")
-                    except ValueError:
-                        continue
-
-                dt_object = parser.parse(input_timestamp_str)
-                return dt_object.strftime("%d-%m-%Y %H:%M:%S")
+                return _format_timestamp_string(input_timestamp_str)
             else:
                 return None
         except ValueError as e:
             raise ValueError(f"Unable to determine timestamp format: {str(e)}")
 
+    def format_timestamps(self, values):
+        """
+        Formats a whole column of timestamps, with the same results as `format_timestamp_auto` per value.
+
+        The format of the column is inferred from a sample and the matching strings are parsed in one
+        vectorized call; only values in another format go through `format_timestamp_auto`.
+
+        Args:
+            values (pd.Series): The raw timestamp values.
+
+        Returns:
+            pd.Series: The formatted timestamp strings, None where the input is missing.
+
+        Raises:
+            ValueError: If the format of an outlier cannot be determined.
+        """
+        if pd.api.types.is_datetime64_any_dtype(values):
+            formatted = np.full(len(values), None, dtype=object)
+            present = values.dropna()
+            if present.dt.tz is not None:
+                present = present.dt.tz_localize(None)
+            formatted[values.notna().to_numpy()] = _format_datetimes(present).to_numpy()
+            return pd.Series(formatted, index=values.index, dtype=object)
+
+        raw = values.to_numpy(dtype=object)
+        formatted = np.full(len(raw), None, dtype=object)
+        fast = np.zeros(len(raw), dtype=bool)
+
+        text_positions = np.flatnonzero([isinstance(value, str) and value.lower() != "nan" for value in raw])
+        timestamp_format = self.infer_timestamp_format(raw[text_positions])
+        if timestamp_format is not None:
+            parsed = pd.to_datetime(pd.Series(raw[text_positions], dtype=object), format=timestamp_format, errors='coerce')
+            parsed_positions = text_positions[parsed.notna().to_numpy()]
+            formatted[parsed_positions] = _format_datetimes(parsed.dropna()).to_numpy()
+            fast[parsed_positions] = True
+
+        for position in np.flatnonzero(~fast):
+            formatted[position] = self.format_timestamp_auto(raw[position])
+        return pd.Series(formatted, index=values.index, dtype=object)
+
+    def infer_timestamp_format(self, timestamps):
+        """
+        Infers the timestamp format of a column from a sample of its values.
+
+        Args:
+            timestamps (np.ndarray): The timestamp strings of the column.
+
+        Returns:
+            str: The known format matching most of the sampled values, or None if none match.
+        """
+        sample = pd.unique(timestamps[:TIMESTAMP_SAMPLE_SIZE])
+        best_format, best_matches = None, 0
+        for timestamp_format in TIMESTAMP_FORMATS:
+            matches = 0
+            for timestamp in sample:
+                try:
+                    datetime.strptime(timestamp, timestamp_format)
+                    matches += 1
+                except ValueError:
+                    continue
+            if matches > best_matches:
+                best_format, best_matches = timestamp_format, matches
+        return best_format
+
     def detect_source(self, df):
         """
         Detects the source of the data based on the columns present in the DataFrame.
@@ -102,6 +277,7 @@ class FieldMapper:
     def map_fields(self, df):
         """
         Maps the fields from the source DataFrame to a standardized format based on the detected source.
+        The mapping runs as whole-column operations; rows are only converted to dictionaries at the end.
 
         Args:
             df (pd.DataFrame): The DataFrame containing the raw data.
@@ -109,162 +285,139 @@ class FieldMapper:
         Returns:
             list: A list of dictionaries, where each dictionary represents a mapped record.
         """
-        data_dict = df.to_dict(orient='records')
-        self.item = []
-
-        if self.source == 'Rival IQ':
-            for data in data_dict:
-                engagement = (
-                    data.get('applause', 0) +
-                    data.get('conversation', 0) +
-                    data.get('amplification', 0)
-                )
-                bucket = self._get_engagement_bucket(engagement)
-                company_name = COMPANY_MAPPING.get(data['company'].lower(), data['company'].capitalize())
-                original_datetime = self.format_timestamp_auto(data['published_at'])
-                post_type = self._get_post_type(data['post_type'])
-                handle_name = self._get_handle_name(data['presence_handle'], company_name, data['channel'])
-                message = self._get_message(data['message'], data['link_title'])
-
-                self.field_mapping = {
-                    'Publish Date / Time': original_datetime,
-                    'Company Name': company_name,
-                    'Social Media Channel': data['channel'],
-                    'Handle Name': handle_name,
-                    'Message': message,
-                    'Link': data['post_link'],
-                    'Docu_Link': data['link'],
-                    'Image': data['image'],
-                    'Post Type': post_type,
-                    'Like / applause': data['applause'],
-                    'Comment / conversation': data['conversation'],
-                    'Share / Repost / amplification': data['amplification'],
-                    'Engagement': engagement,
-                    "engagement_bucket": bucket,
-                    'Video Views': data['video_views'],
-                    'View Views bucket': '',
-                    'Video Duration': '',
-                    'Video Type': '',
-                    'audience': data['audience'],
-                }
-                self.item.append(self.field_mapping)
-
-        elif self.source == 'Phantom Buster':
-            for data in data_dict:
-                company_name = self._get_company_name(data.get('profileUrl', ''))
-                post_type = self._get_post_type(data['type'])
-                engagement = (
-                    data.get('likeCount', 0) +
-                    data.get('commentCount', 0) +
-                    data.get('repostCount', 0)
-                )
-                bucket = self._get_engagement_bucket(engagement)
-                original_datetime = self.format_timestamp_auto(data['postTimestamp'])
-
-                self.field_mapping = {
-                    'Publish Date / Time': original_datetime,
-                    'Company Name': company_name,
-                    'Social Media Channel': 'LinkedIn',
-                    'Handle Name': company_name,
-                    'Message': data['postContent'],
-                    'Link': data['postUrl'],
-                    'Docu_Link': "",
-                    'Image': data['imgUrl'],
-                    'Post Type': post_type,
-                    'Like / applause': data['likeCount'],
-                    'Comment / conversation': data['commentCount'],
-                    'Share / Repost / amplification': data['repostCount'],
-                    'Engagement': engagement,
-                    "engagement_bucket": bucket,
-                    'Video Views': '',
-                    'Video Duration': '',
-                    'View Views bucket': '',
-                    'Video Type': '',
-                    'audience': '',
-                }
-                self.item.append(self.field_mapping)
-
+        mapped = self.map_columns(df)
+        self.item = mapped.to_dict(orient='records') if mapped is not None else []
+        if self.item:
+            self.field_mapping = self.item[-1]
         return self.item
 
-    def _get_engagement_bucket(self, engagement):
+    def map_columns(self, df):
         """
-        Determines the engagement bucket based on the engagement value.
+        Maps the fields from the source DataFrame to the standardized columns based on the detected source.
 
         Args:
-            engagement (int): The engagement value.
+            df (pd.DataFrame): The DataFrame containing the raw data.
 
         Returns:
-            str: The engagement bucket.
+            pd.DataFrame: The mapped columns, in record order, or None if the source is unknown.
         """
-        if 0 <= engagement <= 100:
-            return '0-100 Engagement'
-        elif 101 <= engagement <= 500:
-            return '101-500 Engagement'
-        elif 501 <= engagement <= 1000:
-            return '501-1000 Engagement'
-        elif engagement > 1000:
-            return '1000+ Engagement'
+        if self.source == 'Rival IQ':
+            engagement = df['applause'] + df['conversation'] + df['amplification']
+            company_name = self._map_company_names(df['company'].str.lower(), df['company'].str.capitalize())
+            channel = df['channel']
+            handle_name = df['presence_handle'].astype(str).str.capitalize().where(df['presence_handle'].map(bool), "")
+            handle_name = handle_name.where(channel != "YouTube", company_name.map(lambda name: YOUTUBE_MAPPING.get(name, name)))
+
+            return pd.DataFrame({
+                'Publish Date / Time': self.format_timestamps(df['published_at']),
+                'Company Name': company_name,
+                'Social Media Channel': channel,
+                'Handle Name': handle_name,
+                'Message': df['message'].where(~self._is_float_nan(df['message']), df['link_title']),
+                'Link': df['post_link'],
+                'Docu_Link': df['link'],
+                'Image': df['image'],
+                'Post Type': self._map_post_types(df['post_type']),
+                'Like / applause': df['applause'],
+                'Comment / conversation': df['conversation'],
+                'Share / Repost / amplification': df['amplification'],
+                'Engagement': engagement,
+                "engagement_bucket": self._map_engagement_buckets(engagement),
+                'Video Views': df['video_views'],
+                'View Views bucket': '',
+                'Video Duration': '',
+                'Video Type': '',
+                'audience': df['audience'],
+            }, index=df.index)
+
+        elif self.source == 'Phantom Buster':
+            profile = df['profileUrl'].astype(str).str.strip("/").str.strip()
+            company_name = self._map_company_names(profile.str.lower(), profile.str.capitalize())
+            company_name = company_name.where((profile != "") & (profile.str.lower() != 'nan'), "Unknown")
+            engagement = df['likeCount'] + df['commentCount'] + df['repostCount']
+
+            return pd.DataFrame({
+                'Publish Date / Time': self.format_timestamps(df['postTimestamp']),
+                'Company Name': company_name,
+                'Social Media Channel': 'LinkedIn',
+                'Handle Name': company_name,
+                'Message': df['postContent'],
+                'Link': df['postUrl'],
+                'Docu_Link': "",
+                'Image': df['imgUrl'],
+                'Post Type': self._map_post_types(df['type']),
+                'Like / applause': df['likeCount'],
+                'Comment / conversation': df['commentCount'],
+                'Share / Repost / amplification': df['repostCount'],
+                'Engagement': engagement,
+                "engagement_bucket": self._map_engagement_buckets(engagement),
+                'Video Views': '',
+                'Video Duration': '',
+                'View Views bucket': '',
+                'Video Type': '',
+                'audience': '',
+            }, index=df.index)
+
         return None
 
-    def _get_post_type(self, post_type):
+    def _map_company_names(self, lowered, fallback):
         """
-        Determines the post type based on the raw post type value.
+        Looks up company names in COMPANY_MAPPING for a whole column.
 
         Args:
-            post_type (str): The raw post type value.
+            lowered (pd.Series): The lowercased raw company names used as mapping keys.
+            fallback (pd.Series): The names to use where the mapping has no entry.
 
         Returns:
-            str: The standardized post type.
+            pd.Series: The standardized company names.
         """
-        if post_type.lower() == "photo":
-            return "Image"
-        elif "video (linkedin source)" in post_type.lower():
-            return "Video"
-        else:
-            return post_type.capitalize()
-
-    def _get_handle_name(self, presence_handle, company_name, channel):
+        mapped = lowered.map(COMPANY_MAPPING)
+        return mapped.where(lowered.isin(COMPANY_MAPPING.keys()), fallback)
+
+    def _map_engagement_buckets(self, engagement):
         """
-        Determines the handle name based on the presence handle, company name, and channel.
+        Determines the engagement bucket of a whole column: 0-100, 101-500, 501-1000 or over 1000.
 
         Args:
-            presence_handle (str): The raw presence handle.
-            company_name (str): The company name.
-            channel (str): The social media channel.
+            engagement (pd.Series): The engagement values.
 
         Returns:
-            str: The standardized handle name.
+            np.ndarray: The engagement buckets, None where no range applies.
         """
-        if channel == "YouTube":
-            return YOUTUBE_MAPPING.get(company_name, company_name)
-        return str(presence_handle).capitalize() if presence_handle else ""
-
-    def _get_message(self, message, link_title):
+        values = pd.to_numeric(engagement, errors='coerce')
+        return np.select(
+            [(values >= 0) & (values <= 100), (values >= 101) & (values <= 500),
+             (values >= 501) & (values <= 1000), values > 1000],
+            ['0-100 Engagement', '101-500 Engagement', '501-1000 Engagement', '1000+ Engagement'],
+            default=None,
+        )
+
+    def _map_post_types(self, post_types):
         """
-        Determines the message based on the raw message and link title.
+        Standardizes a whole column of post types: photos become images, LinkedIn-sourced videos become videos
+        and the rest are capitalized.
 
         Args:
-            message (str): The raw message.
-            link_title (str): The link title.
+            post_types (pd.Series): The raw post type values.
 
         Returns:
-            str: The standardized message.
+            pd.Series: The standardized post types.
         """
-        if isinstance(message, float) and math.isnan(message):
-            return link_title
-        return message
+        lowered = post_types.str.lower()
+        standardized = post_types.str.capitalize()
+        standardized = standardized.where(~lowered.str.contains("video (linkedin source)", regex=False, na=False), "Video")
+        return standardized.where(lowered != "photo", "Image")
 
-    def _get_company_name(self, profile_url):
+    def _is_float_nan(self, values):
         """
-        Determines the company name based on the profile URL.
+        Flags the values that are float NaN, such as missing messages in object columns.
 
         Args:
-            profile_url (str): The profile URL.
+            values (pd.Series): The values to check.
 
         Returns:
-            str: The standardized company name.
+            pd.Series: True where the value is a float NaN.
         """
-        company_name = str(profile_url).strip("/").strip()
-        if not company_name or company_name.lower() == 'nan':
-            return "Unknown"
-        return COMPANY_MAPPING.get(company_name.lower(), company_name.capitalize())
\ No newline at end of file
+        if values.dtype != object:
+            return values.isna()
+        return values.map(lambda value: isinstance(value, float) and math.isnan(value)).astype(bool)
@@ -0,0 +1,170 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from settings import JOB_WORKERS, JOB_HISTORY_SIZE
+
+
+class JobRunner:
+    def __init__(self, max_workers=JOB_WORKERS, history_size=JOB_HISTORY_SIZE):
+        """
+        Initializes a background job runner backed by a thread pool. At most one job runs per dataset, and
+        only the `history_size` most recent finished jobs are kept.
+
+        Args:
+            max_workers (int): The number of jobs that can run at the same time.
+            history_size (int): The number of finished jobs kept for status lookups.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.history_size = history_size
+        self.lock = threading.Lock()
+        self.jobs = OrderedDict()
+        self.active = {}
+
+    def submit(self, dataset, target):
+        """
+        Queues `target` to run in the background unless a job for the same dataset is already queued or running.
+
+        Args:
+            dataset (str): The dataset the job works on.
+            target (callable): The work to run; called with a `progress(stage, rows=None)` callback.
+
+        Returns:
+            tuple: The job status and whether a new job was created (False if the active job was returned).
+        """
+        with self.lock:
+            active_id = self.active.get(dataset)
+            if active_id is not None:
+                return self._status(self.jobs[active_id]), False
+
+            job = {
+                'job_id': uuid.uuid4().hex,
+                'dataset': dataset,
+                'status': 'queued',
+                'stage': None,
+                'rows_processed': 0,
+                'submitted_at': datetime.now(),
+                'started_at': None,
+                'finished_at': None,
+                'started': None,
+                'finished': None,
+                'result': None,
+                'error': None,
+            }
+            self.jobs[job['job_id']] = job
+            self.active[dataset] = job['job_id']
+            self._trim_history()
+            status = self._status(job)
+
+        self.executor.submit(self._run, job, target)
+        return status, True
+
+    def _run(self, job, target):
+        """
+        Runs a job and records its outcome.
+
+        Args:
+            job (dict): The job being run.
+            target (callable): The work to run.
+        """
+        with self.lock:
+            job['status'] = 'running'
+            job['started_at'] = datetime.now()
+            job['started'] = time.monotonic()
+
+        try:
+            result = target(lambda stage, rows=None: self._progress(job, stage, rows))
+            if isinstance(result, dict) and result.get('status') == 'error':
+                # The workflow reports its own failures instead of raising
+                outcome = {'status': 'failed', 'result': result, 'error': result.get('message')}
+            else:
+                outcome = {'status': 'completed', 'result': result}
+        except Exception as e:
+            print(f"Error running job {job['job_id']}: {e}")
+            outcome = {'status': 'failed', 'error': str(e)}
+
+        with self.lock:
+            job.update(outcome)
+            job['finished_at'] = datetime.now()
+            job['finished'] = time.monotonic()
+            self.active.pop(job['dataset'], None)
+            self._trim_history()
+
+    def _progress(self, job, stage, rows=None):
+        """
+        Records the stage a job has reached.
+
+        Args:
+            job (dict): The running job.
+            stage (str): The name of the current stage.
+            rows (int, optional): The number of rows the job has processed so far.
+        """
+        with self.lock:
+            job['stage'] = stage
+            if rows is not None:
+                job['rows_processed'] = rows
+
+    def _trim_history(self):
+        """
+        Forgets the oldest finished jobs beyond `history_size`; queued and running jobs are always kept.
+        """
+        finished = [job_id for job_id, job in self.jobs.items() if job['finished'] is not None]
+        for job_id in finished[:max(0, len(finished) - self.history_size)]:
+            del self.jobs[job_id]
+
+    def _status(self, job):
+        """
+        Builds the status report of a job.
+
+        Args:
+            job (dict): The job to describe.
+
+        Returns:
+            dict: The job's state, current stage, rows processed and throughput in rows per second.
+        """
+        elapsed = None
+        if job['started'] is not None:
+            elapsed = (job['finished'] or time.monotonic()) - job['started']
+        return {
+            'job_id': job['job_id'],
+            'dataset': job['dataset'],
+            'status': job['status'],
+            'stage': job['stage'],
+            'rows_processed': job['rows_processed'],
+            'elapsed_seconds': round(elapsed, 3) if elapsed is not None else None,
+            'rows_per_second': round(job['rows_processed'] / elapsed, 2) if elapsed else None,
+            'submitted_at': job['submitted_at'].isoformat(),
+            'started_at': job['started_at'].isoformat() if job['started_at'] else None,
+            'finished_at': job['finished_at'].isoformat() if job['finished_at'] else None,
+            'result': job['result'],
+            'error': job['error'],
+        }
+
+    def get(self, job_id):
+        """
+        Looks up a job.
+
+        Args:
+            job_id (str): The id returned when the job was submitted.
+
+        Returns:
+            dict: The job status, or None if the job is unknown or has left the history.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return self._status(job) if job else None
+
+    def list_jobs(self):
+        """
+        Lists the active jobs and the finished jobs still in the history, newest first.
+
+        Returns:
+            list: The job statuses.
+        """
+        with self.lock:
+            return [self._status(job) for job in reversed(self.jobs.values())]
+
+
+job_runner = JobRunner()
@@ -0,0 +1,189 @@
+import re
+import weakref
+import numpy as np
+import pandas as pd
+
+
+class KeywordMatcher:
+    def __init__(self, keyword_data):
+        """
+        Compiles the keyword collection into a single trie-shaped regular expression so that every keyword
+        occurring in a text is found in one scan of that text.
+
+        Keywords are normalized the same way the per-row loop did (lowercased, '#' removed) and keep their
+        position in `keyword_data`, so the first listed keyword found in a text still wins.
+
+        Args:
+            keyword_data (pd.DataFrame): The DataFrame containing 'Keyword', 'Theme' and 'Sub Theme' columns.
+        """
+        self.themes = []
+        self.subthemes = []
+        self.keyword_ids = {}
+        self.always_match = None
+
+        if keyword_data is not None and 'Keyword' in keyword_data.columns:
+            for keyword, theme, subtheme in zip(keyword_data['Keyword'], keyword_data['Theme'], keyword_data['Sub Theme']):
+                if not isinstance(keyword, str):
+                    continue
+                keyword_id = len(self.themes)
+                self.themes.append(theme)
+                self.subthemes.append(subtheme)
+                keyword = keyword.lower().replace('#', '')
+                if not keyword:
+                    # An empty keyword is contained in every text.
+                    if self.always_match is None:
+                        self.always_match = keyword_id
+                    continue
+                self.keyword_ids.setdefault(keyword, keyword_id)
+
+        self.best_ids = self._build_best_ids()
+        self.pattern = None
+        if self.keyword_ids:
+            self.pattern = re.compile('(?=(' + self._build_pattern(self._build_trie()) + '))')
+
+    def _build_trie(self):
+        """
+        Builds a character trie of the normalized keywords.
+
+        Returns:
+            dict: The root trie node; the empty-string key marks the end of a keyword.
+        """
+        trie = {}
+        for keyword in self.keyword_ids:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = True
+        return trie
+
+    def _build_pattern(self, node):
+        """
+        Converts a trie node into a regular expression that matches the longest keyword starting at a position.
+
+        Args:
+            node (dict): The trie node to convert.
+
+        Returns:
+            str: The regular expression source for the node.
+        """
+        branches = []
+        for char in sorted(key for key in node if key):
+            child = node[char]
+            literal = re.escape(char)
+            # Collapse single-child chains into one literal to keep the pattern shallow.
+            while len(child) == 1 and '' not in child:
+                (char, child), = child.items()
+                literal += re.escape(char)
+            branches.append(literal + self._build_pattern(child))
+
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            return '(?:' + pattern + ')?'
+        return pattern
+
+    def _build_best_ids(self):
+        """
+        Maps each keyword to the earliest listed keyword among itself and its prefixes. When the longest
+        keyword at a position is found, every shorter keyword matching there is one of its prefixes.
+
+        Returns:
+            dict: The earliest keyword id for each normalized keyword.
+        """
+        best_ids = {}
+        for keyword in self.keyword_ids:
+            best_id = self.keyword_ids[keyword]
+            for length in range(1, len(keyword)):
+                prefix_id = self.keyword_ids.get(keyword[:length])
+                if prefix_id is not None and prefix_id < best_id:
+                    best_id = prefix_id
+            best_ids[keyword] = best_id
+        return best_ids
+
+    def _first_match_id(self, found):
+        """
+        Picks the earliest listed keyword from the keywords found in a text.
+
+        Args:
+            found (list): The longest keyword matched at each position of the text.
+
+        Returns:
+            int: The id of the earliest listed matching keyword, or -1 if there is none.
+        """
+        best_id = self.always_match
+        for keyword in found:
+            keyword_id = self.best_ids[keyword]
+            if best_id is None or keyword_id < best_id:
+                best_id = keyword_id
+        return -1 if best_id is None else best_id
+
+    def match(self, text):
+        """
+        Finds the theme and subtheme of the first listed keyword contained in the text.
+
+        Args:
+            text (str): The text to search for keywords.
+
+        Returns:
+            tuple: A tuple containing the matched theme, subtheme, and subsubtheme (if any).
+        """
+        found = self.pattern.findall(text.lower()) if self.pattern is not None else []
+        keyword_id = self._first_match_id(found)
+        if keyword_id < 0:
+            return None, None, None
+        return self.themes[keyword_id], self.subthemes[keyword_id], None
+
+    def match_column(self, texts):
+        """
+        Matches a whole column of texts in one pass.
+
+        Args:
+            texts (pd.Series): The texts to search for keywords.
+
+        Returns:
+            pd.DataFrame: The matched 'Themes', 'Subthemes' and 'Subsubthemes', aligned with `texts`.
+        """
+        is_text = texts.map(type).eq(str)
+        keyword_ids = np.full(len(texts), -1, dtype=np.int64)
+        if is_text.any():
+            lowered = texts[is_text].str.lower()
+            if self.pattern is not None:
+                found = lowered.str.findall(self.pattern)
+            else:
+                found = pd.Series([[]] * len(lowered), index=lowered.index)
+            keyword_ids[is_text.to_numpy()] = [self._first_match_id(matches) for matches in found]
+
+        matched = keyword_ids >= 0
+        themes = np.full(len(texts), None, dtype=object)
+        subthemes = np.full(len(texts), None, dtype=object)
+        themes[matched] = np.array(self.themes, dtype=object)[keyword_ids[matched]]
+        subthemes[matched] = np.array(self.subthemes, dtype=object)[keyword_ids[matched]]
+        return pd.DataFrame({
+            'Themes': themes,
+            'Subthemes': subthemes,
+            'Subsubthemes': np.full(len(texts), None, dtype=object),
+        }, index=texts.index)
+
+
+_matcher_cache = {}
+
+
+def get_keyword_matcher(keyword_data):
+    """
+    Returns a compiled matcher for `keyword_data`, reusing the last one compiled for the same DataFrame.
+
+    Args:
+        keyword_data (pd.DataFrame): The DataFrame containing keywords, themes, and subthemes.
+
+    Returns:
+        KeywordMatcher: The compiled matcher.
+    """
+    if keyword_data is None:
+        return KeywordMatcher(None)
+    cached = _matcher_cache.get('last')
+    if cached is not None and cached[0]() is keyword_data:
+        return cached[1]
+    matcher = KeywordMatcher(keyword_data)
+    _matcher_cache['last'] = (weakref.ref(keyword_data), matcher)
+    return matcher
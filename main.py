@@ -1,14 +1,68 @@
 from data_processor import DataProcessor
 from text_classifier import TextClassifier
 from entityprocessor import EntityProcessor
-from settings import CONNECTION_URL, DATABASE_NAME, COLLECTION_POST
-from pymongo import MongoClient, errors
+from settings import DATABASE_NAME, COLLECTION_POST, COLLECTION_RUN_METRICS, ENTITY_EXTRACTION_MODE, SNAPSHOT_ENABLED
+from pymongo import errors
+from pipelines import connection_manager
+from workflow_metrics import workflow_metrics
+from snapshot_store import snapshot_store
 import numpy as np
 
-def run_data_processing_workflow():
+def run_data_processing_workflow(progress=None):
     """
     Executes the data processing workflow, which includes fetching data from MongoDB, cleaning and processing the data,
     predicting labels, processing entities, calculating engagement scores, and saving the processed data back to MongoDB.
+
+    Args:
+        progress (callable, optional): Called with the name of each stage as it starts and the number of rows
+            it processes, e.g. to report the progress of a background job.
+
+    Returns:
+        dict: The outcome of the run, with a "status" of "success" or "error" and a "message".
+    """
+    report = progress or (lambda stage, rows=None: None)
+    with workflow_metrics.run() as run_metrics:
+        result = process_new_entries(report)
+        if SNAPSHOT_ENABLED and result["status"] == "success" and snapshot_store.available():
+            update_snapshot(report)
+
+    # Persist the stage measurements of this run
+    try:
+        connection_manager.get_database(DATABASE_NAME)[COLLECTION_RUN_METRICS].insert_one(
+            run_metrics.to_document(result)
+        )
+    except errors.PyMongoError as db_error:
+        print(f"Error saving run metrics to MongoDB: {db_error}")
+    return result
+
+
+def update_snapshot(report):
+    """
+    Appends the posts stored since the previous run to the Parquet snapshot, then merges the partitions
+    that have collected many small files. Failures are reported but do not fail the workflow, since the
+    next run picks up where the snapshot stopped.
+
+    Args:
+        report (callable): Called with the name of the stage as it starts.
+    """
+    report("snapshot")
+    try:
+        with workflow_metrics.stage("snapshot") as stage:
+            stage.rows_out = snapshot_store.sync(connection_manager.get_database(DATABASE_NAME)[COLLECTION_POST])
+            snapshot_store.compact()
+    except Exception as e:
+        print(f"Error updating the Parquet snapshot: {e}")
+
+
+def process_new_entries(report):
+    """
+    Runs the stages of the data processing workflow, measuring each one.
+
+    Args:
+        report (callable): Called with the name of each stage as it starts and the number of rows it processes.
+
+    Returns:
+        dict: The outcome of the run, with a "status" of "success" or "error" and a "message".
     """
     # Instantiate required classes
     data_processor = DataProcessor()
@@ -16,16 +70,19 @@ def run_data_processing_workflow():
     entity_processor = EntityProcessor()
 
     # Fetch new entries from MongoDB
+    report("fetch_new_entries")
     try:
-        new_data = data_processor.fetch_new_entries()
+        with workflow_metrics.stage("fetch_new_entries") as stage:
+            new_data = data_processor.fetch_new_entries()
+            stage.rows_out = len(new_data) if new_data is not None else 0
     except Exception as e:
         print(f"Error fetching new entries: {e}")
-        return
+        return {"status": "error", "message": f"Error fetching new entries: {e}"}
     
     # Check if new_data is empty
     if new_data is None or new_data.empty:
         print("No new entries found. Exiting workflow.")
-        return
+        return {"status": "success", "message": "No new entries found."}
 
     print(f"Number of new entries fetched: {len(new_data)}")
 
@@ -33,13 +90,25 @@ def run_data_processing_workflow():
         # Process the data
         new_data['transform_data_id'] = new_data['_id']
         new_data = new_data.drop('_id', axis=1, errors='ignore')
-        new_data['Message'] = new_data['Message'].apply(text_classifier.clean_text)
+        report("clean_text", len(new_data))
+        with workflow_metrics.stage("clean_text", len(new_data)) as stage:
+            new_data['Message'] = text_classifier.clean_texts(new_data['Message'])
+            stage.rows_out = len(new_data)
 
         # Predict labels for the cleaned data
-        df_with_labels = data_processor.predict_labels(new_data)
+        report("predict_labels", len(new_data))
+        with workflow_metrics.stage("predict_labels", len(new_data)) as stage:
+            df_with_labels = data_processor.predict_labels(new_data)
+            stage.rows_out = len(df_with_labels)
 
         # Process entities in the labeled data
-        processed_df = entity_processor.process_entities(df=df_with_labels)
+        report("process_entities", len(df_with_labels))
+        with workflow_metrics.stage("process_entities", len(df_with_labels)) as stage:
+            if ENTITY_EXTRACTION_MODE == "async":
+                processed_df = entity_processor.process_entities_async(df=df_with_labels)
+            else:
+                processed_df = entity_processor.process_entities(df=df_with_labels)
+            stage.rows_out = len(processed_df)
         processed_df.replace("", np.nan, inplace=True)
 
         # Calculate engagement score
@@ -51,28 +120,49 @@ def run_data_processing_workflow():
 
         # Drop rows with missing 'Message'
         processed_df = processed_df.dropna(subset=['Message'])
-        processed_df = data_processor.process_data(processed_df)
+        report("process_data", len(processed_df))
+        with workflow_metrics.stage("process_data", len(processed_df)) as stage:
+            processed_df = data_processor.process_data(processed_df)
+            stage.rows_out = len(processed_df)
 
         # Connect to MongoDB and insert processed data
         try:
-            client = MongoClient(CONNECTION_URL)
-            db = client[DATABASE_NAME]
+            db = connection_manager.get_database(DATABASE_NAME)
             collection = db[COLLECTION_POST]
 
             # Convert DataFrame to dictionary and insert into MongoDB
             records = processed_df.to_dict(orient='records')
+            transform_data_ids = processed_df['transform_data_id'].tolist()
             
             if records:  # Check if there is data to insert
-                collection.insert_many(records)
+                report("insert", len(records))
+                with workflow_metrics.stage("insert", len(records)) as stage:
+                    data_processor.mark_in_flight(transform_data_ids)
+                    try:
+                        collection.insert_many(records)
+                    except errors.PyMongoError:
+                        # Keep the posts stored before the failure from being processed again
+                        try:
+                            data_processor.reconcile_processed(transform_data_ids)
+                        except errors.PyMongoError as reconcile_error:
+                            print(f"Error reconciling processed uploads: {reconcile_error}")
+                        raise
+                    data_processor.mark_processed(transform_data_ids)
+                    stage.rows_out = len(records)
+                report("completed", len(records))
                 print("Data processing workflow completed successfully.")
+                return {"status": "success", "message": "Data processing completed successfully!"}
             else:
                 print("No valid data to insert into MongoDB.")
+                return {"status": "success", "message": "No valid data to insert into MongoDB."}
         
         except errors.PyMongoError as db_error:
             print(f"Error inserting data into MongoDB: {db_error}")
+            return {"status": "error", "message": f"Error inserting data into MongoDB: {db_error}"}
 
     except Exception as e:
         print(f"Unexpected error during processing: {e}")
+        return {"status": "error", "message": f"Unexpected error during processing: {e}"}
 
 if __name__ == "__main__":
     run_data_processing_workflow()
@@ -0,0 +1,139 @@
+import glob
+import os
+import pickle
+import threading
+import time
+from datetime import datetime
+from classifier_backends import model_backend
+from settings import MODEL_DEFAULT_PATH, MODEL_DIRECTORY, MODEL_RELOAD_CHECK_SECONDS
+
+
+class ModelRegistry:
+    def __init__(self, default_path=MODEL_DEFAULT_PATH, model_directory=MODEL_DIRECTORY,
+                 check_interval=MODEL_RELOAD_CHECK_SECONDS):
+        """
+        Initializes a process-wide registry that loads classifier models once and reuses them.
+
+        The current model is the newest `model_*.pkl` in `model_directory` (as written by
+        `TextClassifier.auto_save_locally`), or `default_path` when there is none. The directory is
+        re-checked at most every `check_interval` seconds, and a newer file is loaded on the next request.
+
+        Args:
+            default_path (str): The model file used when the model directory has no models.
+            model_directory (str): The directory where trained models are saved.
+            check_interval (float): The minimum number of seconds between checks for a newer model.
+        """
+        self.default_path = default_path
+        self.model_directory = model_directory
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.models = {}
+        self.current_path = None
+        self.last_checked = 0.0
+
+    def latest_path(self):
+        """
+        Finds the file the current model should be loaded from.
+
+        Returns:
+            str: The newest saved model, or the default model path.
+        """
+        saved_models = glob.glob(os.path.join(self.model_directory, 'model_*.pkl'))
+        return max(saved_models) if saved_models else self.default_path
+
+    def _load(self, file_path):
+        """
+        Returns the model stored in `file_path`, deserializing it only if the file is new or has changed.
+
+        Args:
+            file_path (str): The path to the model file.
+
+        Returns:
+            dict: The loaded model containing the TF-IDF vectorizer and classifier.
+        """
+        modified_at = os.path.getmtime(file_path)
+        cached = self.models.get(file_path)
+        if cached is not None and cached['modified_at'] == modified_at:
+            return cached['model']
+
+        with open(file_path, 'rb') as model_file:
+            model = pickle.loads(model_file.read())
+        self.models[file_path] = {
+            'model': model,
+            'modified_at': modified_at,
+            'loaded_at': datetime.now(),
+        }
+        print(f"Model loaded from {file_path}")
+        return model
+
+    def get_model(self, file_path=None):
+        """
+        Returns a loaded model, loading it on first use.
+
+        Args:
+            file_path (str, optional): A specific model file. Defaults to the current model, which is
+                swapped for a newer saved model when one appears.
+
+        Returns:
+            dict: The loaded model containing the TF-IDF vectorizer and classifier.
+        """
+        with self.lock:
+            if file_path is not None:
+                return self._load(file_path)
+            return self._current()[1]
+
+    def get_current(self):
+        """
+        Returns the current model together with the file it was loaded from, read under the same lock so a
+        newer model swapped in concurrently cannot pair one model with the other's path.
+
+        Returns:
+            tuple: The path of the current model file and the loaded model.
+        """
+        with self.lock:
+            return self._current()
+
+    def _current(self):
+        """
+        Returns the current model, swapping in a newer saved model when one appears. Must be called with the
+        lock held.
+
+        Returns:
+            tuple: The path of the current model file and the loaded model.
+        """
+        now = time.monotonic()
+        if self.current_path is None or now - self.last_checked >= self.check_interval:
+            self.last_checked = now
+            latest_path = self.latest_path()
+            try:
+                model = self._load(latest_path)
+            except Exception as e:
+                if self.current_path is None:
+                    raise
+                print(f"Error loading model from {latest_path}, keeping {self.current_path}: {e}")
+                return self.current_path, self.models[self.current_path]['model']
+            if latest_path != self.current_path:
+                self.models.pop(self.current_path, None)
+                self.current_path = latest_path
+            return latest_path, model
+        return self.current_path, self.models[self.current_path]['model']
+
+    def info(self):
+        """
+        Describes the current model.
+
+        Returns:
+            dict: The version (file name), path, classifier backend and load time of the current model, or None
+                values before the first load.
+        """
+        with self.lock:
+            loaded = self.models.get(self.current_path) if self.current_path else None
+            return {
+                'version': os.path.basename(self.current_path) if loaded else None,
+                'path': self.current_path if loaded else None,
+                'backend': model_backend(loaded['model']) if loaded else None,
+                'loaded_at': loaded['loaded_at'].isoformat() if loaded else None,
+            }
+
+
+model_registry = ModelRegistry()
@@ -1,14 +1,312 @@
-from pymongo import MongoClient
-from settings import CONNECTION_URL,DATABASE_NAME,COLLECTION_POST,COLLECTION_UPLOAD,COLLECTION_DUPLICATE,COLLECTION_METADATA
+from pymongo import MongoClient, ASCENDING
+from settings import (CONNECTION_URL, DATABASE_NAME, COLLECTION_POST, COLLECTION_UPLOAD, COLLECTION_DUPLICATE,
+                      COLLECTION_METADATA, COLLECTION_ENGAGEMENT_BUCKETS, COLLECTION_EXPORT_CURSOR,
+                      MONGO_CURSOR_BATCH_SIZE, MONGO_FRAME_CHUNK_SIZE, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE,
+                      MONGO_MAX_IDLE_TIME_MS, MONGO_WAIT_QUEUE_TIMEOUT_MS, MONGO_CONNECT_TIMEOUT_MS,
+                      MONGO_SOCKET_TIMEOUT_MS, MONGO_SERVER_SELECTION_TIMEOUT_MS)
 from datetime import datetime
-from pymongo import errors
+from pymongo import errors, monitoring
+import atexit
+import threading
+from itertools import chain
+import numpy as np
+import pandas as pd
 import pytz
 
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Counts connection pool events so connection churn can be watched under load.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {
+            'connections_created': 0,
+            'connections_closed': 0,
+            'checkouts': 0,
+            'checkout_failures': 0,
+            'checked_out': 0,
+            'pool_clears': 0,
+        }
+
+    def _count(self, name, delta=1):
+        with self.lock:
+            self.counters[name] += delta
+
+    def pool_created(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._count('pool_clears')
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._count('connections_created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._count('connections_closed')
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._count('checkout_failures')
+
+    def connection_checked_out(self, event):
+        self._count('checkouts')
+        self._count('checked_out')
+
+    def connection_checked_in(self, event):
+        self._count('checked_out', -1)
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(self.counters)
+        counters['open_connections'] = counters['connections_created'] - counters['connections_closed']
+        return counters
+
+
+class MongoConnectionManager:
+    def __init__(self, connection_url=CONNECTION_URL, max_pool_size=MONGO_MAX_POOL_SIZE,
+                 min_pool_size=MONGO_MIN_POOL_SIZE, max_idle_time_ms=MONGO_MAX_IDLE_TIME_MS,
+                 wait_queue_timeout_ms=MONGO_WAIT_QUEUE_TIMEOUT_MS, connect_timeout_ms=MONGO_CONNECT_TIMEOUT_MS,
+                 socket_timeout_ms=MONGO_SOCKET_TIMEOUT_MS,
+                 server_selection_timeout_ms=MONGO_SERVER_SELECTION_TIMEOUT_MS):
+        """
+        Owns the single MongoClient (and so the single connection pool) shared by the whole process.
+        The client is created on first use; `close` shuts it down and the next use creates a new one.
+
+        Args:
+            connection_url (str): The MongoDB connection string.
+            max_pool_size (int): The maximum number of pooled connections per server.
+            min_pool_size (int): The number of connections kept open while idle.
+            max_idle_time_ms (int): How long an idle pooled connection is kept before it is closed.
+            wait_queue_timeout_ms (int): How long an operation waits for a free connection.
+            connect_timeout_ms (int): The timeout for opening a connection.
+            socket_timeout_ms (int): The timeout for a single socket operation; None waits indefinitely.
+            server_selection_timeout_ms (int): How long to wait for a usable server.
+        """
+        self.connection_url = connection_url
+        self.client_options = {
+            'maxPoolSize': max_pool_size,
+            'minPoolSize': min_pool_size,
+            'maxIdleTimeMS': max_idle_time_ms,
+            'waitQueueTimeoutMS': wait_queue_timeout_ms,
+            'connectTimeoutMS': connect_timeout_ms,
+            'socketTimeoutMS': socket_timeout_ms,
+            'serverSelectionTimeoutMS': server_selection_timeout_ms,
+        }
+        self.lock = threading.Lock()
+        self.client = None
+        self.clients_created = 0
+        self.pool_listener = PoolStatsListener()
+        self.connect_hooks = []
+        self.close_hooks = []
+
+    def on_connect(self, hook):
+        """
+        Registers a function called with the new client whenever the shared client is created.
+
+        Args:
+            hook (callable): The function to call.
+
+        Returns:
+            callable: The hook, so this can be used as a decorator.
+        """
+        self.connect_hooks.append(hook)
+        return hook
+
+    def on_close(self, hook):
+        """
+        Registers a function called with the client just before the shared client is closed.
+
+        Args:
+            hook (callable): The function to call.
+
+        Returns:
+            callable: The hook, so this can be used as a decorator.
+        """
+        self.close_hooks.append(hook)
+        return hook
+
+    def get_client(self):
+        """
+        Returns the shared MongoClient, creating it on first use.
+
+        Returns:
+            MongoClient: The shared client.
+        """
+        with self.lock:
+            if self.client is None:
+                self.client = MongoClient(self.connection_url, event_listeners=[self.pool_listener],
+                                          **self.client_options)
+                self.clients_created += 1
+                client = self.client
+                hooks = list(self.connect_hooks)
+            else:
+                return self.client
+        for hook in hooks:
+            hook(client)
+        return client
+
+    def get_database(self, database_name=DATABASE_NAME):
+        """
+        Returns a database handle on the shared client.
+
+        Args:
+            database_name (str): The name of the database.
+
+        Returns:
+            Database: The database handle.
+        """
+        return self.get_client()[database_name]
+
+    def close(self):
+        """
+        Runs the close hooks and closes the shared client and its pool.
+        """
+        with self.lock:
+            client, self.client = self.client, None
+        if client is not None:
+            for hook in self.close_hooks:
+                hook(client)
+            client.close()
+
+    def stats(self):
+        """
+        Reports pool settings and connection counters.
+
+        Returns:
+            dict: The pool statistics.
+        """
+        stats = self.pool_listener.snapshot()
+        stats['clients_created'] = self.clients_created
+        stats['connected'] = self.client is not None
+        stats['max_pool_size'] = self.client_options['maxPoolSize']
+        stats['min_pool_size'] = self.client_options['minPoolSize']
+        return stats
+
+
+connection_manager = MongoConnectionManager()
+
+
+# The shared client the indexes were last created through; None until they have been created once
+_indexed_client = None
+
+
+@connection_manager.on_connect
+def ensure_indexes(client):
+    """
+    Creates the indexes the pipeline relies on, once per shared client rather than on every upload or fetch.
+    A failure is reported and the indexes are created again by the next `require_indexes` call.
+
+    Args:
+        client (MongoClient): The newly created shared client.
+    """
+    try:
+        create_indexes(client)
+    except Exception as e:
+        print(f"Error creating MongoDB indexes, retrying on the next upload: {e}")
+
+
+def require_indexes():
+    """
+    Makes sure the indexes exist on the shared client before writing uploads, whose duplicate handling relies
+    on the unique "Link" index. Creates them if the attempt made on connect failed.
+
+    Raises:
+        PyMongoError: If the indexes cannot be created.
+    """
+    client = connection_manager.get_client()
+    if _indexed_client is not client:
+        create_indexes(client)
+
+
+def create_indexes(client):
+    """
+    Creates the indexes the pipeline relies on; existing indexes are left as they are.
+
+    Args:
+        client (MongoClient): The shared client.
+
+    Raises:
+        PyMongoError: If an index cannot be created.
+    """
+    global _indexed_client
+    db = client[DATABASE_NAME]
+    db[COLLECTION_UPLOAD].create_index("Link", unique=True)
+    db[COLLECTION_UPLOAD].create_index("processed")
+    db[COLLECTION_POST].create_index("transform_data_id")
+    # Export filters: a date range alone, or combined with a company, channel or theme
+    db[COLLECTION_POST].create_index("Publish Date / Time")
+    for field in ("Company Name", "Social Media Channel", "Themes"):
+        db[COLLECTION_POST].create_index([(field, ASCENDING), ("Publish Date / Time", ASCENDING)])
+    db[COLLECTION_EXPORT_CURSOR].create_index([("user", ASCENDING), ("filters_key", ASCENDING)], unique=True)
+    db[COLLECTION_ENGAGEMENT_BUCKETS].create_index("document_id", unique=True)
+    _indexed_client = client
+atexit.register(connection_manager.close)
+
+
+def iter_dataframes(cursor, chunk_size=MONGO_FRAME_CHUNK_SIZE):
+    """
+    Builds DataFrames from a cursor column by column, without materializing the documents as a list first.
+
+    Columns appear in first-seen order and fields missing from a document are NaN, as with `pd.DataFrame(list(cursor))`.
+
+    Args:
+        cursor (Cursor): The cursor to read; set its projection and batch size before passing it in.
+        chunk_size (int, optional): The number of documents per DataFrame. None builds a single DataFrame.
+
+    Yields:
+        pd.DataFrame: Consecutive chunks of the cursor's documents.
+    """
+    columns = {}
+    rows = 0
+    for document in cursor:
+        for field, value in document.items():
+            column = columns.get(field)
+            if column is None:
+                column = columns[field] = [np.nan] * rows
+            column.append(value)
+        rows += 1
+        for column in columns.values():
+            if len(column) < rows:
+                column.append(np.nan)
+        if chunk_size and rows >= chunk_size:
+            yield pd.DataFrame(columns)
+            columns = {}
+            rows = 0
+    if rows or chunk_size is None:
+        yield pd.DataFrame(columns)
+
+
+def read_dataframe(collection, query=None, projection=None, batch_size=MONGO_CURSOR_BATCH_SIZE):
+    """
+    Reads the documents matching a query into one DataFrame, streaming the cursor in batches.
+
+    Args:
+        collection (Collection): The collection to read.
+        query (dict, optional): The filter. Defaults to all documents.
+        projection (dict, optional): The fields to return. Defaults to all fields.
+        batch_size (int): The number of documents fetched per round trip.
+
+    Returns:
+        pd.DataFrame: The matching documents.
+    """
+    cursor = collection.find(query or {}, projection).batch_size(batch_size)
+    return next(iter_dataframes(cursor, chunk_size=None))
+
 class MongoDBConnector:
     def __init__(self):
         self.connection_string = CONNECTION_URL
         self.database_name = DATABASE_NAME
-        self.client = MongoClient(self.connection_string)
+        self.client = connection_manager.get_client()
         self.db = self.client[self.database_name]
         
     def upload_metadata(self, file_name, len_df):
@@ -36,33 +334,153 @@ class MongoDBConnector:
         metadata_id = metadata_collection.insert_one(metadata).inserted_id
         return metadata_id
     def upload_elt_to_mongo(self,data,filename):
-        collection = self.db[COLLECTION_UPLOAD]
-        duplicate_collection = self.db[COLLECTION_DUPLICATE]
+        try:
+            require_indexes()
+            metadata_id = self.upload_metadata(filename, len(data))
+            self.insert_uploads(data, metadata_id)
+        except RuntimeError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Error uploading to MongoDB: {str(e)}")
+
+    def upload_elt_chunks(self, chunks, filename):
+        """
+        Uploads mapped records chunk by chunk under a single metadata entry, so a large file never has to be
+        held in memory at once. The metadata's total_data_count is filled in once all chunks are stored.
+        If a chunk fails, the chunks already stored are removed again, so a file is uploaded either
+        completely or not at all.
 
-        # Create a unique index on the "Link" field (assuming "Link" is the unique field)
-        collection.create_index("Link", unique=True)
+        Args:
+            chunks (iterable): Lists of mapped records, as yielded by `FieldMapper.map_chunks`.
+            filename (str): The name of the uploaded file.
 
+        Returns:
+            int: The number of records uploaded.
+
+        Raises:
+            RuntimeError: If the file cannot be read or stored, with what happened to the partial upload.
+        """
+        metadata_id = None
+        total = 0
         try:
-            metadata_id = self.upload_metadata(filename, len(data))
-            updated_data = [{**item, "metadata_id": metadata_id} for item in data]
+            # Read the first chunk before writing anything, so unreadable files leave no metadata behind
+            chunks = iter(chunks)
+            first_chunk = next(chunks, [])
+            require_indexes()
+            metadata_id = self.upload_metadata(filename, 0)
+            for data in chain([first_chunk], chunks):
+                self.insert_uploads(data, metadata_id)
+                total += len(data)
+            self.db[COLLECTION_METADATA].update_one({"_id": metadata_id}, {"$set": {"total_data_count": total}})
+            return total
+        except Exception as e:
+            message = str(e) if isinstance(e, RuntimeError) else f"Error uploading to MongoDB: {str(e)}"
+            if metadata_id is not None:
+                message += self.discard_partial_upload(metadata_id, total)
+            raise RuntimeError(message)
+
+    def discard_partial_upload(self, metadata_id, uploaded):
+        """
+        Deletes the records and the metadata entry of an upload that failed partway.
+
+        Args:
+            metadata_id (ObjectId): The metadata entry of the upload.
+            uploaded (int): The number of records stored before the failure.
+
+        Returns:
+            str: A sentence on the outcome, to append to the upload error.
+        """
+        try:
+            for collection_name in (COLLECTION_UPLOAD, COLLECTION_DUPLICATE):
+                self.db[collection_name].delete_many({"metadata_id": metadata_id})
+            self.db[COLLECTION_METADATA].delete_one({"_id": metadata_id})
+        except errors.PyMongoError as e:
+            print(f"Error removing partial upload {metadata_id}: {e}")
+            return (f". {uploaded} records were stored before the error and could not be removed "
+                    f"(metadata_id {metadata_id}).")
+        return f". The {uploaded} records stored before the error were removed; nothing was uploaded."
+
+    def insert_uploads(self, data, metadata_id):
+        """
+        Inserts mapped records into the upload collection and moves records whose Link is already stored
+        to the duplicate collection. Known Links are found with one indexed lookup and all duplicates are
+        written with one bulk insert.
+
+        Args:
+            data (list): The mapped records.
+            metadata_id (ObjectId): The metadata entry of the upload.
+        """
+        if not data:
+            return
+        collection = self.db[COLLECTION_UPLOAD]
+        updated_data = [{**item, "metadata_id": metadata_id, "processed": False} for item in data]
 
-            # Use insert_many for bulk insert
-            collection.insert_many(updated_data, ordered=False)
+        seen_links = {
+            document["Link"]
+            for document in collection.find({"Link": {"$in": [item.get("Link") for item in updated_data]}},
+                                            {"_id": 0, "Link": 1})
+        }
+        new_items, duplicates = [], []
+        for item in updated_data:
+            link = item.get("Link")
+            if link in seen_links:
+                duplicates.append(item)
+            else:
+                seen_links.add(link)
+                new_items.append(item)
+
+        try:
+            if new_items:
+                # Use insert_many for bulk insert
+                collection.insert_many(new_items, ordered=False)
         except errors.BulkWriteError as bwe:
+            # Links stored by a concurrent upload since the lookup
             for error in bwe.details['writeErrors']:
                 if error['code'] == 11000:  # Duplicate key error code
-                    duplicate_collection.insert_one(updated_data[error['index']])
+                    duplicates.append(new_items[error['index']])
                 else:
                     raise RuntimeError(f"Error uploading to MongoDB: {str(bwe)}")
-        except Exception as e:
-            raise RuntimeError(f"Error uploading to MongoDB: {str(e)}")     
+
+        if duplicates:
+            self.db[COLLECTION_DUPLICATE].insert_many(duplicates, ordered=False)
+
+    def get_export_cursor(self, user, filters_key):
+        """
+        Looks up where a user's previous export with the same filters stopped.
+
+        Args:
+            user (str): The user exporting.
+            filters_key (str): The canonical form of the export filters.
+
+        Returns:
+            dict: The saved cursor with the last exported post `_id`, or None if there is none.
+        """
+        return self.db[COLLECTION_EXPORT_CURSOR].find_one({"user": user, "filters_key": filters_key})
+
+    def save_export_cursor(self, user, filters_key, filters, last_id, rows):
+        """
+        Records the last post a user exported with the given filters, so the next export can start after it.
+
+        Args:
+            user (str): The user exporting.
+            filters_key (str): The canonical form of the export filters.
+            filters (dict): The export filters, stored for reference.
+            last_id (ObjectId): The largest `_id` in the export.
+            rows (int): The number of posts exported.
+        """
+        self.db[COLLECTION_EXPORT_CURSOR].update_one(
+            {"user": user, "filters_key": filters_key},
+            {"$set": {"filters": filters, "last_id": last_id, "rows": rows, "exported_at": datetime.utcnow()}},
+            upsert=True,
+        )
 
 
 
     def close_connection(self):
+        # The client is shared by the whole process; this shuts down its pool for everyone.
         try:
             if self.client:
-                self.client.close()
+                connection_manager.close()
                 print("Connection to MongoDB closed.")
         except Exception as e:
             raise RuntimeError(f"Error closing MongoDB connection: {str(e)}")
@@ -0,0 +1,53 @@
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Process pools by worker count, started on first use and kept for the life of the process.
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(workers):
+    """
+    Returns the process pool with `workers` workers, starting it on first use. Workers are started with
+    "spawn" rather than forked, since the pools are used from the web server's and job runner's threads,
+    and forking while another thread holds a lock can leave the child deadlocked.
+
+    Args:
+        workers (int): The number of worker processes.
+
+    Returns:
+        ProcessPoolExecutor: The shared pool.
+    """
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ProcessPoolExecutor(max_workers=workers,
+                                                         mp_context=multiprocessing.get_context('spawn'))
+        return pool
+
+
+def discard_pool(workers):
+    """
+    Forgets a pool whose worker died, so the next call starts a new one.
+
+    Args:
+        workers (int): The number of worker processes of the pool.
+    """
+    with _pools_lock:
+        pool = _pools.pop(workers, None)
+    if pool is not None:
+        pool.shutdown(wait=False)
+
+
+@atexit.register
+def shutdown_pools():
+    """
+    Stops the worker processes of every pool.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown()
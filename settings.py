@@ -63,3 +63,66 @@ COLLECTION_UPLOAD="uploaded_data"
 COLLECTION_KEYWORD="keyword_data"
 COLLECTION_DUPLICATE="duplicate_data"
 COLLECTION_METADATA="metadata"
+COLLECTION_RUN_METRICS="run_metrics"
+COLLECTION_ENGAGEMENT_BUCKETS="engagement_buckets"
+COLLECTION_EXPORT_CURSOR="export_cursors"
+PROCESSED_BACKFILL_BATCH_SIZE=1000
+MONGO_CURSOR_BATCH_SIZE=1000
+MONGO_FRAME_CHUNK_SIZE=10000
+UPLOAD_CHUNK_SIZE=5000  # Rows read, mapped and inserted at a time during uploads
+EXPORT_BATCH_SIZE=1000  # Documents fetched and written at a time during exports
+EXPORT_DEFAULT_FORMAT="csv"  # "csv" (streamed as it is read), "xlsx" or "parquet"
+EXPORT_EXCLUDED_FIELDS=["metadata_id"]
+MONGO_MAX_POOL_SIZE=50
+MONGO_MIN_POOL_SIZE=0
+MONGO_MAX_IDLE_TIME_MS=300000
+MONGO_WAIT_QUEUE_TIMEOUT_MS=10000
+MONGO_CONNECT_TIMEOUT_MS=10000
+MONGO_SOCKET_TIMEOUT_MS=None  # None waits indefinitely
+MONGO_SERVER_SELECTION_TIMEOUT_MS=30000
+
+
+#####################PROCESSING######################
+
+
+CLEAN_TEXT_WORKERS=None  # None uses one worker per CPU
+CLEAN_TEXT_CHUNK_SIZE=2000
+LEMMA_CACHE_SIZE=100000
+ENTITY_MODEL="gpt-3.5-turbo-instruct"
+ENTITY_PROMPT_VERSION="v1"
+ENTITY_CACHE_PATH="entity_cache.sqlite3"
+ENTITY_CACHE_TTL_SECONDS=30 * 24 * 60 * 60
+ENTITY_CACHE_MAX_ENTRIES=200000
+ENTITY_CONCURRENCY=16
+ENTITY_REQUESTS_PER_MINUTE=3000
+ENTITY_TOKENS_PER_MINUTE=250000
+ENTITY_MAX_RETRIES=5
+ENTITY_BACKOFF_SECONDS=1.0
+ENTITY_MAX_BACKOFF_SECONDS=30.0
+ENTITY_EXTRACTION_MODE="async"  # "async" or "threads"
+ENTITY_BATCH_SIZE=10  # Messages per completion request; 1 disables batching
+ENTITY_BATCH_PROMPT_VERSION="batch-v1"
+ENTITY_BATCH_TOKENS_PER_MESSAGE=200
+TIMESTAMP_SAMPLE_SIZE=200  # Values checked when inferring the timestamp format of a column
+TIMESTAMP_CACHE_SIZE=100000
+VIDEO_RANDOM_SEED=None  # Set an int to make the generated video fields reproducible
+JOB_WORKERS=2  # Background processing runs that can execute at once (one per dataset)
+JOB_HISTORY_SIZE=50  # Finished background jobs kept for status lookups
+METRICS_TRACK_MEMORY=False  # Also trace allocations with tracemalloc for a per-stage peak (slows runs down; for debugging)
+METRICS_MEMORY_SAMPLE_SECONDS=0.2  # How often the process memory is sampled while a stage runs
+SNAPSHOT_ENABLED=True  # Keep Parquet snapshots of the posts collection for analytics (skipped without pyarrow)
+SNAPSHOT_DIRECTORY="snapshots/posts"
+SNAPSHOT_BATCH_SIZE=10000  # Posts read from MongoDB and written at a time
+SNAPSHOT_COMPACT_FILES=20  # Merge the files of a snapshot partition into one once it holds this many
+
+
+#####################MODEL######################
+
+
+MODEL_DEFAULT_PATH="model_q2.pkl"
+MODEL_DIRECTORY="model"
+MODEL_RELOAD_CHECK_SECONDS=30
+PREDICT_CHUNK_SIZE=5000
+PREDICT_WORKERS=1  # More than 1 predicts chunks in parallel worker processes
+CLASSIFIER_BACKEND="gradient_boosting"  # "gradient_boosting", "sgd", "logistic_regression" or "sgd_hashing"
+CLASSIFIER_N_JOBS=-1  # Cores used to train backends that support it; -1 uses all cores
@@ -0,0 +1,414 @@
+import json
+import math
+import os
+import threading
+import uuid
+from datetime import datetime
+import pandas as pd
+from bson import ObjectId
+from settings import SNAPSHOT_DIRECTORY, SNAPSHOT_BATCH_SIZE, SNAPSHOT_COMPACT_FILES
+
+PARTITION_COLUMNS = ['year', 'month', 'company']
+# Files starting with "_" or "." are skipped when the dataset is read
+STATE_FILE = '_sync_state.json'
+COMPACTION_JOURNAL = '_compaction.json'
+COMPACTING_FILE = '.compacting.parquet'
+
+
+def _is_missing(value):
+    """
+    Checks whether a value is None or NaN.
+
+    Args:
+        value: The value to check.
+
+    Returns:
+        bool: True if the value is missing.
+    """
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _normalize_column(values):
+    """
+    Makes an object column storable in Parquet: ObjectIds, lists, nested values and columns mixing value
+    types become strings.
+
+    Args:
+        values (pd.Series): The column.
+
+    Returns:
+        pd.Series: The column, unchanged if it already has a single storable type.
+    """
+    types = {type(value) for value in values if not _is_missing(value)}
+    if len(types) <= 1 and not types & {ObjectId, list, dict}:
+        return values
+    return values.map(lambda value: None if _is_missing(value) else str(value))
+
+
+def _arrow_types():
+    """
+    Maps the column types recorded in the sync state to Arrow types.
+
+    Returns:
+        dict: The Arrow type of each recorded type name.
+    """
+    import pyarrow as pa
+
+    return {'int64': pa.int64(), 'double': pa.float64(), 'bool': pa.bool_(),
+            'timestamp': pa.timestamp('ms'), 'string': pa.string()}
+
+
+def _column_type(arrow_type):
+    """
+    Names the recorded type a column of a batch is stored as. Types other than numbers, booleans and
+    dates (e.g. lists and nested values) are stored as strings.
+
+    Args:
+        arrow_type (pa.DataType): The type of the column in the batch.
+
+    Returns:
+        str: The recorded type name, or None for a column that is empty in the batch.
+    """
+    import pyarrow as pa
+
+    if pa.types.is_null(arrow_type):
+        return None
+    if pa.types.is_integer(arrow_type):
+        return 'int64'
+    if pa.types.is_floating(arrow_type):
+        return 'double'
+    if pa.types.is_boolean(arrow_type):
+        return 'bool'
+    if pa.types.is_timestamp(arrow_type) and arrow_type.tz is None:
+        return 'timestamp'
+    return 'string'
+
+
+def _merge_types(recorded, batch):
+    """
+    Picks the type a column keeps when a batch stores it differently than the earlier batches.
+
+    Args:
+        recorded (str): The recorded type of the column, or None if it is new.
+        batch (str): The type of the column in the batch, or None if it is empty.
+
+    Returns:
+        str: Integers widened to doubles, the same type, or string for any other mix.
+    """
+    if recorded is None or batch is None or recorded == batch:
+        return recorded or batch
+    if {recorded, batch} == {'int64', 'double'}:
+        return 'double'
+    return 'string'
+
+
+class SnapshotStore:
+    def __init__(self, directory=SNAPSHOT_DIRECTORY, batch_size=SNAPSHOT_BATCH_SIZE):
+        """
+        Keeps a Parquet copy of the posts collection for analytics, partitioned as
+        `year=YYYY/month=M/company=NAME/`, so reports can read it instead of scanning MongoDB.
+
+        The copy is extended incrementally: `sync` appends the posts whose `_id` is larger than the last
+        one written, and records that `_id` in a state file next to the data. Nested documents are
+        flattened into dotted column names. The state file also records the type of every column: a
+        column that later holds a different type is widened (integers to doubles, anything else to
+        strings), and `load` reads the older files as the widened type. Requires pyarrow.
+
+        Args:
+            directory (str): The root directory of the partitioned dataset.
+            batch_size (int): The number of posts read from MongoDB and written at a time.
+        """
+        self.directory = directory
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self._available = None
+
+    def available(self):
+        """
+        Checks whether pyarrow can be imported, reporting it once if it cannot.
+
+        Returns:
+            bool: True if snapshots can be written and read.
+        """
+        if self._available is None:
+            try:
+                import pyarrow.parquet  # noqa: F401
+                self._available = True
+            except ImportError as e:
+                print(f"Parquet snapshots are skipped, pyarrow is not available: {e}")
+                self._available = False
+        return self._available
+
+    def _read_state(self):
+        """
+        Reads where the previous sync stopped.
+
+        Returns:
+            dict: The state with the last written `_id`, or an empty dict before the first sync.
+        """
+        state_path = os.path.join(self.directory, STATE_FILE)
+        if not os.path.exists(state_path):
+            return {}
+        with open(state_path, 'r', encoding='utf-8') as state_file:
+            return json.load(state_file)
+
+    def _write_state(self, state):
+        """
+        Saves the sync state, replacing the previous one atomically.
+
+        Args:
+            state (dict): The state to save.
+        """
+        state_path = os.path.join(self.directory, STATE_FILE)
+        with open(f"{state_path}.tmp", 'w', encoding='utf-8') as state_file:
+            json.dump(state, state_file)
+        os.replace(f"{state_path}.tmp", state_path)
+
+    def _to_table(self, documents, column_types):
+        """
+        Builds an Arrow table from a batch of posts, adding the partition columns and storing every other
+        column as its recorded type.
+
+        Args:
+            documents (list): The posts, as returned by MongoDB.
+            column_types (dict): The recorded type of each column, updated in place with new and widened
+                columns.
+
+        Returns:
+            pa.Table: The flattened posts.
+        """
+        import pyarrow as pa
+
+        frame = pd.json_normalize(documents, sep='.')
+        for column in frame.columns[frame.dtypes == object]:
+            frame[column] = _normalize_column(frame[column])
+
+        if 'Publish Date / Time' in frame:
+            published = pd.to_datetime(frame['Publish Date / Time'], errors='coerce')
+        else:
+            published = pd.Series(pd.NaT, index=frame.index, dtype='datetime64[ns]')
+        frame['year'] = published.dt.year.astype('Int64')
+        frame['month'] = published.dt.month.astype('Int64')
+        frame['company'] = frame['Company Name'] if 'Company Name' in frame else None
+
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        arrow_types = _arrow_types()
+        fields = []
+        for field in table.schema:
+            if field.name in PARTITION_COLUMNS:
+                fields.append(field)
+                continue
+            # Columns that are empty in every batch so far have no type yet; store them as strings
+            column_type = _merge_types(column_types.get(field.name), _column_type(field.type)) or 'string'
+            column_types[field.name] = column_type
+            fields.append(pa.field(field.name, arrow_types[column_type]))
+        return table.cast(pa.schema(fields), safe=False)
+
+    def _write_batch(self, documents, column_types):
+        """
+        Appends a batch of posts to the dataset. Files are named after the first post of the batch, so
+        rewriting a batch after an interrupted sync replaces its files instead of duplicating them.
+
+        Args:
+            documents (list): The posts, as returned by MongoDB.
+            column_types (dict): The recorded type of each column, updated in place.
+        """
+        import pyarrow.parquet as pq
+
+        pq.write_to_dataset(
+            self._to_table(documents, column_types),
+            root_path=self.directory,
+            partition_cols=PARTITION_COLUMNS,
+            basename_template=f"part-{documents[0]['_id']}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore',
+        )
+
+    def sync(self, collection):
+        """
+        Appends the posts added to `collection` since the previous sync.
+
+        Args:
+            collection (Collection): The posts collection.
+
+        Returns:
+            int: The number of posts written.
+        """
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            self._recover_compaction()
+            state = self._read_state()
+            query = {'_id': {'$gt': ObjectId(state['last_id'])}} if state.get('last_id') else {}
+            cursor = collection.find(query).sort('_id', 1).batch_size(self.batch_size)
+
+            written = 0
+            batch = []
+            for document in cursor:
+                batch.append(document)
+                if len(batch) >= self.batch_size:
+                    written += self._commit_batch(batch, state)
+                    batch = []
+            if batch:
+                written += self._commit_batch(batch, state)
+            return written
+
+    def _commit_batch(self, batch, state):
+        """
+        Writes a batch and moves the sync state past it.
+
+        Args:
+            batch (list): The posts to write, in `_id` order.
+            state (dict): The sync state, updated in place.
+
+        Returns:
+            int: The number of posts written.
+        """
+        state.setdefault('columns', {})
+        self._write_batch(batch, state['columns'])
+        state['last_id'] = str(batch[-1]['_id'])
+        state['rows'] = state.get('rows', 0) + len(batch)
+        state['synced_at'] = datetime.utcnow().isoformat()
+        self._write_state(state)
+        return len(batch)
+
+    def load(self, columns=None, years=None, months=None, companies=None):
+        """
+        Reads posts from the snapshot, touching only the requested columns and partitions. Files are
+        memory-mapped, and every column is read as its recorded type, so files written before the type
+        of a column was widened read the same as newer ones.
+
+        Args:
+            columns (list, optional): The columns to read. Defaults to all columns.
+            years (list, optional): The publish years to read. Defaults to all years.
+            months (list, optional): The publish months (1-12) to read. Defaults to all months.
+            companies (list, optional): The companies to read. Defaults to all companies.
+
+        Returns:
+            pd.DataFrame: The matching posts; empty if there is no snapshot yet.
+        """
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        from pyarrow import fs
+
+        if not os.path.isdir(self.directory):
+            return pd.DataFrame(columns=columns)
+
+        with self.lock:
+            self._recover_compaction()
+            column_types = self._read_state().get('columns', {})
+        if not column_types:
+            return pd.DataFrame(columns=columns)
+
+        arrow_types = _arrow_types()
+        partitioning = ds.partitioning(pa.schema([('year', pa.int32()), ('month', pa.int32()),
+                                                  ('company', pa.string())]), flavor='hive')
+        schema = pa.schema([(name, arrow_types[column_type]) for name, column_type in column_types.items()]
+                           + list(partitioning.schema))
+        filesystem = fs.LocalFileSystem(use_mmap=True)
+        dataset = ds.dataset(self.directory, schema=schema, format='parquet', partitioning=partitioning,
+                             filesystem=filesystem)
+
+        expression = None
+        for field, values in zip(PARTITION_COLUMNS, (years, months, companies)):
+            if values:
+                condition = ds.field(field).isin(list(values))
+                expression = condition if expression is None else expression & condition
+
+        return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+    def compact(self, min_files=SNAPSHOT_COMPACT_FILES):
+        """
+        Merges the files of each partition into one once it holds `min_files` or more, since every sync
+        adds a small file to each partition it touches.
+
+        The merged file is written under a hidden name, and a journal listing the files it replaces is
+        saved before it is renamed into place and those files are deleted; a compaction interrupted
+        midway is finished (or discarded, if the journal was not saved yet) by the next call.
+
+        Args:
+            min_files (int): The number of files from which a partition is merged.
+
+        Returns:
+            int: The number of partitions merged.
+        """
+        import pyarrow as pa
+
+        with self.lock:
+            if not os.path.isdir(self.directory):
+                return 0
+            self._recover_compaction()
+            arrow_types = _arrow_types()
+            schema = pa.schema([(name, arrow_types[column_type])
+                                for name, column_type in self._read_state().get('columns', {}).items()])
+
+            compacted = 0
+            for partition, _, file_names in os.walk(self.directory):
+                parts = sorted(name for name in file_names
+                               if name.endswith('.parquet') and not name.startswith(('_', '.')))
+                if len(parts) >= max(min_files, 2):
+                    self._compact_partition(partition, parts, schema)
+                    compacted += 1
+            return compacted
+
+    def _compact_partition(self, partition, parts, schema):
+        """
+        Replaces the files of a partition with a single file.
+
+        Args:
+            partition (str): The partition directory.
+            parts (list): The names of the files to merge.
+            schema (pa.Schema): The recorded schema of the non-partition columns.
+        """
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+
+        paths = [os.path.join(partition, name) for name in parts]
+        # Columns missing from every file of the partition are left out rather than written as nulls
+        present = set()
+        for path in paths:
+            present.update(pq.read_schema(path).names)
+        schema = pa.schema([field for field in schema if field.name in present])
+
+        compacting_path = os.path.join(partition, COMPACTING_FILE)
+        with pq.ParquetWriter(compacting_path, schema) as writer:
+            for batch in ds.dataset(paths, schema=schema, format='parquet').to_batches():
+                writer.write_batch(batch)
+
+        journal = {'target': f"compacted-{uuid.uuid4().hex}.parquet", 'replaces': parts}
+        journal_path = os.path.join(partition, COMPACTION_JOURNAL)
+        with open(f"{journal_path}.tmp", 'w', encoding='utf-8') as journal_file:
+            json.dump(journal, journal_file)
+        os.replace(f"{journal_path}.tmp", journal_path)
+        self._finish_compaction(partition, journal)
+
+    def _finish_compaction(self, partition, journal):
+        """
+        Moves a merged file into place and deletes the files it replaces, then the journal.
+
+        Args:
+            partition (str): The partition directory.
+            journal (dict): The name of the merged file and of the files it replaces.
+        """
+        compacting_path = os.path.join(partition, COMPACTING_FILE)
+        if os.path.exists(compacting_path):
+            os.replace(compacting_path, os.path.join(partition, journal['target']))
+        for name in journal['replaces']:
+            path = os.path.join(partition, name)
+            if os.path.exists(path):
+                os.remove(path)
+        os.remove(os.path.join(partition, COMPACTION_JOURNAL))
+
+    def _recover_compaction(self):
+        """
+        Completes the compactions interrupted after their journal was saved, and discards the merged
+        files of those interrupted before.
+        """
+        for partition, _, file_names in os.walk(self.directory):
+            if COMPACTION_JOURNAL in file_names:
+                with open(os.path.join(partition, COMPACTION_JOURNAL), 'r', encoding='utf-8') as journal_file:
+                    self._finish_compaction(partition, json.load(journal_file))
+            elif COMPACTING_FILE in file_names:
+                os.remove(os.path.join(partition, COMPACTING_FILE))
+
+
+snapshot_store = SnapshotStore()
@@ -0,0 +1,61 @@
+import mongomock
+import pandas as pd
+import pytest
+from engagement import build_engagement_pipeline
+from extract_transfer_load import FieldMapper
+from settings import PHANTOM_BUSTER
+
+
+def phantom_buster_rows(engagements):
+    """
+    Builds a Phantom Buster export with one post per (likes, comments, reposts) triple.
+    """
+    rows = []
+    for index, (likes, comments, reposts) in enumerate(engagements):
+        row = {field: '' for field in PHANTOM_BUSTER}
+        row.update({
+            'postUrl': f'https://www.linkedin.com/feed/update/{index}',
+            'type': 'Text',
+            'postContent': f'Post {index}',
+            'likeCount': likes,
+            'commentCount': comments,
+            'repostCount': reposts,
+            'profileUrl': 'example-company',
+            'postTimestamp': '2024-03-01T10:00:00.000Z',
+        })
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def bucket_documents(documents, store_document=True):
+    """
+    Runs the bucketing pipeline over `documents`, up to the `$merge` stage that writes the output collection.
+    """
+    collection = mongomock.MongoClient().db.uploads
+    collection.insert_many(documents)
+    pipeline = build_engagement_pipeline(store_document=store_document)
+    assert '$merge' in pipeline[-1]
+    return list(collection.aggregate(pipeline[:-1]))
+
+
+@pytest.mark.parametrize('store_document', [True, False])
+def test_mapped_documents_are_bucketed_by_their_engagement(store_document):
+    mapper = FieldMapper(None)
+    df = phantom_buster_rows([(40, 5, 5), (300, 50, 10), (700, 100, 0), (2000, 10, 3)])
+    mapper.detect_source(df)
+    documents = mapper.map_fields(df)
+    assert 'engagement' not in documents[0]
+
+    buckets = bucket_documents(documents, store_document)
+
+    assert [entry['bucket'] for entry in buckets] == ['0-100', '101-500', '501-1000', '1000+']
+    if store_document:
+        assert [entry['document']['Engagement'] for entry in buckets] == [50, 360, 800, 2013]
+    else:
+        assert [entry['engagement'] for entry in buckets] == [50, 360, 800, 2013]
+
+
+def test_lowercase_engagement_is_still_bucketed():
+    buckets = bucket_documents([{'engagement': 120}, {'engagement': 'n/a'}, {'message': 'no engagement'}])
+
+    assert [entry['bucket'] for entry in buckets] == ['101-500']
@@ -0,0 +1,122 @@
+import asyncio
+import time
+import openai
+import pandas as pd
+import pytest
+from async_extractor import AsyncEntityExtractor, TokenBucket
+from completion_stub import ENTITY_TYPES, start_stub_server
+from entity_cache import EntityCache
+from entityprocessor import EntityProcessor
+
+MESSAGES = [f"Launching brand{i} in city{i % 3} with #tag{i}" for i in range(25)]
+
+
+@pytest.fixture
+def stub_api():
+    """
+    Points the OpenAI client at a local completion stub that leaves some texts out of batched answers.
+    """
+    server = start_stub_server(drop_rate=0.2)
+    saved_base, saved_key = openai.api_base, openai.api_key
+    try:
+        yield f"http://127.0.0.1:{server.server_port}/v1"
+    finally:
+        server.shutdown()
+        openai.api_base, openai.api_key = saved_base, saved_key
+
+
+def make_processor(api_base, tmp_path, batch_size):
+    processor = EntityProcessor(cache=EntityCache(path=str(tmp_path / 'entities.sqlite3')), batch_size=batch_size)
+    # EntityProcessor sets the API key and base from the environment
+    openai.api_base, openai.api_key = api_base, 'test'
+    return processor
+
+
+def assert_extracted(df):
+    assert df['Message'].tolist() == MESSAGES * 2
+    assert df[ENTITY_TYPES].notna().all().all()
+
+
+@pytest.mark.parametrize('batch_size', [1, 10])
+def test_async_extraction(stub_api, tmp_path, batch_size):
+    processor = make_processor(stub_api, tmp_path, batch_size)
+
+    df = processor.process_entities_async(pd.DataFrame({'Message': MESSAGES * 2}), concurrency=4)
+
+    assert_extracted(df)
+
+
+@pytest.mark.parametrize('batch_size', [1, 10])
+def test_threaded_extraction(stub_api, tmp_path, batch_size):
+    processor = make_processor(stub_api, tmp_path, batch_size)
+
+    df = processor.process_entities(pd.DataFrame({'Message': MESSAGES * 2}), chunk_size=10)
+
+    assert_extracted(df)
+
+
+def test_repeated_run_is_served_from_cache(stub_api, tmp_path):
+    processor = make_processor(stub_api, tmp_path, 10)
+    first = processor.process_entities_async(pd.DataFrame({'Message': MESSAGES}))
+    # Nothing listens on the discard port, so any request would fail
+    openai.api_base = 'http://127.0.0.1:9/v1'
+
+    second = processor.process_entities_async(pd.DataFrame({'Message': MESSAGES}))
+
+    assert second[ENTITY_TYPES].equals(first[ENTITY_TYPES])
+
+
+@pytest.mark.parametrize('rate', [0, -5])
+def test_token_bucket_rejects_non_positive_rate(rate):
+    with pytest.raises(ValueError):
+        TokenBucket(rate)
+
+
+def test_token_bucket_rejects_non_positive_capacity():
+    with pytest.raises(ValueError):
+        TokenBucket(60, capacity=0)
+
+
+def test_token_bucket_waits_once_the_burst_is_used():
+    bucket = TokenBucket(60, capacity=2)
+
+    async def take(count):
+        started = time.monotonic()
+        for _ in range(count):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    assert asyncio.run(take(2)) < 0.5
+    assert asyncio.run(take(1)) > 0.5
+
+
+def test_closing_the_stream_early_stops_the_workers(stub_api, tmp_path):
+    processor = make_processor(stub_api, tmp_path, 1)
+    extractor = AsyncEntityExtractor(processor, concurrency=2)
+
+    async def read_one():
+        stream = extractor.stream((str(i), message) for i, message in enumerate(MESSAGES * 4))
+        first = await stream.__anext__()
+        # Let the workers fill the result queue before closing
+        await asyncio.sleep(0.5)
+        await stream.aclose()
+        return first
+
+    key, entities = asyncio.run(asyncio.wait_for(read_one(), timeout=10))
+
+    assert entities is not None
+
+
+def test_worker_error_reaches_the_consumer(stub_api, tmp_path):
+    processor = make_processor(stub_api, tmp_path, 1)
+    extractor = AsyncEntityExtractor(processor, concurrency=2)
+
+    def items():
+        yield '0', MESSAGES[0]
+        raise RuntimeError("source failed")
+
+    async def read_all():
+        return [result async for result in extractor.stream(items())]
+
+    with pytest.raises(RuntimeError, match="source failed"):
+        asyncio.run(asyncio.wait_for(read_all(), timeout=10))
@@ -0,0 +1,61 @@
+import re
+import pandas as pd
+import pytest
+from nltk.corpus import stopwords
+from nltk.stem import WordNetLemmatizer
+from nltk.tokenize import word_tokenize
+from text_cleaner import clean_text, clean_texts
+
+try:
+    stopwords.words('english')
+    word_tokenize('nltk data check')
+    WordNetLemmatizer().lemmatize('checks')
+except LookupError:
+    pytestmark = pytest.mark.skip(reason="needs the NLTK stopwords, punkt_tab and wordnet data")
+
+SAMPLE = [
+    "Hello World! The QUICK brown foxes were running over 3 lazy dogs...",
+    "Check out https://example.com/offers #BigSale @BrandName — 50% off!!!",
+    "  Multiple   spaces,\ttabs\nand newlines\r\nin one message  ",
+    "Café naïve résumé: accents are dropped, emojis too 😀🎉",
+    "Geese, mice, children and leaves; the wolves' dens",
+    "isn't won't they're we've (contractions)",
+    "",
+    "1234567890 !@#$%^&*()",
+    None,
+    float('nan'),
+]
+
+
+def reference_clean_text(text):
+    """
+    The cleaning of the original TextClassifier.clean_text, which built the stopwords and lemmatizer on
+    every call.
+    """
+    if pd.notna(text):
+        text = text.lower()
+        text = re.sub(r'[^a-zA-Z\s]', '', text)
+        tokens = word_tokenize(text)
+        stop_words = set(stopwords.words('english'))
+        tokens = [token for token in tokens if token not in stop_words]
+        lemmatizer = WordNetLemmatizer()
+        tokens = [lemmatizer.lemmatize(token) for token in tokens]
+        return ' '.join(tokens)
+    else:
+        return ''
+
+
+def test_clean_text_matches_original():
+    for text in SAMPLE:
+        assert clean_text(text).encode('utf-8') == reference_clean_text(text).encode('utf-8')
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_clean_texts_matches_original(workers):
+    texts = pd.Series(SAMPLE * 20, index=range(1000, 1000 + len(SAMPLE) * 20))
+    cleaned = clean_texts(texts, workers=workers, chunk_size=7)
+
+    assert cleaned.index.equals(texts.index)
+    assert [value.encode('utf-8') for value in cleaned] == [
+        reference_clean_text(text).encode('utf-8') for text in texts
+    ]
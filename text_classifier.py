@@ -1,10 +1,15 @@
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.ensemble import GradientBoostingClassifier
-import re
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
 import nltk
+import os
 import pickle
+import time
 import pandas as pd
 from datetime import datetime
+from classifier_backends import CLASSIFIER_BACKENDS, build_backend
+from keyword_matcher import get_keyword_matcher
+from model_registry import model_registry
+from settings import CLEAN_TEXT_WORKERS, CLEAN_TEXT_CHUNK_SIZE, CLASSIFIER_BACKEND, CLASSIFIER_N_JOBS
 
 # Download necessary NLTK datasets
 nltk.download('punkt')
@@ -12,22 +17,24 @@ nltk.download('punkt_tab')
 nltk.download('stopwords')
 nltk.download('wordnet')
 
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from nltk.stem import WordNetLemmatizer
+import text_cleaner
 
 
 class TextClassifier:
-    def __init__(self, training_data=None):
+    def __init__(self, training_data=None, backend=CLASSIFIER_BACKEND, n_jobs=CLASSIFIER_N_JOBS):
         """
         Initializes the TextClassifier class with optional training data.
 
         Args:
             training_data (pd.DataFrame, optional): The training data to be used for model training. Defaults to None.
+            backend (str, optional): The vectorizer and classifier to train, one of
+                `classifier_backends.CLASSIFIER_BACKENDS`. Defaults to CLASSIFIER_BACKEND.
+            n_jobs (int, optional): The number of cores used by backends that support it. Defaults to CLASSIFIER_N_JOBS.
         """
         self.training_data = training_data
-        self.tfidf_vectorizer = TfidfVectorizer()
-        self.gb_classifier = GradientBoostingClassifier(n_estimators=100, random_state=42)
+        self.backend = backend
+        self.n_jobs = n_jobs
+        self.vectorizer, self.classifier = build_backend(backend, n_jobs)
 
     def clean_text(self, text):
         """
@@ -40,34 +47,36 @@ class TextClassifier:
         Returns:
             str: The cleaned and preprocessed text.
         """
-        if pd.notna(text):
-            text = text.lower()  # Convert text to lowercase
-            text = re.sub(r'[^a-zA-Z\s]', '', text)  # Remove special characters
-            tokens = word_tokenize(text)  # Tokenize the text
-            stop_words = set(stopwords.words('english'))  # Get English stopwords
-            tokens = [token for token in tokens if token not in stop_words]  # Remove stopwords
-            lemmatizer = WordNetLemmatizer()  # Initialize lemmatizer
-            tokens = [lemmatizer.lemmatize(token) for token in tokens]  # Lemmatize tokens
-            cleaned_text = ' '.join(tokens)  # Join tokens back into a single string
-            return cleaned_text
-        else:
-            return ''  # Return empty string for NaN values
+        return text_cleaner.clean_text(text)
+
+    def clean_texts(self, texts, workers=CLEAN_TEXT_WORKERS, chunk_size=CLEAN_TEXT_CHUNK_SIZE):
+        """
+        Cleans a whole column of texts with `clean_text`, sharding it across a process pool.
+        Stopwords and the lemmatizer are loaded once per worker and lemmas are memoized per token.
+
+        Args:
+            texts (pd.Series): The texts to be cleaned.
+            workers (int, optional): The number of worker processes. Defaults to one per CPU.
+            chunk_size (int, optional): The number of texts sent to a worker at a time.
+
+        Returns:
+            pd.Series: The cleaned texts, aligned with `texts`.
+        """
+        return text_cleaner.clean_texts(texts, workers=workers, chunk_size=chunk_size)
 
     @staticmethod
-    def load_model(file_path='model_q2.pkl'):
+    def load_model(file_path=None):
         """
-        Loads a pre-trained model from a specified file path.
+        Loads a pre-trained model through the process-wide model registry, so each file is deserialized once.
 
         Args:
-            file_path (str, optional): The path to the model file. Defaults to 'model_q2.pkl'.
+            file_path (str, optional): The path to the model file. Defaults to the newest model saved in
+                'model/', or 'model_q2.pkl' when there is none.
 
         Returns:
             dict: The loaded model containing the TF-IDF vectorizer and classifier.
         """
-        with open(file_path, 'rb') as model_file:
-            model_bytes = model_file.read()  # Read the model file
-        loaded_model = pickle.loads(model_bytes)  # Deserialize the model
-        return loaded_model
+        return model_registry.get_model(file_path)
 
     def update_themes_subthemes(self, text, keyword_data):
         """
@@ -80,15 +89,14 @@ class TextClassifier:
         Returns:
             tuple: A tuple containing the matched theme, subtheme, and subsubtheme (if any).
         """
-        for keyword, theme, subtheme in zip(keyword_data['Keyword'], keyword_data['Theme'], keyword_data['Sub Theme']):
-            keyword = keyword.lower().replace('#', '')  # Normalize keyword
-            if keyword in text.lower():  # Check if keyword exists in the text
-                return theme, subtheme, None
-        return None, None, None
+        return get_keyword_matcher(keyword_data).match(text)
 
-    def train_classifier(self):
+    def prepare_training_data(self):
         """
-        Trains the Gradient Boosting Classifier using the provided training data.
+        Cleans the training data and combines its themes into one label per message.
+
+        Returns:
+            tuple: The cleaned messages and their 'Theme||Sub Theme||Sub Sub Theme' labels, as pd.Series.
 
         Raises:
             ValueError: If training data is not provided or required columns are missing.
@@ -111,17 +119,87 @@ class TextClassifier:
         data = data[pd.notnull(data['Message'])]
 
         # Clean the text data
-        data['Message'] = data['Message'].apply(self.clean_text)
-
-        # Fit the TF-IDF vectorizer and transform the text data
-        self.tfidf_vectorizer.fit(data['Message'])
-        data_tfidf = self.tfidf_vectorizer.transform(data['Message'])
+        data['Message'] = self.clean_texts(data['Message'])
 
         # Combine themes into a single column for multi-label classification
         data['Combined Themes'] = data['Vernon Main Theme'] + '||' + data['Vernon Sub Theme'] + '||' + data['Vernon Sub Sub Theme']
+        return data['Message'], data['Combined Themes']
+
+    def train_classifier(self):
+        """
+        Trains the configured backend's vectorizer and classifier using the provided training data.
 
-        # Train the Gradient Boosting Classifier
-        self.gb_classifier.fit(data_tfidf, data['Combined Themes'])
+        Raises:
+            ValueError: If training data is not provided or required columns are missing.
+        """
+        messages, labels = self.prepare_training_data()
+
+        # Fit the vectorizer and transform the text data
+        features = self.vectorizer.fit_transform(messages)
+
+        # Train the classifier
+        self.classifier.fit(features, labels)
+
+    def compare_backends(self, backends=None, test_size=0.2, random_state=42):
+        """
+        Trains each backend on the same split of the training data and measures it on the held-out part,
+        to choose CLASSIFIER_BACKEND. The texts are cleaned once and shared by all backends.
+
+        Args:
+            backends (list, optional): The backends to compare. Defaults to all of CLASSIFIER_BACKENDS.
+            test_size (float): The share of the training data held out for evaluation.
+            random_state (int): The seed of the split and of the backends.
+
+        Returns:
+            pd.DataFrame: One row per backend with its held-out accuracy, training and prediction time in
+                seconds, and prediction throughput in messages per second, best accuracy first.
+        """
+        messages, labels = self.prepare_training_data()
+        train_messages, test_messages, train_labels, test_labels = train_test_split(
+            messages, labels, test_size=test_size, random_state=random_state
+        )
+
+        results = []
+        for backend in backends or list(CLASSIFIER_BACKENDS):
+            vectorizer, classifier = build_backend(backend, self.n_jobs, random_state)
+
+            started = time.perf_counter()
+            classifier.fit(vectorizer.fit_transform(train_messages), train_labels)
+            train_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            predicted = classifier.predict(vectorizer.transform(test_messages))
+            predict_seconds = time.perf_counter() - started
+
+            results.append({
+                'backend': backend,
+                'accuracy': accuracy_score(test_labels, predicted),
+                'train_seconds': train_seconds,
+                'predict_seconds': predict_seconds,
+                'predictions_per_second': len(test_messages) / predict_seconds if predict_seconds else None,
+            })
+            print(f"{backend}: accuracy {results[-1]['accuracy']:.3f}, trained in {train_seconds:.1f}s, "
+                  f"predicted {len(test_messages)} messages in {predict_seconds:.2f}s")
+
+        return pd.DataFrame(results).sort_values('accuracy', ascending=False, ignore_index=True)
+
+    def model_data(self):
+        """
+        Builds the model file contents for the trained vectorizer and classifier.
+
+        The original 'tfidf_vectorizer' and 'gb_classifier' keys are kept as aliases, so releases that
+        predate the backend choice can still load the model.
+
+        Returns:
+            dict: The backend name, vectorizer and classifier.
+        """
+        return {
+            'backend': self.backend,
+            'vectorizer': self.vectorizer,
+            'classifier': self.classifier,
+            'tfidf_vectorizer': self.vectorizer,
+            'gb_classifier': self.classifier,
+        }
 
     def auto_save_locally(self):
         """
@@ -134,13 +212,13 @@ class TextClassifier:
         self.train_classifier()
 
         # Prepare model data for saving
-        model_data = {
-            'tfidf_vectorizer': self.tfidf_vectorizer,
-            'gb_classifier': self.gb_classifier
-        }
+        model_data = self.model_data()
 
-        # Save the model to the specified file path
-        with open(file_path, 'wb') as model_file:
+        # Save the model to the specified file path; write to a temporary file first so the model
+        # registry never picks up a partially written model
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(f"{file_path}.tmp", 'wb') as model_file:
             pickle.dump(model_data, model_file)
+        os.replace(f"{file_path}.tmp", file_path)
 
         print(f"Model saved locally at {file_path}")
\ No newline at end of file
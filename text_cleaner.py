@@ -0,0 +1,104 @@
+import os
+import re
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+import pandas as pd
+from nltk.corpus import stopwords
+from nltk.tokenize import word_tokenize
+from nltk.stem import WordNetLemmatizer
+from process_pools import get_pool, discard_pool
+from settings import CLEAN_TEXT_WORKERS, CLEAN_TEXT_CHUNK_SIZE, LEMMA_CACHE_SIZE
+
+# Loaded once per process on first use; worker processes load their own copy.
+_stop_words = None
+_lemmatizer = None
+
+
+def _load_resources():
+    """
+    Loads the English stopwords and the WordNet lemmatizer for the current process.
+    """
+    global _stop_words, _lemmatizer
+    if _stop_words is None:
+        _stop_words = set(stopwords.words('english'))
+        _lemmatizer = WordNetLemmatizer()
+
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def lemmatize(token):
+    """
+    Lemmatizes a single token, memoizing the most recently used tokens.
+
+    Args:
+        token (str): The token to lemmatize.
+
+    Returns:
+        str: The lemma of the token.
+    """
+    return _lemmatizer.lemmatize(token)
+
+
+def clean_text(text):
+    """
+    Cleans and preprocesses the input text by converting it to lowercase, removing special characters,
+    tokenizing, removing stopwords, and lemmatizing the tokens.
+
+    Args:
+        text (str): The input text to be cleaned.
+
+    Returns:
+        str: The cleaned and preprocessed text.
+    """
+    if pd.notna(text):
+        _load_resources()
+        text = text.lower()
+        text = re.sub(r'[^a-zA-Z\s]', '', text)
+        tokens = word_tokenize(text)
+        tokens = [lemmatize(token) for token in tokens if token not in _stop_words]
+        return ' '.join(tokens)
+    else:
+        return ''
+
+
+def _clean_chunk(texts):
+    """
+    Cleans a chunk of texts in the current process.
+
+    Args:
+        texts (list): The texts to clean.
+
+    Returns:
+        list: The cleaned texts.
+    """
+    return [clean_text(text) for text in texts]
+
+
+def clean_texts(texts, workers=CLEAN_TEXT_WORKERS, chunk_size=CLEAN_TEXT_CHUNK_SIZE):
+    """
+    Cleans a column of texts, sharding it across a process pool (shared by later calls) when it spans more
+    than one chunk.
+
+    Args:
+        texts (pd.Series): The texts to clean.
+        workers (int, optional): The number of worker processes. Defaults to one per CPU.
+        chunk_size (int): The number of texts sent to a worker at a time.
+
+    Returns:
+        pd.Series: The cleaned texts, aligned with `texts`.
+    """
+    values = texts.tolist()
+    workers = workers or os.cpu_count() or 1
+    chunks = [values[i:i + chunk_size] for i in range(0, len(values), chunk_size)]
+
+    if workers <= 1 or len(chunks) <= 1:
+        cleaned = _clean_chunk(values)
+    else:
+        cleaned = []
+        try:
+            for chunk in get_pool(workers).map(_clean_chunk, chunks):
+                cleaned.extend(chunk)
+        except BrokenProcessPool:
+            discard_pool(workers)
+            raise
+
+    return pd.Series(cleaned, index=texts.index, dtype=object)
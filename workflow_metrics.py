@@ -0,0 +1,347 @@
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from settings import METRICS_TRACK_MEMORY, METRICS_MEMORY_SAMPLE_SECONDS
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+METRIC_PREFIX = "echo_workflow"
+
+
+def current_rss_bytes():
+    """
+    Reads the current resident set size of this process and of its child processes (e.g. the text cleaning
+    and prediction workers).
+
+    Returns:
+        tuple: The RSS in bytes of this process and the summed RSS of its children, or (None, None) without
+            psutil.
+    """
+    if psutil is None:
+        return None, None
+    process = psutil.Process()
+    children = 0
+    for child in process.children(recursive=True):
+        try:
+            children += child.memory_info().rss
+        except psutil.Error:
+            pass  # The child exited while being read
+    return process.memory_info().rss, children
+
+
+class MemorySampler:
+    def __init__(self, interval=METRICS_MEMORY_SAMPLE_SECONDS):
+        """
+        Samples the memory of the process every `interval` seconds from a background thread while stages are
+        open, keeping the highest reading of each open stage. The thread stops when no stage is open.
+
+        Args:
+            interval (float): The seconds between samples.
+        """
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.records = set()
+        self.thread = None
+
+    def add(self, record):
+        """
+        Starts sampling for a stage.
+
+        Args:
+            record (StageRecord): The stage that started.
+        """
+        record.sample_memory(*current_rss_bytes())
+        with self.lock:
+            self.records.add(record)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._sample, name='memory-sampler', daemon=True)
+                self.thread.start()
+
+    def remove(self, record):
+        """
+        Stops sampling for a stage, taking a last reading.
+
+        Args:
+            record (StageRecord): The stage that ended.
+        """
+        with self.lock:
+            self.records.discard(record)
+        record.sample_memory(*current_rss_bytes())
+
+    def _sample(self):
+        """
+        Reads the memory of the process into the open stages until none is left.
+        """
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                records = list(self.records)
+                if not records:
+                    self.thread = None
+                    return
+            rss, children_rss = current_rss_bytes()
+            for record in records:
+                record.sample_memory(rss, children_rss)
+
+
+class StageRecord:
+    def __init__(self, name, rows_in=None):
+        """
+        Holds the measurements of one workflow stage.
+
+        Args:
+            name (str): The name of the stage.
+            rows_in (int, optional): The number of rows the stage received.
+        """
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.seconds = None
+        self.peak_memory_bytes = None
+        self.peak_rss_bytes = None
+        self.children_peak_rss_bytes = None
+        self.started = time.perf_counter()
+
+    def sample_memory(self, rss, children_rss):
+        """
+        Raises the peak RSS of the stage to a new reading.
+
+        Args:
+            rss (int): The RSS of the process in bytes, or None if unknown.
+            children_rss (int): The summed RSS of the child processes in bytes, or None if unknown.
+        """
+        if rss is not None:
+            self.peak_rss_bytes = max(self.peak_rss_bytes or 0, rss)
+            self.children_peak_rss_bytes = max(self.children_peak_rss_bytes or 0, children_rss)
+
+    @property
+    def rows_per_second(self):
+        """
+        The stage throughput, based on the rows it received.
+
+        Returns:
+            float: Rows per second, or None if unknown.
+        """
+        if not self.seconds or self.rows_in is None:
+            return None
+        return self.rows_in / self.seconds
+
+    def to_dict(self):
+        """
+        Describes the stage for storage.
+
+        Returns:
+            dict: The stage measurements.
+        """
+        return {
+            'stage': self.name,
+            'seconds': self.seconds,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'rows_per_second': self.rows_per_second,
+            'peak_memory_bytes': self.peak_memory_bytes,
+            'peak_rss_bytes': self.peak_rss_bytes,
+            'children_peak_rss_bytes': self.children_peak_rss_bytes,
+        }
+
+
+class RunMetrics:
+    def __init__(self):
+        """
+        Collects the stage measurements of one workflow run.
+        """
+        self.run_id = uuid.uuid4().hex
+        self.started_at = datetime.now()
+        self.started = time.perf_counter()
+        self.seconds = None
+        self.stages = []
+
+    def to_document(self, result=None):
+        """
+        Describes the run for storage in MongoDB.
+
+        Args:
+            result (dict, optional): The outcome returned by the workflow.
+
+        Returns:
+            dict: The run and its stage measurements.
+        """
+        return {
+            'run_id': self.run_id,
+            'started_at': self.started_at,
+            'seconds': self.seconds,
+            'status': (result or {}).get('status'),
+            'message': (result or {}).get('message'),
+            'stages': [stage.to_dict() for stage in self.stages],
+        }
+
+
+class WorkflowMetrics:
+    def __init__(self, track_memory=METRICS_TRACK_MEMORY):
+        """
+        Records wall time, rows in/out, throughput and peak memory of workflow stages, per run and as
+        process-wide totals for the /metrics endpoint.
+
+        While a stage runs, the resident set size of the process and the summed RSS of its child processes
+        (the worker pools) are sampled with psutil every METRICS_MEMORY_SAMPLE_SECONDS, and the highest
+        readings are kept as the stage's peaks. Memory peaks shorter than the interval can be missed.
+
+        With `track_memory`, the Python allocations of each stage are also traced with tracemalloc, which
+        gives a per-stage peak for this process but slows the run down considerably.
+
+        Args:
+            track_memory (bool): Whether to trace memory allocations during runs.
+        """
+        self.track_memory = track_memory
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.runs_total = 0
+        self.active_runs = 0
+        self.started_tracing = False
+        self.totals = {}
+        self.memory_sampler = MemorySampler()
+
+    @contextmanager
+    def run(self):
+        """
+        Measures a workflow run; stages entered in the same thread are attached to it.
+
+        Yields:
+            RunMetrics: The measurements of the run.
+        """
+        run = RunMetrics()
+        self.local.run = run
+        self.local.open_stages = []
+        with self.lock:
+            self.active_runs += 1
+            if self.track_memory and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.started_tracing = True
+        try:
+            yield run
+        finally:
+            run.seconds = time.perf_counter() - run.started
+            self.local.run = None
+            with self.lock:
+                self.runs_total += 1
+                self.active_runs -= 1
+                if self.started_tracing and self.active_runs == 0:
+                    tracemalloc.stop()
+                    self.started_tracing = False
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        Measures a stage. Set `rows_out` on the yielded record to report the rows the stage produced.
+
+        Args:
+            name (str): The name of the stage.
+            rows_in (int, optional): The number of rows the stage received.
+
+        Yields:
+            StageRecord: The measurements of the stage.
+        """
+        record = StageRecord(name, rows_in)
+        open_stages = getattr(self.local, 'open_stages', None)
+        if open_stages is None:
+            open_stages = self.local.open_stages = []
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            # Credit the peak so far to the enclosing stages before resetting it for this one
+            self._update_peaks(open_stages, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        open_stages.append(record)
+        self.memory_sampler.add(record)
+        try:
+            yield record
+        finally:
+            record.seconds = time.perf_counter() - record.started
+            open_stages.pop()
+            self.memory_sampler.remove(record)
+            if tracing and tracemalloc.is_tracing():
+                peak = tracemalloc.get_traced_memory()[1]
+                record.peak_memory_bytes = peak
+                self._update_peaks(open_stages, peak)
+            run = getattr(self.local, 'run', None)
+            if run is not None:
+                run.stages.append(record)
+            self._add_to_totals(record)
+
+    def _update_peaks(self, stages, peak):
+        """
+        Raises the recorded peak memory of the given stages to `peak`.
+
+        Args:
+            stages (list): The stages still open.
+            peak (int): The traced memory peak in bytes.
+        """
+        for stage in stages:
+            stage.peak_memory_bytes = max(stage.peak_memory_bytes or 0, peak)
+
+    def _add_to_totals(self, record):
+        """
+        Adds a finished stage to the process-wide totals.
+
+        Args:
+            record (StageRecord): The finished stage.
+        """
+        with self.lock:
+            totals = self.totals.setdefault(record.name, {
+                'count': 0, 'seconds': 0.0, 'rows_in': 0, 'rows_out': 0,
+                'last_seconds': 0.0, 'last_rows_per_second': 0.0, 'last_peak_memory_bytes': 0,
+                'last_peak_rss_bytes': 0, 'last_children_peak_rss_bytes': 0,
+            })
+            totals['count'] += 1
+            totals['seconds'] += record.seconds
+            totals['rows_in'] += record.rows_in or 0
+            totals['rows_out'] += record.rows_out or 0
+            totals['last_seconds'] = record.seconds
+            totals['last_rows_per_second'] = record.rows_per_second or 0.0
+            totals['last_peak_memory_bytes'] = record.peak_memory_bytes or 0
+            totals['last_peak_rss_bytes'] = record.peak_rss_bytes or 0
+            totals['last_children_peak_rss_bytes'] = record.children_peak_rss_bytes or 0
+
+    def render_prometheus(self):
+        """
+        Renders the totals in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics page.
+        """
+        metrics = [
+            ('stage_runs_total', 'counter', 'Number of times each stage has run.', 'count'),
+            ('stage_seconds_total', 'counter', 'Wall time spent in each stage.', 'seconds'),
+            ('stage_rows_in_total', 'counter', 'Rows received by each stage.', 'rows_in'),
+            ('stage_rows_out_total', 'counter', 'Rows produced by each stage.', 'rows_out'),
+            ('stage_last_seconds', 'gauge', 'Wall time of the latest run of each stage.', 'last_seconds'),
+            ('stage_last_rows_per_second', 'gauge', 'Throughput of the latest run of each stage.',
+             'last_rows_per_second'),
+            ('stage_last_peak_memory_bytes', 'gauge', 'Peak traced memory during the latest run of each stage.',
+             'last_peak_memory_bytes'),
+            ('stage_last_peak_rss_bytes', 'gauge', 'Peak resident memory of the process during the latest run of each stage.',
+             'last_peak_rss_bytes'),
+            ('stage_last_children_peak_rss_bytes', 'gauge',
+             'Peak summed resident memory of the worker processes during the latest run of each stage.',
+             'last_children_peak_rss_bytes'),
+        ]
+        with self.lock:
+            lines = [
+                f"# HELP {METRIC_PREFIX}_runs_total Number of finished workflow runs.",
+                f"# TYPE {METRIC_PREFIX}_runs_total counter",
+                f"{METRIC_PREFIX}_runs_total {self.runs_total}",
+            ]
+            for suffix, metric_type, description, key in metrics:
+                lines.append(f"# HELP {METRIC_PREFIX}_{suffix} {description}")
+                lines.append(f"# TYPE {METRIC_PREFIX}_{suffix} {metric_type}")
+                for name, totals in sorted(self.totals.items()):
+                    lines.append(f'{METRIC_PREFIX}_{suffix}{{stage="{name}"}} {totals[key]}')
+        return "\n".join(lines) + "\n"
+
+
+workflow_metrics = WorkflowMetrics()